@@ -0,0 +1,615 @@
+import json
+import math
+import sys
+from decimal import Context, Decimal, localcontext
+from fractions import Fraction
+from functools import lru_cache
+from types import MappingProxyType
+
+from calc_core import SCIENTIFIC_FUNCTIONS
+from expression import (
+    BINARY_OPERATORS, CONSTANTS, FUNCTIONS, CompiledExpression, ExpressionError, _Parser,
+    check_integer_bits, compile_expression, normalize, tokenize,
+)
+
+# Numeric backends for the calculator. "float" is the existing fast path;
+# "decimal" evaluates with decimal.Decimal at a chosen number of significant
+# digits; "fraction" keeps +, -, *, / and integer powers exact with
+# fractions.Fraction and falls back to Decimal at the backend's precision for
+# transcendental functions. select_backend() picks the cheapest one that can
+# honour a requested precision. The Decimal and Fraction tables cover the common
+# part of math; an expression calling anything else is refused rather than
+# quietly computed in floats.
+
+FLOAT_DIGITS = sys.float_info.dig  # 15 significant digits survive a float round trip
+DEFAULT_DECIMAL_PRECISION = 28
+GUARD_DIGITS = 5
+
+
+# Decimal implementations of the functions math provides for floats. They run in
+# the current decimal context, with a few guard digits, and round on return.
+
+def _rounded(fn):
+    def wrapper(*args):
+        with localcontext() as ctx:
+            ctx.prec += GUARD_DIGITS
+            result = fn(*args)
+        return +result
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+@lru_cache(maxsize=32)
+def _pi_at(prec):
+    # Series from the decimal module documentation
+    with localcontext() as ctx:
+        ctx.prec = prec + 2
+        three = Decimal(3)
+        lasts, t, s, n, na, d, da = 0, three, 3, 1, 0, 0, 24
+        while s != lasts:
+            lasts = s
+            n, na = n + na, na + 8
+            d, da = d + da, da + 32
+            t = (t * n) / d
+            s += t
+    return s
+
+
+def _current_prec():
+    with localcontext() as ctx:
+        return ctx.prec
+
+
+@_rounded
+def decimal_sin(x):
+    x = Decimal(x) % (2 * _pi_at(_current_prec()))
+    i, lasts, s, fact, num, sign = 1, 0, x, 1, x, 1
+    while s != lasts:
+        lasts = s
+        i += 2
+        fact *= i * (i - 1)
+        num *= x * x
+        sign *= -1
+        s += num / fact * sign
+    return s
+
+
+@_rounded
+def decimal_cos(x):
+    x = Decimal(x) % (2 * _pi_at(_current_prec()))
+    i, lasts, s, fact, num, sign = 0, 0, Decimal(1), 1, Decimal(1), 1
+    while s != lasts:
+        lasts = s
+        i += 2
+        fact *= i * (i - 1)
+        num *= x * x
+        sign *= -1
+        s += num / fact * sign
+    return s
+
+
+@_rounded
+def decimal_tan(x):
+    cos = decimal_cos(x)
+    if not cos:
+        raise ValueError("math domain error")
+    return decimal_sin(x) / cos
+
+
+@_rounded
+def decimal_atan(x):
+    x = Decimal(x)
+    if x.is_nan():
+        return x
+    if x < 0:
+        return -decimal_atan(-x)
+    if x > 1:
+        return _pi_at(_current_prec()) / 2 - decimal_atan(1 / x)
+    # Halve the argument until the series converges quickly
+    halvings = 0
+    while x > Decimal("0.2"):
+        x = x / (1 + (1 + x * x).sqrt())
+        halvings += 1
+    x2 = x * x
+    term, s, lasts, n = x, x, 0, 1
+    while s != lasts:
+        lasts = s
+        term *= -x2
+        n += 2
+        s += term / n
+    return s * (2 ** halvings)
+
+
+@_rounded
+def decimal_asin(x):
+    x = Decimal(x)
+    if abs(x) > 1:
+        raise ValueError("math domain error")
+    if abs(x) == 1:
+        return x * _pi_at(_current_prec()) / 2
+    return decimal_atan(x / (1 - x * x).sqrt())
+
+
+@_rounded
+def decimal_acos(x):
+    return _pi_at(_current_prec()) / 2 - decimal_asin(x)
+
+
+@_rounded
+def decimal_atan2(y, x):
+    y, x = Decimal(y), Decimal(x)
+    if x > 0:
+        return decimal_atan(y / x)
+    pi = _pi_at(_current_prec())
+    if x < 0:
+        return decimal_atan(y / x) + (-pi if y.is_signed() else pi)
+    if y:
+        return (-pi if y.is_signed() else pi) / 2
+    # atan2(+-0, +0) is +-0 and atan2(+-0, -0) is +-pi, as for floats
+    return (pi if x.is_signed() else Decimal(0)).copy_sign(y)
+
+
+@_rounded
+def decimal_hypot(*coordinates):
+    return sum((Decimal(x) * Decimal(x) for x in coordinates), Decimal(0)).sqrt()
+
+
+def decimal_fmod(x, y):
+    # Decimal's % keeps the sign of the dividend, as fmod does
+    x, y = Decimal(x), Decimal(y)
+    if not y:
+        raise ValueError("math domain error")
+    return x % y
+
+
+def decimal_remainder(x, y):
+    x, y = Decimal(x), Decimal(y)
+    if not y:
+        raise ValueError("math domain error")
+    return x.remainder_near(y)
+
+
+def decimal_sqrt(x):
+    x = Decimal(x)
+    if x < 0:
+        raise ValueError("math domain error")
+    return x.sqrt()
+
+
+def decimal_log(x, base=None):
+    x = Decimal(x)
+    if x <= 0:
+        raise ValueError("math domain error")
+    if base is None:
+        return x.ln()
+    return _rounded(lambda: x.ln() / Decimal(base).ln())()
+
+
+def decimal_log10(x):
+    x = Decimal(x)
+    if x <= 0:
+        raise ValueError("math domain error")
+    return x.log10()
+
+
+def decimal_radians(x):
+    return +(Decimal(x) * _pi_at(_current_prec()) / 180)
+
+
+def decimal_degrees(x):
+    return +(Decimal(x) * 180 / _pi_at(_current_prec()))
+
+
+def _integral(fn):
+    # factorial, gcd and lcm only take ints; whole Decimals and Fractions become ints
+    def wrapper(*args):
+        return fn(*(int(arg) if isinstance(arg, (Decimal, Fraction)) and arg == int(arg) else arg
+                    for arg in args))
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+DECIMAL_FUNCTIONS = {
+    "sin": decimal_sin,
+    "cos": decimal_cos,
+    "tan": decimal_tan,
+    "asin": decimal_asin,
+    "acos": decimal_acos,
+    "atan": decimal_atan,
+    "sqrt": decimal_sqrt,
+    "exp": lambda x: Decimal(x).exp(),
+    "log": decimal_log,
+    "log10": decimal_log10,
+    "log2": lambda x: decimal_log(x, 2),
+    "fabs": lambda x: abs(Decimal(x)),
+    "floor": lambda x: int(Decimal(x).to_integral_value(rounding="ROUND_FLOOR")),
+    "ceil": lambda x: int(Decimal(x).to_integral_value(rounding="ROUND_CEILING")),
+    "trunc": lambda x: int(Decimal(x)),
+    "pow": lambda x, y: Decimal(x) ** Decimal(y),
+    "atan2": decimal_atan2,
+    "hypot": decimal_hypot,
+    "copysign": lambda x, y: Decimal(x).copy_sign(Decimal(y)),
+    "fmod": decimal_fmod,
+    "remainder": decimal_remainder,
+    "ldexp": lambda x, i: Decimal(x) * Decimal(2) ** _integral(int)(i),
+    "radians": decimal_radians,
+    "degrees": decimal_degrees,
+    "factorial": _integral(FUNCTIONS["factorial"]),
+    "comb": _integral(FUNCTIONS["comb"]),
+    "perm": _integral(FUNCTIONS["perm"]),
+    "gcd": _integral(FUNCTIONS["gcd"]),
+    "lcm": _integral(FUNCTIONS["lcm"]),
+    "isqrt": _integral(FUNCTIONS["isqrt"]),
+}
+
+DECIMAL_SCIENTIFIC = {
+    "sin": lambda x: decimal_sin(decimal_radians(x)),
+    "cos": lambda x: decimal_cos(decimal_radians(x)),
+    "tan": lambda x: decimal_tan(decimal_radians(x)),
+    "asin": lambda x: decimal_degrees(decimal_asin(x)),
+    "acos": lambda x: decimal_degrees(decimal_acos(x)),
+    "atan": lambda x: decimal_degrees(decimal_atan(x)),
+    "log": decimal_log10,
+    "ln": decimal_log,
+    "√": decimal_sqrt,
+}
+
+
+# Fraction implementations: exact where the result is rational, otherwise the
+# Decimal function evaluated at the backend precision and converted back.
+
+def _to_decimal(x):
+    if isinstance(x, Fraction):
+        return Decimal(x.numerator) / Decimal(x.denominator)
+    return Decimal(x)
+
+
+def _via_decimal(fn):
+    def wrapper(*args):
+        return Fraction(fn(*(_to_decimal(arg) for arg in args)))
+    wrapper.__name__ = fn.__name__
+    return wrapper
+
+
+def fraction_sqrt(x):
+    x = Fraction(x)
+    if x < 0:
+        raise ValueError("math domain error")
+    num, den = math.isqrt(x.numerator), math.isqrt(x.denominator)
+    if num * num == x.numerator and den * den == x.denominator:
+        return Fraction(num, den)
+    return Fraction(decimal_sqrt(_to_decimal(x)))
+
+
+def fraction_pow(x, y):
+    x, y = Fraction(x), Fraction(y)
+    if y.denominator == 1:
+        if abs(y.numerator) > 1:
+            check_integer_bits(max(x.numerator.bit_length(), x.denominator.bit_length()) * abs(y.numerator))
+        return x ** y.numerator
+    if y.denominator == 2 and x >= 0:
+        return fraction_sqrt(x) ** y.numerator
+    return Fraction(_to_decimal(x) ** _to_decimal(y))
+
+
+def fraction_hypot(*coordinates):
+    return fraction_sqrt(sum(Fraction(x) ** 2 for x in coordinates))
+
+
+def fraction_fmod(x, y):
+    x, y = Fraction(x), Fraction(y)
+    if not y:
+        raise ValueError("math domain error")
+    return x - y * math.trunc(x / y)
+
+
+def fraction_remainder(x, y):
+    # round() on a Fraction rounds half to even, as IEEE remainder does
+    x, y = Fraction(x), Fraction(y)
+    if not y:
+        raise ValueError("math domain error")
+    return x - y * round(x / y)
+
+
+def fraction_ldexp(x, i):
+    i = _integral(int)(i)
+    check_integer_bits(abs(i))
+    return Fraction(x) * Fraction(2) ** i
+
+
+FRACTION_FUNCTIONS = {name: _via_decimal(fn) for name, fn in DECIMAL_FUNCTIONS.items()}
+FRACTION_FUNCTIONS.update({
+    "sqrt": fraction_sqrt,
+    "pow": fraction_pow,
+    "fabs": lambda x: abs(Fraction(x)),
+    "floor": math.floor,
+    "ceil": math.ceil,
+    "trunc": math.trunc,
+    "hypot": fraction_hypot,
+    "copysign": lambda x, y: -abs(Fraction(x)) if Fraction(y) < 0 else abs(Fraction(x)),
+    "fmod": fraction_fmod,
+    "remainder": fraction_remainder,
+    "ldexp": fraction_ldexp,
+    "factorial": _integral(FUNCTIONS["factorial"]),
+    "comb": _integral(FUNCTIONS["comb"]),
+    "perm": _integral(FUNCTIONS["perm"]),
+    "gcd": _integral(FUNCTIONS["gcd"]),
+    "lcm": _integral(FUNCTIONS["lcm"]),
+    "isqrt": _integral(FUNCTIONS["isqrt"]),
+})
+
+FRACTION_SCIENTIFIC = {name: _via_decimal(fn) for name, fn in DECIMAL_SCIENTIFIC.items()}
+FRACTION_SCIENTIFIC["√"] = fraction_sqrt
+
+FRACTION_OPERATORS = MappingProxyType(dict(BINARY_OPERATORS, **{"**": fraction_pow}))
+
+
+def _float_number(value):
+    return value if isinstance(value, (int, float)) else float(value)
+
+
+def _decimal_number(value):
+    # Floats go through repr so the literal 0.1 becomes Decimal("0.1")
+    if isinstance(value, float):
+        return Decimal(repr(value))
+    if isinstance(value, Fraction):
+        return _to_decimal(value)
+    return Decimal(value)
+
+
+def _fraction_number(value):
+    if isinstance(value, float):
+        return Fraction(repr(value))
+    if isinstance(value, str):
+        return Fraction(value.strip())
+    return Fraction(value)
+
+
+class _LiteralParser(_Parser):
+    # Leaves number literals as their source text, so each backend builds its
+    # own number from the digits as written rather than from a rounded float
+    def number(self, text):
+        return ("num", text)
+
+
+class Backend:
+    def __init__(self, name, number, functions, constants, operators, scientific,
+                 precision=None, exact=False):
+        self.name = name
+        self.precision = precision
+        self.exact = exact
+        self.number = number
+        # Read-only views, so nothing can add callables to an expression's reach
+        self.functions = MappingProxyType(dict(functions))
+        self.constants = MappingProxyType(dict(constants))
+        self.operators = operators
+        self.scientific = MappingProxyType(dict(scientific))
+        # Floats need no context; the others evaluate with a few guard digits
+        self.context = None if name == "float" else Context(prec=precision + GUARD_DIGITS)
+        self._cache = {}
+
+    def __repr__(self):
+        if self.name != "float":
+            return f"Backend({self.name!r}, precision={self.precision})"
+        return f"Backend({self.name!r})"
+
+    def _convert_tree(self, node):
+        kind = node[0]
+        if kind == "num":
+            return ("num", self.number(node[1]))
+        if kind == "neg" or kind == "pos":
+            return (kind, self._convert_tree(node[1]))
+        if kind == "bin":
+            return ("bin", node[1], self._convert_tree(node[2]), self._convert_tree(node[3]))
+        if kind == "call":
+            return ("call", node[1], tuple(self._convert_tree(arg) for arg in node[2]))
+        return node
+
+    def compile(self, text):
+        if self.name == "float":
+            return compile_expression(text)
+        source = normalize(text)
+        compiled = self._cache.get(source)
+        if compiled is None:
+            # No constant folding here: folding happens in float arithmetic
+            tree = self._convert_tree(_LiteralParser(tokenize(source)).parse())
+            compiled = CompiledExpression(source, tree, self.functions, self.constants, self.operators)
+            if len(self._cache) >= 4096:
+                self._cache.clear()
+            self._cache[source] = compiled
+        return compiled
+
+    def evaluate(self, text, variables=None):
+        compiled = self.compile(text)
+        if self.context is None:
+            return compiled.evaluate(variables)
+        env = {name: self.number(value) for name, value in (variables or {}).items()}
+        with localcontext(self.context):
+            result = compiled.evaluate(env)
+        return self.finish(result)
+
+    def apply_function(self, name, value):
+        try:
+            fn = self.scientific[name]
+        except KeyError:
+            raise ValueError(f"unknown function '{name}'") from None
+        if self.context is None:
+            return fn(value)
+        with localcontext(self.context):
+            result = fn(self.number(value))
+        return self.finish(result)
+
+    def finish(self, result):
+        # Round away the guard digits the evaluation ran with
+        if isinstance(result, Decimal):
+            with localcontext(self.context) as ctx:
+                ctx.prec = self.precision
+                return +result
+        return result
+
+
+FLOAT = Backend(
+    "float", _float_number, FUNCTIONS, CONSTANTS, BINARY_OPERATORS, SCIENTIFIC_FUNCTIONS,
+    precision=FLOAT_DIGITS,
+)
+
+
+@lru_cache(maxsize=16)
+def decimal_backend(precision=DEFAULT_DECIMAL_PRECISION):
+    if precision < 1:
+        raise ValueError("precision must be at least 1 digit")
+    with localcontext(Context(prec=precision + GUARD_DIGITS)):
+        pi = +_pi_at(precision + GUARD_DIGITS)
+        e = Decimal(1).exp()
+    constants = {"pi": pi, "e": e, "tau": 2 * pi, "inf": Decimal("Infinity"), "nan": Decimal("NaN")}
+    return Backend(
+        "decimal", _decimal_number, DECIMAL_FUNCTIONS, constants, BINARY_OPERATORS,
+        DECIMAL_SCIENTIFIC, precision=precision,
+    )
+
+
+@lru_cache(maxsize=16)
+def fraction_backend(precision=DEFAULT_DECIMAL_PRECISION):
+    # precision only applies to irrational intermediate results (pi, sqrt(2), sin ...)
+    decimal_constants = decimal_backend(precision).constants
+    constants = {name: Fraction(decimal_constants[name]) for name in ("pi", "e", "tau")}
+    return Backend(
+        "fraction", _fraction_number, FRACTION_FUNCTIONS, constants, FRACTION_OPERATORS,
+        FRACTION_SCIENTIFIC, precision=precision, exact=True,
+    )
+
+
+BACKENDS = {
+    "float": lambda precision=None: FLOAT,
+    "decimal": decimal_backend,
+    "fraction": fraction_backend,
+}
+
+
+def get_backend(name, precision=None):
+    try:
+        factory = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"unknown numeric backend '{name}'") from None
+    return factory(precision) if precision else factory()
+
+
+def _float_safe(node):
+    # True when evaluating with Python ints gives the exact answer: only integer
+    # literals, +, -, * and non-negative integer powers
+    kind = node[0]
+    if kind == "num":
+        return isinstance(node[1], int)
+    if kind == "neg" or kind == "pos":
+        return _float_safe(node[1])
+    if kind == "bin":
+        op = node[1]
+        if op in ("+", "-", "*"):
+            return _float_safe(node[2]) and _float_safe(node[3])
+        if op == "**":
+            exponent = node[3]
+            return (exponent[0] == "num" and isinstance(exponent[1], int) and exponent[1] >= 0
+                    and _float_safe(node[2]))
+        return False
+    return False
+
+
+def _called_functions(node):
+    names = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        kind = current[0]
+        if kind == "neg" or kind == "pos":
+            stack.append(current[1])
+        elif kind == "bin":
+            stack.append(current[2])
+            stack.append(current[3])
+        elif kind == "call":
+            names.add(current[1])
+            stack.extend(current[2])
+    return names
+
+
+def select_backend(text=None, precision=None, exact=False, variables=None):
+    # Cheapest backend that meets the request. Integer-only arithmetic is exact
+    # on the float path already, so it never pays for Decimal or Fraction.
+    compiled = None
+    if text is not None and (exact or (precision or 0) > FLOAT_DIGITS):
+        compiled = compile_expression(text)
+        values = [(variables or {}).get(name) for name in compiled.names]
+        if _float_safe(compiled.tree) and all(isinstance(v, int) for v in values):
+            return FLOAT
+    if exact:
+        backend = fraction_backend(max(precision or 0, DEFAULT_DECIMAL_PRECISION))
+    elif precision is None or precision <= FLOAT_DIGITS:
+        return FLOAT
+    else:
+        backend = decimal_backend(precision)
+    if compiled is not None:
+        missing = sorted(_called_functions(compiled.tree) - backend.functions.keys())
+        if missing:
+            raise ExpressionError(f"{missing[0]}() is not available with the {backend.name} backend")
+    return backend
+
+
+def evaluate(text, variables=None, precision=None, exact=False):
+    return select_backend(text, precision, exact, variables).evaluate(text, variables)
+
+
+# Per-operation cost of each backend: python -m backends [--json]
+
+BENCHMARK_EXPRESSIONS = {
+    "add": "x + 1.25",
+    "multiply": "x * 1.25",
+    "divide": "x / 3",
+    "power": "x ** 3",
+    "sqrt": "sqrt(x)",
+    "sin": "sin(x)",
+    "log": "log(x)",
+}
+
+
+def benchmark(backends=None, number=2000, repeat=3):
+    import timeit
+
+    if backends is None:
+        backends = [FLOAT, decimal_backend(), decimal_backend(50), fraction_backend()]
+    variables = {"x": 1.75}
+    results = {}
+    for backend in backends:
+        timings = {}
+        for label, text in BENCHMARK_EXPRESSIONS.items():
+            backend.evaluate(text, variables)  # Compile outside the timed loop
+            best = min(timeit.repeat(
+                lambda: backend.evaluate(text, variables), number=number, repeat=repeat,
+            ))
+            timings[label] = best / number * 1e9
+        results[repr(backend)] = timings
+    return results
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        prog="python -m backends",
+        description="Compare the per-operation cost of the numeric backends.",
+    )
+    parser.add_argument("-n", "--number", type=int, default=2000, help="evaluations per timing")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    args = parser.parse_args(argv)
+
+    results = benchmark(number=args.number)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    labels = list(BENCHMARK_EXPRESSIONS)
+    print(f"{'ns/op':<34}" + "".join(f"{label:>11}" for label in labels))
+    for name, timings in results.items():
+        print(f"{name:<34}" + "".join(f"{timings[label]:>11.0f}" for label in labels))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import calc_core
+from expression import compile_node, normalize, parse
+from history import HistoryStore, make_entry
+
+# Benchmarks for the calculator's hot paths, one group per GUI entry point:
+#
+#   expression   what calculate() does: parse + compile, and evaluate a cached expression
+#   scientific   what button_click() does for sin/log/√ and friends
+#   conversion   what perform_conversion() does, one value and a batch
+#   history      HistoryStore append / save (flush) / load at several sizes
+#   startup      cold import of the headless core and of the GUI module, and
+#                time to first paint of the GUI (needs a display)
+#
+# Timings are the best of --repeat runs, in nanoseconds per operation, except
+# history and startup, which report seconds per run. Results are JSON so two
+# runs can be compared with --compare.
+
+EXPRESSIONS = {
+    "short": "2 + 3 * 4",
+    "variables": "x ** 2 + 3 * x - 7",
+    "functions": "sqrt(x) + sin(x / 2) * log(x + 1)",
+    "long": " + ".join(f"{i} * x" for i in range(200)),
+}
+HISTORY_SIZES = (10, 10_000, 1_000_000)
+QUICK_HISTORY_SIZES = (10, 10_000)
+STARTUP_MODULES = {"headless": "calc_core", "gui": "cal"}
+
+# Run in a fresh interpreter: time from the first import to the window being
+# drawn, and the number of widgets that exist at that point
+FIRST_PAINT_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import tkinter as tk
+import cal
+root = tk.Tk()
+app = cal.AdvancedCalculator(root)
+root.update()
+elapsed = time.perf_counter() - start
+def count(widget):
+    return 1 + sum(count(child) for child in widget.winfo_children())
+print(json.dumps({"seconds": elapsed, "widgets": count(root)}))
+root.destroy()
+"""
+
+# A run slower than the baseline by more than this fraction is a regression
+REGRESSION_THRESHOLD = 0.25
+
+
+def _best(fn, number, repeat):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e9
+
+
+def bench_expression(number, repeat):
+    variables = {"x": 1.75}
+    results = {}
+    for label, text in EXPRESSIONS.items():
+        source = normalize(text)
+        scale = max(number // max(len(source) // 20, 1), 10)
+        results[f"parse.{label}"] = _best(lambda: compile_node(parse(source)), scale, repeat)
+        calc_core.evaluate(text, variables)  # Compile outside the timed loop
+        results[f"evaluate.{label}"] = _best(lambda: calc_core.evaluate(text, variables), number, repeat)
+    return results
+
+
+def bench_scientific(number, repeat):
+    return {
+        name: _best(lambda: calc_core.apply_function(name, 0.5), number, repeat)
+        for name in calc_core.SCIENTIFIC_FUNCTIONS
+    }
+
+
+def bench_conversion(number, repeat):
+    results = {}
+    batch = [float(i) for i in range(1000)]
+    for category, unit_names in calc_core.CONVERSION_UNITS.items():
+        source, target = unit_names[0], unit_names[-1]
+        results[f"{category}.single"] = _best(
+            lambda: calc_core.convert(12.5, source, target, category), number, repeat,
+        )
+        results[f"{category}.batch_per_value"] = _best(
+            lambda: calc_core.convert_many(batch, source, target, category), max(number // 100, 1), repeat,
+        ) / len(batch)
+    return results
+
+
+def bench_history(sizes, repeat):
+    results = {}
+    entries_for = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "history.jsonl")
+        for size in sizes:
+            if size not in entries_for:
+                entries_for[size] = [make_entry(f"{i} * 2", i * 2) for i in range(size)]
+            entries = entries_for[size]
+            timings = {"append": [], "save": [], "load": []}
+            for _ in range(repeat):
+                if os.path.exists(path):
+                    os.remove(path)
+                store = HistoryStore(path, capacity=size)
+                start = time.perf_counter()
+                store.extend(entries)
+                timings["append"].append(time.perf_counter() - start)
+                start = time.perf_counter()
+                store.close()
+                timings["save"].append(time.perf_counter() - start)
+                store = HistoryStore(path, capacity=size)
+                start = time.perf_counter()
+                store.load()
+                timings["load"].append(time.perf_counter() - start)
+            for name, values in timings.items():
+                results[f"{name}.{size}"] = min(values)
+            del entries_for[size]
+    return results
+
+
+def _run_python(code):
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__)),
+        capture_output=True, text=True,
+    )
+
+
+def _import_time(module, repeat):
+    code = f"import {module}" if module else "pass"
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        completed = _run_python(code)
+        elapsed = time.perf_counter() - start
+        if completed.returncode != 0:
+            return None
+        times.append(elapsed)
+    return min(times)
+
+
+def bench_startup(repeat):
+    # Interpreter start-up is measured separately so the module cost can be read off
+    interpreter = _import_time(None, repeat)
+    results = {"interpreter": interpreter}
+    for label, module in STARTUP_MODULES.items():
+        elapsed = _import_time(module, repeat)
+        results[label] = elapsed
+        results[f"{label}.import_only"] = None if None in (elapsed, interpreter) else elapsed - interpreter
+    # None when there is no display to open a window on
+    paints = []
+    for _ in range(repeat):
+        completed = _run_python(FIRST_PAINT_SCRIPT)
+        if completed.returncode != 0:
+            break
+        paints.append(json.loads(completed.stdout))
+    results["gui.first_paint"] = min(p["seconds"] for p in paints) if paints else None
+    results["gui.widgets"] = paints[0]["widgets"] if paints else None
+    return results
+
+
+def run(groups=None, number=2000, repeat=3, quick=False):
+    groups = groups or ["expression", "scientific", "conversion", "history", "startup"]
+    results = {}
+    for group in groups:
+        if group == "expression":
+            results[group] = bench_expression(number, repeat)
+        elif group == "scientific":
+            results[group] = bench_scientific(number, repeat)
+        elif group == "conversion":
+            results[group] = bench_conversion(number, repeat)
+        elif group == "history":
+            results[group] = bench_history(QUICK_HISTORY_SIZES if quick else HISTORY_SIZES, repeat)
+        elif group == "startup":
+            results[group] = bench_startup(repeat)
+        else:
+            raise ValueError(f"unknown benchmark group '{group}'")
+    return {
+        "meta": {
+            "time": time.time(),
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "platform": platform.platform(),
+            "number": number,
+            "repeat": repeat,
+            "quick": quick,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=REGRESSION_THRESHOLD):
+    # (group, name, baseline, current, ratio) for every benchmark that got slower
+    # than threshold allows; lower is better for every timing
+    regressions = []
+    for group, timings in current["results"].items():
+        previous = baseline.get("results", {}).get(group, {})
+        for name, value in timings.items():
+            old = previous.get(name)
+            if not old or value is None:
+                continue
+            ratio = value / old
+            if ratio > 1 + threshold:
+                regressions.append((group, name, old, value, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m bench",
+        description="Benchmark the calculator's hot paths and print the results as JSON.",
+    )
+    parser.add_argument("groups", nargs="*", help="expression, scientific, conversion, history, startup (default: all)")
+    parser.add_argument("-n", "--number", type=int, default=2000, help="operations per timing")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="timings per benchmark; the best is kept")
+    parser.add_argument("-q", "--quick", action="store_true", help="skip the 1M-entry history run")
+    parser.add_argument("-o", "--output", help="write the JSON here instead of stdout")
+    parser.add_argument("--compare", metavar="BASELINE", help="report regressions against an earlier run")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD,
+                        help="allowed slowdown before a benchmark counts as regressed (default 0.25)")
+    args = parser.parse_args(argv)
+
+    try:
+        report = run(args.groups, args.number, args.repeat, args.quick)
+    except ValueError as e:
+        parser.error(str(e))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, report, args.threshold)
+        for group, name, old, new, ratio in regressions:
+            print(f"regression: {group}.{name} {old:.4g} -> {new:.4g} ({ratio:.2f}x)", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
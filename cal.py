@@ -5,21 +5,102 @@ import json
 import os
 from functools import partial
 
+# Only what the first paint needs is imported here: metrics wraps handlers when
+# the class is defined and persistence locates the data directory. The engine
+# modules (backends, units, programmer, formulas, history ...) load in the tab
+# builders and handlers that use them, the first time they run.
+import metrics
+import persistence
+
+# Everything lives in the per-user data directory ($CALC_DATA_DIR overrides it)
+DATA_DIR = persistence.data_dir(create=False)
+HISTORY_FILE = os.path.join(DATA_DIR, "calculator_history.json")
+HISTORY_JOURNAL = os.path.join(DATA_DIR, "calculator_history.jsonl")
+CACHE_FILE = os.path.join(DATA_DIR, "calculator_cache.json")
+STATE_FILE = os.path.join(DATA_DIR, "calculator_state.jsonl")
+# Written to the working directory by older versions
+LEGACY_SETTINGS_FILE = "calculator_settings.json"
+HISTORY_DISPLAY_LIMIT = 10
+HISTORY_SEARCH_LIMIT = 500
+PREVIEW_DELAY_MS = 50
+STATISTICS_POLL_MS = 100
+
+PROGRAMMER_WORD_SIZES = {"8-bit": 8, "16-bit": 16, "32-bit": 32, "64-bit": 64, "Unbounded": None}
+PROGRAMMER_OPERATORS = ["AND", "OR", "XOR", "MOD", "<<", ">>"]
+PROGRAMMER_BASES = ["HEX", "DEC", "OCT", "BIN"]
+# Keys of calc_core.SCIENTIFIC_FUNCTIONS, the buttons that apply a function
+SCIENTIFIC_KEYS = ["sin", "cos", "tan", "asin", "acos", "atan", "log", "ln", "√"]
+
+# Numeric backends offered in the View menu
+PRECISION_CHOICES = [
+    ("Float (fast)", "float", None),
+    ("Decimal (28 digits)", "decimal", 28),
+    ("Decimal (50 digits)", "decimal", 50),
+    ("Exact Fractions", "fraction", None),
+]
+
 class AdvancedCalculator:
     def __init__(self, root):
         self.root = root
         self.root.title("Advanced Calculator")
         self.root.geometry("500x700")
         
+        self.profile = metrics.start_profile()
+        
+        # Files from older versions move into the data directory on first run
+        os.makedirs(DATA_DIR, exist_ok=True)
+        for path in (HISTORY_FILE, HISTORY_JOURNAL, CACHE_FILE):
+            try:
+                persistence.migrate(os.path.basename(path), path)
+            except OSError:
+                pass
+        
         # Initialize memory
         self.memory = 0
-        self.history = []
+        self.state = persistence.StateStore(STATE_FILE, on_write=metrics.recorder("save_settings_write"))
         self.variables = {}
         self.current_theme = "light"
+        self.programmer_base = "DEC"
+        # Created on first use, by the properties below
+        self._history = None
+        self._formulas = None
+        self._backend = None
+        self._result_cache = None
         
         # Create UI
         self.create_ui()
         self.load_settings()
+        self.root.protocol("WM_DELETE_WINDOW", self.exit)
+    
+    @property
+    def history(self):
+        if self._history is None:
+            from history import HistoryStore
+            self._history = HistoryStore(HISTORY_JOURNAL)
+        return self._history
+    
+    @property
+    def formulas(self):
+        if self._formulas is None:
+            from formulas import FormulaSheet
+            self._formulas = FormulaSheet(self.variables)
+        return self._formulas
+    
+    @property
+    def backend(self):
+        if self._backend is None:
+            import backends
+            self._backend = backends.FLOAT
+        return self._backend
+    
+    @property
+    def result_cache(self):
+        # The saved cache is read the first time a result is looked up
+        if self._result_cache is None:
+            from memo import ResultCache
+            self._result_cache = ResultCache()
+            self.load_cache()
+        return self._result_cache
         
     def create_ui(self):
         # Result display
@@ -34,6 +115,20 @@ class AdvancedCalculator:
         )
         self.result_display.pack(fill=tk.X, padx=10, pady=10)
         
+        # Live preview of the expression being typed, updated incrementally
+        self.preview_var = tk.StringVar()
+        self.preview_display = ttk.Label(
+            self.root,
+            textvariable=self.preview_var,
+            font=('Arial', 12),
+            anchor="e",
+            foreground="gray"
+        )
+        self.preview_display.pack(fill=tk.X, padx=10)
+        self.live_expression = None  # Created by the first preview
+        self.preview_job = None
+        self.result_var.trace_add("write", self.schedule_preview)
+        
         # History display
         self.history_display = tk.Listbox(
             self.root,
@@ -46,25 +141,27 @@ class AdvancedCalculator:
         self.notebook = ttk.Notebook(self.root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        # Standard calculator tab
+        # Tabs are added empty and built the first time they are selected, so
+        # only the Standard tab's widgets exist at first paint
         self.standard_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.standard_frame, text="Standard")
-        self.create_standard_calculator()
-        
-        # Scientific calculator tab
         self.scientific_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.scientific_frame, text="Scientific")
-        self.create_scientific_calculator()
-        
-        # Programmer calculator tab
         self.programmer_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.programmer_frame, text="Programmer")
-        self.create_programmer_calculator()
-        
-        # Unit converter tab
         self.converter_frame = ttk.Frame(self.notebook)
         self.notebook.add(self.converter_frame, text="Converter")
-        self.create_converter()
+        self.statistics_frame = ttk.Frame(self.notebook)
+        self.notebook.add(self.statistics_frame, text="Statistics")
+        self.tab_builders = {
+            str(self.standard_frame): self.create_standard_calculator,
+            str(self.scientific_frame): self.create_scientific_calculator,
+            str(self.programmer_frame): self.create_programmer_calculator,
+            str(self.converter_frame): self.create_converter,
+            str(self.statistics_frame): self.create_statistics,
+        }
+        self.notebook.bind("<<NotebookTabChanged>>", self.build_selected_tab)
+        self.build_selected_tab()
         
         # Memory buttons
         self.create_memory_buttons()
@@ -72,6 +169,11 @@ class AdvancedCalculator:
         # Menu bar
         self.create_menu()
         
+    def build_selected_tab(self, event=None):
+        builder = self.tab_builders.pop(self.notebook.select(), None)
+        if builder is not None:
+            builder()
+    
     def create_standard_calculator(self):
         buttons = [
             '7', '8', '9', '/', 'C',
@@ -84,7 +186,7 @@ class AdvancedCalculator:
     
     def create_scientific_calculator(self):
         buttons = [
-            'sin', 'cos', 'tan', '√', '^',
+            'sin', 'cos', 'tan', '√', 'xʸ',
             'asin', 'acos', 'atan', 'log', 'ln',
             'π', 'e', '(', ')', '=',
             '7', '8', '9', '/', 'C',
@@ -92,48 +194,89 @@ class AdvancedCalculator:
             '1', '2', '3', '-', 'M+',
             '0', '.', '(', ')', '+'
         ]
-        
+
+        # Calculus on an expression in one variable, over [from, to]; the keypad
+        # has no letters, so the expression has its own entry
+        expression_frame = ttk.Frame(self.scientific_frame)
+        expression_frame.pack(fill=tk.X, padx=10, pady=(5, 0))
+        ttk.Label(expression_frame, text="f:").pack(side=tk.LEFT)
+        self.calculus_expression = tk.StringVar()
+        ttk.Entry(expression_frame, textvariable=self.calculus_expression).pack(side=tk.LEFT, fill=tk.X, expand=True)
+        calculus_frame = ttk.Frame(self.scientific_frame)
+        calculus_frame.pack(fill=tk.X, padx=10, pady=5)
+        self.calculus_var = tk.StringVar(value="x")
+        self.calculus_lo = tk.StringVar(value="-10")
+        self.calculus_hi = tk.StringVar(value="10")
+        for label, var, width in (("Var:", self.calculus_var, 4),
+                                  ("From:", self.calculus_lo, 6),
+                                  ("To:", self.calculus_hi, 6)):
+            ttk.Label(calculus_frame, text=label).pack(side=tk.LEFT)
+            ttk.Entry(calculus_frame, textvariable=var, width=width).pack(side=tk.LEFT, padx=(0, 5))
+        for text in ("d/dx", "Solve", "∫", "Min"):
+            ttk.Button(
+                calculus_frame,
+                text=text,
+                width=5,
+                command=partial(self.run_calculus, text)
+            ).pack(side=tk.LEFT, padx=1)
+
         self.create_button_grid(self.scientific_frame, buttons)
-    
+
     def create_programmer_calculator(self):
         buttons = [
             'HEX', 'DEC', 'OCT', 'BIN', 'C',
             'AND', 'OR', 'XOR', 'NOT', '⌫',
-            '<<', '>>', 'MOD', '^', '=',
+            '<<', '>>', 'MOD', 'xʸ', '=',
             '7', '8', '9', '/', 'M+',
             '4', '5', '6', '*', 'M-',
             '1', '2', '3', '-', 'MR',
             '0', '.', '(', ')', '+'
         ]
         
-        self.create_button_grid(self.programmer_frame, buttons)
+        import programmer
+        
+        self.programmer_engine = programmer.IntegerEngine(64)
+        
+        # Word size for two's-complement wrapping
+        self.word_size = tk.StringVar(value="64-bit")
+        ttk.OptionMenu(
+            self.programmer_frame,
+            self.word_size,
+            "64-bit",
+            *PROGRAMMER_WORD_SIZES,
+            command=self.set_word_size
+        ).pack(fill=tk.X, padx=10, pady=5)
+        
+        self.create_button_grid(self.programmer_frame, buttons, self.calculate_programmer)
     
     def create_converter(self):
-        # Conversion types
-        conversion_types = [
-            "Length", "Weight", "Temperature", "Area", "Volume"
-        ]
+        from calc_core import CONVERSION_UNITS
         
+        # Conversion types, in menu order
+        types = list(CONVERSION_UNITS)
         self.conversion_type = tk.StringVar()
-        self.conversion_type.set(conversion_types[0])
+        self.conversion_type.set(types[0])
         
         type_menu = ttk.OptionMenu(
             self.converter_frame,
             self.conversion_type,
-            *conversion_types
+            types[0],
+            *types
         )
         type_menu.pack(fill=tk.X, padx=10, pady=5)
         
-        # From unit
+        # Unit dropdowns; created once, their menus are refilled on type changes
+        units = CONVERSION_UNITS[types[0]]
         self.from_unit = tk.StringVar()
-        self.from_unit.set("meters")
-        
-        # To unit
         self.to_unit = tk.StringVar()
-        self.to_unit.set("feet")
         
-        # Create unit dropdowns
-        self.update_unit_dropdowns()
+        ttk.Label(self.converter_frame, text="From:").pack(pady=5)
+        self.from_menu = ttk.OptionMenu(self.converter_frame, self.from_unit, units[0], *units)
+        self.from_menu.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(self.converter_frame, text="To:").pack(pady=5)
+        self.to_menu = ttk.OptionMenu(self.converter_frame, self.to_unit, units[1], *units)
+        self.to_menu.pack(fill=tk.X, padx=10, pady=5)
         
         # Value entry
         ttk.Label(self.converter_frame, text="Value:").pack(pady=5)
@@ -155,130 +298,142 @@ class AdvancedCalculator:
         # Bind conversion type change
         self.conversion_type.trace_add("write", self.update_unit_dropdowns)
     
-    def update_unit_dropdowns(self, *args):
-        # Clear existing dropdowns
-        for widget in self.converter_frame.winfo_children():
-            if isinstance(widget, ttk.OptionMenu) and widget not in [self.conversion_type]:
-                widget.destroy()
+    def create_statistics(self):
+        # Streaming summary: typed values and whole files fold into one Summary
+        # that never holds the data itself
+        from stats import Summary
         
-        # Get current conversion type
-        conv_type = self.conversion_type.get()
+        self.statistics = Summary()
+        self.statistics_job = None
         
-        # Define units for each type
-        units = {
-            "Length": ["meters", "feet", "inches", "centimeters", "miles", "kilometers"],
-            "Weight": ["kilograms", "pounds", "ounces", "grams", "tons"],
-            "Temperature": ["celsius", "fahrenheit", "kelvin"],
-            "Area": ["square meters", "square feet", "acres", "hectares"],
-            "Volume": ["liters", "gallons", "cubic meters", "cubic feet"]
-        }
+        ttk.Label(self.statistics_frame, text="Values (separated by spaces or commas):").pack(pady=5)
+        self.statistics_entry = ttk.Entry(self.statistics_frame)
+        self.statistics_entry.pack(fill=tk.X, padx=10, pady=5)
+        self.statistics_entry.bind("<Return>", lambda event: self.add_statistics_values())
         
-        # Create from unit dropdown
-        ttk.Label(self.converter_frame, text="From:").pack(pady=5)
-        from_menu = ttk.OptionMenu(
-            self.converter_frame,
-            self.from_unit,
-            units[conv_type][0],
-            *units[conv_type]
-        )
-        from_menu.pack(fill=tk.X, padx=10, pady=5)
+        button_frame = ttk.Frame(self.statistics_frame)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        for text, command in (
+            ("Add", self.add_statistics_values),
+            ("Add Display", self.add_statistics_display),
+            ("Load File...", self.load_statistics_file),
+            ("Clear", self.clear_statistics),
+        ):
+            ttk.Button(button_frame, text=text, command=command).pack(side=tk.LEFT, expand=True, padx=2)
         
-        # Create to unit dropdown
-        ttk.Label(self.converter_frame, text="To:").pack(pady=5)
-        to_menu = ttk.OptionMenu(
-            self.converter_frame,
-            self.to_unit,
-            units[conv_type][1],
-            *units[conv_type]
-        )
-        to_menu.pack(fill=tk.X, padx=10, pady=5)
+        self.statistics_report = tk.Text(self.statistics_frame, height=12, font=("Courier", 10))
+        self.statistics_report.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        self.show_statistics()
+    
+    def show_statistics(self):
+        from stats import format_report
+        
+        self.statistics_report.config(state=tk.NORMAL)
+        self.statistics_report.delete("1.0", tk.END)
+        if self.statistics.count:
+            self.statistics_report.insert(tk.END, format_report(self.statistics.report()))
+        else:
+            self.statistics_report.insert(tk.END, "No values yet")
+        self.statistics_report.config(state=tk.DISABLED)
+    
+    def add_statistics_values(self):
+        from stats import parse_values
+        
+        try:
+            values = parse_values(self.statistics_entry.get())
+        except ValueError:
+            messagebox.showerror("Error", "Values must be numbers")
+            return
+        self.statistics.extend(values)
+        self.statistics_entry.delete(0, tk.END)
+        self.show_statistics()
+    
+    def add_statistics_display(self):
+        try:
+            self.statistics.add(float(self.result_var.get()))
+        except ValueError:
+            messagebox.showerror("Error", "Invalid value in display")
+            return
+        self.show_statistics()
+    
+    def clear_statistics(self):
+        from stats import Summary
+        
+        self.statistics = Summary()
+        self.show_statistics()
+    
+    def load_statistics_file(self):
+        # The file is summarized on a worker thread into its own Summary, which
+        # is merged in on the Tk thread once it is done
+        import threading
+        from tkinter import filedialog
+        from stats import summarize_file
+        
+        if self.statistics_job is not None:
+            messagebox.showinfo("Statistics", "A file is still being read")
+            return
+        path = filedialog.askopenfilename(title="Load Values")
+        if not path:
+            return
+        outcome = {}
+        
+        def work():
+            try:
+                outcome["summary"] = summarize_file(path)
+            except (OSError, ValueError) as e:
+                outcome["error"] = e
+        
+        worker = threading.Thread(target=work, name="statistics-loader", daemon=True)
+        worker.start()
+        self.statistics_job = worker
+        self.statistics_report.config(state=tk.NORMAL)
+        self.statistics_report.insert(tk.END, f"\n\nReading {os.path.basename(path)}...")
+        self.statistics_report.config(state=tk.DISABLED)
+        
+        def poll():
+            if worker.is_alive():
+                self.root.after(STATISTICS_POLL_MS, poll)
+                return
+            self.statistics_job = None
+            if "error" in outcome:
+                messagebox.showerror("Error", f"Failed to read {path}: {outcome['error']}")
+            else:
+                self.statistics.merge(outcome["summary"])
+            self.show_statistics()
+        
+        self.root.after(STATISTICS_POLL_MS, poll)
+    
+    def update_unit_dropdowns(self, *args):
+        # Refills the existing menus in place; no widgets are created or destroyed
+        from calc_core import CONVERSION_UNITS
+        
+        units = CONVERSION_UNITS[self.conversion_type.get()]
+        self.from_menu.set_menu(units[0], *units)
+        self.to_menu.set_menu(units[1], *units)
     
+    @metrics.instrument("perform_conversion")
     def perform_conversion(self):
+        from calc_core import convert
+        
         try:
             value = float(self.convert_value.get())
-            from_unit = self.from_unit.get()
-            to_unit = self.to_unit.get()
-            conv_type = self.conversion_type.get()
-            
-            # Length conversions
-            if conv_type == "Length":
-                # Convert to meters first
-                if from_unit == "meters":
-                    meters = value
-                elif from_unit == "feet":
-                    meters = value * 0.3048
-                elif from_unit == "inches":
-                    meters = value * 0.0254
-                elif from_unit == "centimeters":
-                    meters = value * 0.01
-                elif from_unit == "miles":
-                    meters = value * 1609.34
-                elif from_unit == "kilometers":
-                    meters = value * 1000
-                
-                # Convert from meters to target unit
-                if to_unit == "meters":
-                    result = meters
-                elif to_unit == "feet":
-                    result = meters / 0.3048
-                elif to_unit == "inches":
-                    result = meters / 0.0254
-                elif to_unit == "centimeters":
-                    result = meters / 0.01
-                elif to_unit == "miles":
-                    result = meters / 1609.34
-                elif to_unit == "kilometers":
-                    result = meters / 1000
-            
-            # Weight conversions
-            elif conv_type == "Weight":
-                # Convert to kilograms first
-                if from_unit == "kilograms":
-                    kg = value
-                elif from_unit == "pounds":
-                    kg = value * 0.453592
-                elif from_unit == "ounces":
-                    kg = value * 0.0283495
-                elif from_unit == "grams":
-                    kg = value * 0.001
-                elif from_unit == "tons":
-                    kg = value * 907.185
-                
-                # Convert from kg to target unit
-                if to_unit == "kilograms":
-                    result = kg
-                elif to_unit == "pounds":
-                    result = kg / 0.453592
-                elif to_unit == "ounces":
-                    result = kg / 0.0283495
-                elif to_unit == "grams":
-                    result = kg / 0.001
-                elif to_unit == "tons":
-                    result = kg / 907.185
-            
-            # Temperature conversions
-            elif conv_type == "Temperature":
-                # Convert to Celsius first
-                if from_unit == "celsius":
-                    celsius = value
-                elif from_unit == "fahrenheit":
-                    celsius = (value - 32) * 5/9
-                elif from_unit == "kelvin":
-                    celsius = value - 273.15
-                
-                # Convert from Celsius to target unit
-                if to_unit == "celsius":
-                    result = celsius
-                elif to_unit == "fahrenheit":
-                    result = (celsius * 9/5) + 32
-                elif to_unit == "kelvin":
-                    result = celsius + 273.15
-            
-            # Add other conversion types here...
-            
-            self.convert_result.config(text=f"{value} {from_unit} = {result:.4f} {to_unit}")
         except ValueError:
+            metrics.mark_error()
             messagebox.showerror("Error", "Please enter a valid number")
+            return
+        
+        from_unit = self.from_unit.get()
+        to_unit = self.to_unit.get()
+        conv_type = self.conversion_type.get()
+        
+        try:
+            result = convert(value, from_unit, to_unit, conv_type)
+        except ValueError as e:
+            metrics.mark_error()
+            messagebox.showerror("Error", f"Conversion failed: {e}")
+            return
+        
+        self.convert_result.config(text=f"{value} {from_unit} = {result:.4f} {to_unit}")
     
     def create_memory_buttons(self):
         memory_frame = ttk.Frame(self.root)
@@ -308,12 +463,13 @@ class AdvancedCalculator:
         file_menu.add_command(label="Save History", command=self.save_history)
         file_menu.add_command(label="Load History", command=self.load_history)
         file_menu.add_separator()
-        file_menu.add_command(label="Exit", command=self.root.quit)
+        file_menu.add_command(label="Exit", command=self.exit)
         menubar.add_cascade(label="File", menu=file_menu)
         
         # Edit menu
         edit_menu = tk.Menu(menubar, tearoff=0)
         edit_menu.add_command(label="Clear History", command=self.clear_history)
+        edit_menu.add_command(label="Search History", command=self.show_history_search)
         edit_menu.add_command(label="Variables", command=self.show_variables)
         menubar.add_cascade(label="Edit", menu=edit_menu)
         
@@ -321,6 +477,23 @@ class AdvancedCalculator:
         view_menu = tk.Menu(menubar, tearoff=0)
         view_menu.add_command(label="Light Theme", command=lambda: self.set_theme("light"))
         view_menu.add_command(label="Dark Theme", command=lambda: self.set_theme("dark"))
+        view_menu.add_separator()
+        self.precision_choice = tk.StringVar(value=PRECISION_CHOICES[0][0])
+        for label, name, precision in PRECISION_CHOICES:
+            view_menu.add_radiobutton(
+                label=label,
+                variable=self.precision_choice,
+                value=label,
+                command=partial(self.set_backend, name, precision)
+            )
+        view_menu.add_separator()
+        self.metrics_enabled = tk.BooleanVar(value=metrics.registry.enabled)
+        view_menu.add_checkbutton(
+            label="Collect Metrics",
+            variable=self.metrics_enabled,
+            command=self.toggle_metrics
+        )
+        view_menu.add_command(label="Export Metrics...", command=self.export_metrics)
         menubar.add_cascade(label="View", menu=view_menu)
         
         # Help menu
@@ -330,12 +503,18 @@ class AdvancedCalculator:
         
         self.root.config(menu=menubar)
     
-    def create_button_grid(self, parent, buttons):
+    def create_button_grid(self, parent, buttons, equals_command=None):
         frame = ttk.Frame(parent)
         frame.pack(fill=tk.BOTH, expand=True)
         
-        rows = 5
         cols = 5
+        rows = (len(buttons) + cols - 1) // cols
+        
+        # Weights are set once per row and column, not once per button
+        for col in range(cols):
+            frame.grid_columnconfigure(col, weight=1)
+        for row in range(rows):
+            frame.grid_rowconfigure(row, weight=1)
         
         for i, text in enumerate(buttons):
             row = i // cols
@@ -345,7 +524,7 @@ class AdvancedCalculator:
                 btn = ttk.Button(
                     frame,
                     text=text,
-                    command=self.calculate,
+                    command=equals_command or self.calculate,
                     style='Accent.TButton'
                 )
             else:
@@ -356,9 +535,8 @@ class AdvancedCalculator:
                 )
             
             btn.grid(row=row, column=col, sticky="nsew", padx=2, pady=2)
-            frame.grid_columnconfigure(col, weight=1)
-            frame.grid_rowconfigure(row, weight=1)
     
+    @metrics.instrument("button_click")
     def button_click(self, text):
         current = self.result_var.get()
         
@@ -369,37 +547,31 @@ class AdvancedCalculator:
                 self.result_var.set(current[:-1])
             else:
                 self.result_var.set("0")
-        elif text in ["sin", "cos", "tan", "asin", "acos", "atan", "log", "ln", "√"]:
+        elif text in SCIENTIFIC_KEYS:
+            from calc_core import format_result
+            from history import make_entry
+            
             try:
-                value = float(current)
-                if text == "sin":
-                    result = math.sin(math.radians(value))
-                elif text == "cos":
-                    result = math.cos(math.radians(value))
-                elif text == "tan":
-                    result = math.tan(math.radians(value))
-                elif text == "asin":
-                    result = math.degrees(math.asin(value))
-                elif text == "acos":
-                    result = math.degrees(math.acos(value))
-                elif text == "atan":
-                    result = math.degrees(math.atan(value))
-                elif text == "log":
-                    result = math.log10(value)
-                elif text == "ln":
-                    result = math.log(value)
-                elif text == "√":
-                    result = math.sqrt(value)
+                value = self.backend.number(current)
+                result = self.result_cache.apply_function(text, value, self.backend)
                 
-                self.result_var.set(str(result))
-                self.add_to_history(f"{text}({current}) = {result}")
-            except ValueError:
+                self.result_var.set(format_result(result))
+                self.add_to_history(make_entry(f"{text}({current})", result, function=text, argument=value))
+            except (ValueError, ArithmeticError):
+                metrics.mark_error()
                 messagebox.showerror("Error", "Invalid input for function")
+        elif text in PROGRAMMER_BASES:
+            self.set_programmer_base(text)
+        elif text in PROGRAMMER_OPERATORS:
+            self.result_var.set(current + f" {text} ")
+        elif text == "NOT":
+            self.result_var.set("NOT " if current == "0" else current + "NOT ")
         elif text == "π":
             self.result_var.set(str(math.pi))
         elif text == "e":
             self.result_var.set(str(math.e))
-        elif text == "^":
+        elif text == "xʸ":
+            # ** is power in both parsers; a typed ^ is XOR on the programmer tab
             self.result_var.set(current + "**")
         else:
             if current == "0":
@@ -407,100 +579,278 @@ class AdvancedCalculator:
             else:
                 self.result_var.set(current + text)
     
+    @metrics.instrument("calculate")
     def calculate(self):
+        import quantity
+        from calc_core import format_result
+        from expression import time_limit
+        from history import make_entry
+        
         try:
             expression = self.result_var.get()
-            # Replace special constants
-            expression = expression.replace("π", str(math.pi))
-            expression = expression.replace("e", str(math.e))
-            
-            result = eval(expression, {"__builtins__": None}, {**math.__dict__, **self.variables})
-            self.result_var.set(str(result))
-            self.add_to_history(f"{expression} = {result}")
+            # Parsed once per distinct expression; results are cached per variable bindings
+            with time_limit():
+                if quantity.uses_units(expression, self.variables):
+                    # Units are checked and scaled when the expression is compiled
+                    result = quantity.evaluate(expression, self.variables)
+                    kind = "units"
+                else:
+                    result = self.result_cache.evaluate(expression, self.variables, self.backend)
+                    kind = None
+            self.result_var.set(format_result(result))
+            self.add_to_history(make_entry(expression, result, kind=kind))
         except Exception as e:
+            metrics.mark_error()
             messagebox.showerror("Error", f"Invalid expression: {e}")
     
+    @metrics.instrument("calculus")
+    def run_calculus(self, op):
+        from calc_core import derivative, format_result, integrate, minimize, solve
+        from expression import time_limit
+        from history import make_entry
+        
+        expression = self.calculus_expression.get().strip() or self.result_var.get()
+        var = self.calculus_var.get().strip() or "x"
+        try:
+            lo, hi = float(self.calculus_lo.get()), float(self.calculus_hi.get())
+            # The numeric routines work in floats whatever the backend
+            variables = {name: float(value) for name, value in self.variables.items()}
+            with time_limit():
+                if op == "d/dx":
+                    result = derivative(expression, var)
+                    label = f"d/d{var} {expression}"
+                elif op == "Solve":
+                    result = solve(expression, var, lo, hi, variables)
+                    label = f"roots of {expression} on [{lo:g}, {hi:g}]"
+                elif op == "∫":
+                    result = integrate(expression, var, lo, hi, variables)
+                    label = f"∫ {expression} d{var} from {lo:g} to {hi:g}"
+                else:
+                    result = minimize(expression, var, lo, hi, variables)
+                    label = f"min of {expression} on [{lo:g}, {hi:g}]"
+        except (ValueError, ArithmeticError, TypeError) as e:
+            metrics.mark_error()
+            messagebox.showerror("Error", f"{op} failed: {e}")
+            return
+        if op == "d/dx":
+            # The derivative is an expression; put it back in the entry to go on from
+            self.calculus_expression.set(result)
+        elif op == "Solve":
+            if not result:
+                messagebox.showinfo("Solve", f"No roots found in [{lo:g}, {hi:g}]")
+                return
+            result = ", ".join(f"{root:.12g}" for root in result)
+        elif op == "Min":
+            x, value = result
+            self.result_var.set(format_result(value))
+            result = f"{value} at {var} = {x:.12g}"
+        else:
+            self.result_var.set(format_result(result))
+        self.add_to_history(make_entry(label, result, kind="calculus", operation=op))
+
+    def calculate_programmer(self):
+        from history import make_entry
+        
+        expression = self.result_var.get()
+        try:
+            value = self.programmer_engine.evaluate(expression)
+        except (ValueError, ArithmeticError) as e:
+            messagebox.showerror("Error", f"Invalid expression: {e}")
+            return
+        result = self.programmer_engine.format(value, self.programmer_base)
+        self.result_var.set(result)
+        self.add_to_history(make_entry(
+            expression, result, kind="programmer",
+            word_size=self.programmer_engine.word_size, base=self.programmer_base,
+        ))
+    
+    def set_programmer_base(self, base):
+        # Re-display the current value in the new base
+        self.programmer_base = base
+        try:
+            value = self.programmer_engine.evaluate(self.result_var.get())
+        except (ValueError, ArithmeticError):
+            return
+        self.result_var.set(self.programmer_engine.format(value, base))
+    
+    def set_word_size(self, label):
+        import programmer
+        
+        self.programmer_engine = programmer.IntegerEngine(PROGRAMMER_WORD_SIZES[label])
+        self.set_programmer_base(self.programmer_base)
+    
+    def schedule_preview(self, *args):
+        # Debounced so a burst of presses costs one preview, off the press itself
+        if self.preview_job is not None:
+            self.root.after_cancel(self.preview_job)
+        self.preview_job = self.root.after(PREVIEW_DELAY_MS, self.update_preview)
+    
+    def update_preview(self):
+        self.preview_job = None
+        if self.live_expression is None or self.live_expression.variables is not self.variables:
+            from live import LiveExpression
+            self.live_expression = LiveExpression(variables=self.variables)
+        text = self.result_var.get()
+        self.live_expression.set_text(text)
+        value = self.live_expression.value()
+        try:
+            preview = None if value is None else str(value)
+        except ValueError:
+            preview = None  # An int too long for str(); "=" still shows it in full
+        if preview is None or preview == text:
+            self.preview_var.set("")
+        else:
+            self.preview_var.set(f"= {preview}")
+    
     def add_to_history(self, entry):
+        # The store journals every entry; the Listbox only shows the latest few
+        from history import format_entry
+        
         self.history.append(entry)
-        self.history_display.insert(tk.END, entry)
-        if len(self.history) > 10:  # Limit history to 10 entries
-            self.history.pop(0)
+        self.history_display.insert(tk.END, format_entry(entry))
+        if self.history_display.size() > HISTORY_DISPLAY_LIMIT:
             self.history_display.delete(0)
     
     def clear_history(self):
-        self.history = []
+        self.history.clear()
         self.history_display.delete(0, tk.END)
     
+    @metrics.instrument("save_history")
     def save_history(self):
         try:
-            with open("calculator_history.json", "w") as f:
-                json.dump({
-                    "history": self.history,
-                    "memory": self.memory,
-                    "variables": self.variables
-                }, f)
+            # History entries are already journaled; only the small state is rewritten
+            self.history.flush()
+            persistence.atomic_write(HISTORY_FILE, json.dumps({
+                "memory": self.memory,
+                "variables": self.variables,
+                "formulas": self.formulas.formulas
+            }, default=str))
             messagebox.showinfo("Success", "History saved successfully")
         except Exception as e:
+            metrics.mark_error()
             messagebox.showerror("Error", f"Failed to save history: {e}")
     
+    @metrics.instrument("load_history")
     def load_history(self):
+        from formulas import FormulaSheet
+        from history import format_entry
+        
         try:
-            if os.path.exists("calculator_history.json"):
-                with open("calculator_history.json", "r") as f:
-                    data = json.load(f)
-                self.history = data.get("history", [])
-                self.memory = data.get("memory", 0)
-                self.variables = data.get("variables", {})
+            if os.path.exists(HISTORY_FILE) or os.path.exists(HISTORY_JOURNAL):
+                self.history.flush()
+                self.history.load()
+                if os.path.exists(HISTORY_FILE):
+                    with open(HISTORY_FILE, "r") as f:
+                        data = json.load(f)
+                    # Files written before the journal existed carry their history inline
+                    if "history" in data and not len(self.history):
+                        self.history.extend(data["history"])
+                    self.memory = data.get("memory", 0)
+                    self.variables = data.get("variables", {})
+                    self._formulas = FormulaSheet(self.variables)
+                    self.formulas.define_many(data.get("formulas", {}))
+                    self.save_settings()
+                    self.save_variables()
                 
                 self.history_display.delete(0, tk.END)
-                for entry in self.history:
-                    self.history_display.insert(tk.END, entry)
+                for entry in self.history.tail(HISTORY_DISPLAY_LIMIT):
+                    self.history_display.insert(tk.END, format_entry(entry))
                 
                 messagebox.showinfo("Success", "History loaded successfully")
             else:
                 messagebox.showinfo("Info", "No history file found")
         except Exception as e:
+            metrics.mark_error()
             messagebox.showerror("Error", f"Failed to load history: {e}")
     
+    def exit(self):
+        if self._history is not None:
+            self._history.close()
+        try:
+            self.state.close()
+        except OSError:
+            pass
+        self.save_cache()
+        metrics.stop_profile(self.profile)
+        self.root.quit()
+    
+    def toggle_metrics(self):
+        metrics.registry.enabled = self.metrics_enabled.get()
+    
+    def export_metrics(self):
+        from tkinter import filedialog
+        
+        path = filedialog.asksaveasfilename(
+            title="Export Metrics",
+            defaultextension=".json",
+            filetypes=[("JSON", "*.json"), ("Prometheus text", "*.prom")]
+        )
+        if not path:
+            return
+        try:
+            metrics.registry.export(path)
+        except OSError as e:
+            messagebox.showerror("Error", f"Failed to export metrics: {e}")
+    
+    def set_backend(self, name, precision=None):
+        import backends
+        
+        self._backend = backends.get_backend(name, precision)
+    
     def memory_clear(self):
         self.memory = 0
+        self.save_settings()
     
     def memory_recall(self):
         self.result_var.set(str(self.memory))
     
     def memory_add(self):
         try:
-            value = float(self.result_var.get())
-            self.memory += value
-        except ValueError:
+            value = self.backend.number(self.result_var.get())
+            self.memory = self.backend.number(self.memory) + value
+            self.save_settings()
+        except (ValueError, ArithmeticError):
             messagebox.showerror("Error", "Invalid value in display")
     
     def memory_subtract(self):
         try:
-            value = float(self.result_var.get())
-            self.memory -= value
-        except ValueError:
+            value = self.backend.number(self.result_var.get())
+            self.memory = self.backend.number(self.memory) - value
+            self.save_settings()
+        except (ValueError, ArithmeticError):
             messagebox.showerror("Error", "Invalid value in display")
     
     def memory_store(self):
         try:
-            self.memory = float(self.result_var.get())
-        except ValueError:
+            self.memory = self.backend.number(self.result_var.get())
+            self.save_settings()
+        except (ValueError, ArithmeticError):
             messagebox.showerror("Error", "Invalid value in display")
     
     def show_variables(self):
         var_window = tk.Toplevel(self.root)
         var_window.title("Variables")
         
-        # List variables
+        # List variables; formulas show their definition and current value
         ttk.Label(var_window, text="Current Variables:").pack(pady=5)
         var_list = tk.Listbox(var_window)
-        for name, value in self.variables.items():
-            var_list.insert(tk.END, f"{name} = {value}")
         var_list.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
         
-        # Add new variable
-        ttk.Label(var_window, text="Add/Update Variable:").pack(pady=5)
+        def refresh():
+            var_list.delete(0, tk.END)
+            formulas = self.formulas
+            for name, value in self.variables.items():
+                if name in formulas:
+                    var_list.insert(tk.END, f"{name} = {formulas.formulas[name]}  → {value}")
+                else:
+                    var_list.insert(tk.END, f"{name} = {value}")
+            for name, error in formulas.errors.items():
+                var_list.insert(tk.END, f"{name} = {formulas.formulas[name]}  → error: {error}")
+        
+        refresh()
+        
+        # Add new variable; a value that is not a number is stored as a formula
+        ttk.Label(var_window, text="Add/Update Variable or Formula:").pack(pady=5)
         
         var_frame = ttk.Frame(var_window)
         var_frame.pack(fill=tk.X, padx=10, pady=5)
@@ -514,15 +864,28 @@ class AdvancedCalculator:
         var_value.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
         
         def add_variable():
-            name = var_name.get()
+            name = var_name.get().strip()
+            text = var_value.get().strip()
+            if not name.isidentifier():
+                messagebox.showerror("Error", "Name must be a valid identifier")
+                return
             try:
-                value = float(var_value.get())
-                self.variables[name] = value
-                var_list.insert(tk.END, f"{name} = {value}")
-                var_name.delete(0, tk.END)
-                var_value.delete(0, tk.END)
+                # Only the formulas downstream of name are recomputed
+                self.formulas.set(name, float(text))
             except ValueError:
-                messagebox.showerror("Error", "Value must be a number")
+                try:
+                    self.formulas.define(name, text)
+                except ValueError as e:
+                    messagebox.showerror("Error", f"Invalid formula: {e}")
+                    return
+            self.save_variable(name)
+            # Names already resolved in the preview may have changed value
+            if self.live_expression is not None:
+                self.live_expression.clear()
+            self.schedule_preview()
+            refresh()
+            var_name.delete(0, tk.END)
+            var_value.delete(0, tk.END)
         
         ttk.Button(
             var_window,
@@ -530,10 +893,98 @@ class AdvancedCalculator:
             command=add_variable
         ).pack(pady=5)
     
+    def show_history_search(self):
+        # Searches the on-disk journal through its index, so it covers far more
+        # than the entries kept in memory
+        from calc_core import format_result
+        from history import format_entry, make_entry
+        from history_index import HistoryIndex, replay_entry
+        
+        self.history.flush()
+        index = HistoryIndex(HISTORY_JOURNAL)
+        
+        search_window = tk.Toplevel(self.root)
+        search_window.title("Search History")
+        
+        def close():
+            index.close()
+            search_window.destroy()
+        
+        search_window.protocol("WM_DELETE_WINDOW", close)
+        
+        filter_frame = ttk.Frame(search_window)
+        filter_frame.pack(fill=tk.X, padx=10, pady=5)
+        
+        ttk.Label(filter_frame, text="Text:").pack(side=tk.LEFT)
+        text_entry = ttk.Entry(filter_frame)
+        text_entry.pack(side=tk.LEFT, expand=True, fill=tk.X, padx=5)
+        
+        ttk.Label(filter_frame, text="Result from:").pack(side=tk.LEFT)
+        min_entry = ttk.Entry(filter_frame, width=8)
+        min_entry.pack(side=tk.LEFT, padx=5)
+        
+        ttk.Label(filter_frame, text="to:").pack(side=tk.LEFT)
+        max_entry = ttk.Entry(filter_frame, width=8)
+        max_entry.pack(side=tk.LEFT, padx=5)
+        
+        results = tk.Listbox(search_window, selectmode=tk.EXTENDED, width=60)
+        results.pack(fill=tk.BOTH, expand=True, padx=10, pady=5)
+        matches = []
+        
+        def search():
+            try:
+                low = float(min_entry.get()) if min_entry.get().strip() else None
+                high = float(max_entry.get()) if max_entry.get().strip() else None
+            except ValueError:
+                messagebox.showerror("Error", "Result bounds must be numbers")
+                return
+            
+            try:
+                self.history.flush()
+                index.refresh()
+                found = index.search(text_entry.get(), low, high, limit=HISTORY_SEARCH_LIMIT)
+            except Exception as e:
+                messagebox.showerror("Error", f"Search failed: {e}")
+                return
+            
+            matches[:] = found
+            results.delete(0, tk.END)
+            for number in found:
+                results.insert(tk.END, format_entry(index.entry(number)))
+        
+        def replay():
+            for position in results.curselection():
+                entry = index.entry(matches[position])
+                if isinstance(entry, str):
+                    entry = {"expression": entry.rpartition(" = ")[0] or entry}
+                try:
+                    result = replay_entry(entry, self.variables)
+                except Exception as e:
+                    messagebox.showerror("Error", f"Replay failed for {entry['expression']}: {e}")
+                    return
+                self.result_var.set(format_result(result))
+                # Kind and settings carry over, so the new entry replays the same way
+                details = {
+                    key: value for key, value in entry.items()
+                    if key not in ("time", "expression", "result", "function", "argument")
+                }
+                self.add_to_history(make_entry(
+                    entry["expression"], result, entry.get("function"), entry.get("argument"), **details
+                ))
+        
+        button_frame = ttk.Frame(search_window)
+        button_frame.pack(fill=tk.X, padx=10, pady=5)
+        ttk.Button(button_frame, text="Search", command=search).pack(side=tk.LEFT, expand=True)
+        ttk.Button(button_frame, text="Replay Selected", command=replay).pack(side=tk.LEFT, expand=True)
+        
+        search()
+    
     def set_theme(self, theme):
-        self.current_theme = theme
+        self.apply_theme(theme)
         self.save_settings()
-        
+    
+    def apply_theme(self, theme):
+        self.current_theme = theme
         if theme == "dark":
             self.root.tk_setPalette(
                 background="#2d2d2d",
@@ -551,27 +1002,90 @@ class AdvancedCalculator:
             )
             self.result_display.config(background="white", foreground="black")
     
+    @metrics.instrument("save_settings")
     def save_settings(self):
+        # Only updates the state in memory; the store writes it out shortly after,
+        # off the Tk thread, coalescing bursts like repeated M+ into one append
+        self.state.update({"theme": self.current_theme, "memory": self.memory})
+    
+    def save_variable(self, name):
+        # Plain values are stored as "var.<name>", formulas as "formula.<name>"
+        if name in self.formulas:
+            self.state.delete("var." + name)
+            self.state.set("formula." + name, self.formulas.formulas[name])
+        else:
+            self.state.delete("formula." + name)
+            self.state.set("var." + name, self.variables[name])
+    
+    def save_variables(self):
+        current = {f"formula.{name}" for name in self.formulas.formulas}
+        current.update(f"var.{name}" for name in self.variables if name not in self.formulas)
+        for key in list(self.state.values):
+            if key.startswith(("var.", "formula.")) and key not in current:
+                self.state.delete(key)
+        for name in self.variables:
+            self.save_variable(name)
+        for name in self.formulas.formulas:
+            self.save_variable(name)
+    
+    def save_cache(self):
+        if self._result_cache is None:
+            return  # Never used this session; the file on disk is current
         try:
-            with open("calculator_settings.json", "w") as f:
-                json.dump({
-                    "theme": self.current_theme,
-                    "memory": self.memory
-                }, f)
-        except:
+            self._result_cache.save(CACHE_FILE)
+        except OSError:
             pass
     
-    def load_settings(self):
+    def load_cache(self):
         try:
-            if os.path.exists("calculator_settings.json"):
-                with open("calculator_settings.json", "r") as f:
-                    settings = json.load(f)
-                self.current_theme = settings.get("theme", "light")
-                self.memory = settings.get("memory", 0)
-                self.set_theme(self.current_theme)
-        except:
+            if os.path.exists(CACHE_FILE):
+                self._result_cache.load(CACHE_FILE)
+        except (OSError, ValueError, KeyError, TypeError):
             pass
     
+    @metrics.instrument("load_settings")
+    def load_settings(self):
+        try:
+            state = self.state.load()
+        except OSError:
+            metrics.mark_error()
+            state = {}
+        if not state:
+            state = self.load_legacy_settings()
+            if state:
+                self.state.update(state)
+        self.memory = state.get("memory", 0)
+        self.variables.update(self.state.items("var."))
+        formulas = dict(self.state.items("formula."))
+        if formulas:
+            from expression import ExpressionError
+            
+            try:
+                self.formulas.define_many(formulas)
+            except ExpressionError:
+                # One bad formula must not cost the rest; load them one at a time
+                for name, text in formulas.items():
+                    try:
+                        self.formulas.define(name, text)
+                    except ExpressionError:
+                        pass
+        theme = state.get("theme", "light")
+        if theme != self.current_theme:
+            self.apply_theme(theme)
+    
+    def load_legacy_settings(self):
+        try:
+            with open(LEGACY_SETTINGS_FILE, "r") as f:
+                settings = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            metrics.mark_error()
+            return {}
+        if not isinstance(settings, dict):
+            return {}
+        return {key: settings[key] for key in ("theme", "memory") if key in settings}
+    
     def show_about(self):
         messagebox.showinfo(
             "About Advanced Calculator",
@@ -582,6 +1096,7 @@ class AdvancedCalculator:
             "- Unit conversion\n"
             "- History tracking\n"
             "- Variable support\n"
+            "- Streaming statistics\n"
             "- Themes\n\n"
             "Created with Python and Tkinter"
         )
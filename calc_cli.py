@@ -0,0 +1,93 @@
+import argparse
+import sys
+
+from calc_core import evaluate_lines, format_result
+
+
+def parse_variable(text):
+    name, sep, value = text.partition("=")
+    if not sep or not name.strip():
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got {text!r}")
+    try:
+        return name.strip(), float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"value for {name.strip()!r} must be a number") from None
+
+
+def iter_input(paths):
+    if not paths or paths == ["-"]:
+        yield from sys.stdin
+        return
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+            continue
+        with open(path, "r") as f:
+            yield from f
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        prog="python -m calc_cli",
+        description="Evaluate calculator expressions, one per line, without starting the GUI.",
+    )
+    parser.add_argument("files", nargs="*", help="input files (default: stdin, '-' also means stdin)")
+    parser.add_argument(
+        "-v", "--var", action="append", default=[], type=parse_variable, metavar="NAME=VALUE",
+        help="bind a variable before evaluating (repeatable)",
+    )
+    parser.add_argument(
+        "-s", "--stop-on-error", action="store_true",
+        help="stop at the first line that fails instead of reporting it and continuing",
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=1, metavar="N",
+        help="evaluate on N worker processes (0 means one per CPU); assignments are not supported",
+    )
+    parser.add_argument(
+        "--chunk-size", type=int, metavar="LINES",
+        help="lines sent to a worker at a time with --jobs (default: 1024)",
+    )
+    parser.add_argument(
+        "--unordered", action="store_true",
+        help="with --jobs, print results as they finish, prefixed with their line number",
+    )
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    lines = iter_input(args.files)
+    variables = dict(args.var)
+    if args.jobs == 1:
+        results = evaluate_lines(lines, variables)
+    else:
+        # Imported here so the single-process path doesn't pay for multiprocessing
+        from parallel import DEFAULT_CHUNK_SIZE, evaluate_parallel
+        results = evaluate_parallel(
+            lines, variables, workers=args.jobs or None,
+            chunk_size=args.chunk_size or DEFAULT_CHUNK_SIZE, ordered=not args.unordered,
+        )
+    prefix_numbers = args.unordered and args.jobs != 1
+
+    write = sys.stdout.write
+    failed = False
+    for number, line, result, error in results:
+        prefix = f"{number}\t" if prefix_numbers else ""
+        if error is None:
+            try:
+                write(prefix + format_result(result) + "\n")
+                continue
+            except ValueError as e:
+                error = e
+        failed = True
+        write(f"{prefix}error: {error}\n")
+        print(f"line {number}: {line}: {error}", file=sys.stderr)
+        if args.stop_on_error:
+            break
+    sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
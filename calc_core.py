@@ -0,0 +1,133 @@
+import math
+import re
+
+import calculus
+import programmer
+import quantity
+import units
+from expression import compile_expression, time_limit
+
+# GUI-free calculator logic shared by cal.py, the command line and batch tools.
+# Nothing in here may import tkinter.
+
+# Functions the Scientific tab applies to the number in the display (angles in degrees)
+SCIENTIFIC_FUNCTIONS = {
+    "sin": lambda x: math.sin(math.radians(x)),
+    "cos": lambda x: math.cos(math.radians(x)),
+    "tan": lambda x: math.tan(math.radians(x)),
+    "asin": lambda x: math.degrees(math.asin(x)),
+    "acos": lambda x: math.degrees(math.acos(x)),
+    "atan": lambda x: math.degrees(math.atan(x)),
+    "log": math.log10,
+    "ln": math.log,
+    "√": math.sqrt,
+}
+
+CONVERSION_UNITS = {name: category.units for name, category in units.categories.items()}
+
+ASSIGNMENT_RE = re.compile(r"^\s*([^\W\d]\w*)\s*=(?!=)(.*)$")
+
+
+def evaluate(expression, variables=None):
+    return compile_expression(expression).evaluate(variables)
+
+
+def evaluate_quantity(expression, variables=None):
+    # "3 ft + 2 m", "60 mi/h in m/s"; plain expressions work too
+    return quantity.evaluate(expression, variables)
+
+
+def apply_function(name, value):
+    try:
+        fn = SCIENTIFIC_FUNCTIONS[name]
+    except KeyError:
+        raise ValueError(f"unknown function '{name}'") from None
+    return fn(value)
+
+
+def convert(value, from_unit, to_unit, conv_type):
+    return units.convert(value, from_unit, to_unit, conv_type)
+
+
+def convert_many(values, from_unit, to_unit, conv_type):
+    return units.convert_many(values, from_unit, to_unit, conv_type)
+
+
+def to_base(value, base):
+    return programmer.to_string(int(value), base)
+
+
+def from_base(text, base):
+    return programmer.from_string(text, base)
+
+
+def bitwise(op, a, b=None, word_size=None):
+    engine = programmer.IntegerEngine(word_size) if word_size else programmer.UNBOUNDED
+    return engine.apply(op, int(a), None if b is None else int(b))
+
+
+def evaluate_programmer(expression, word_size=None):
+    engine = programmer.IntegerEngine(word_size) if word_size else programmer.UNBOUNDED
+    return engine.evaluate(expression)
+
+
+def derivative(expression, var="x", order=1):
+    return calculus.derivative(expression, var, order)
+
+
+def solve(expression, var="x", lo=-10.0, hi=10.0, variables=None):
+    return calculus.find_roots(expression, var, lo, hi, variables)
+
+
+def integrate(expression, var="x", a=0.0, b=1.0, variables=None):
+    return calculus.integrate(expression, var, a, b, variables)
+
+
+def minimize(expression, var="x", lo=-10.0, hi=10.0, variables=None):
+    return calculus.minimize(expression, var, lo, hi, variables)
+
+
+def format_result(value):
+    # str() refuses ints past 4300 digits; programmer's conversion has no limit
+    if isinstance(value, int) and not isinstance(value, bool):
+        return programmer.to_string(value)
+    return str(value)
+
+
+class Calculator:
+    def __init__(self, variables=None):
+        self.memory = 0
+        self.variables = dict(variables or {})
+
+    def evaluate(self, expression):
+        if quantity.uses_units(expression, self.variables):
+            return quantity.evaluate(expression, self.variables)
+        return compile_expression(expression).evaluate(self.variables)
+
+    def execute(self, line):
+        # "name = expression" binds a variable, anything else is evaluated
+        match = ASSIGNMENT_RE.match(line)
+        if match:
+            name, expression = match.groups()
+            value = self.evaluate(expression)
+            self.variables[name] = value
+            return value
+        return self.evaluate(line)
+
+
+def evaluate_lines(lines, variables=None):
+    # Lazily yields (line_number, line, result, error) so input of any size runs
+    # in constant memory; blank lines and "#" comments are skipped
+    calculator = Calculator(variables)
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            # Each line gets the GUI's time limit, so one hostile line can't stall the batch
+            with time_limit():
+                result = calculator.execute(line)
+        except Exception as e:
+            yield number, line, None, e
+        else:
+            yield number, line, result, None
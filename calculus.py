@@ -0,0 +1,511 @@
+import math
+
+from expression import ExpressionError, _left_spine, compile_expression, parse
+
+# Calculus on the expression AST (see expression.py for the node shapes):
+# symbolic derivatives with light simplification, and numeric root finding,
+# integration and minimization over expressions compiled to closures.
+#
+# Numeric routines sample the expression on a grid first. The grid goes through
+# vectorized.evaluate_many, so with NumPy installed it is one array evaluation;
+# each bracket or candidate found there is then refined by a compiled scalar
+# function, which evaluates in well under a microsecond for short expressions.
+
+DEFAULT_SAMPLES = 1000
+DEFAULT_TOLERANCE = 1e-12
+MAX_ITERATIONS = 100
+MAX_SIMPSON_INTERVALS = 200000
+
+
+# Building nodes, folding constants and dropping identities as we go
+
+def _num(value):
+    return ("num", value)
+
+
+def _is_num(node, value=None):
+    return node[0] == "num" and (value is None or node[1] == value)
+
+
+def _fold(op, a, b):
+    try:
+        return _num(op(a[1], b[1]))
+    except (ArithmeticError, ValueError):
+        return None
+
+
+def add(a, b):
+    if _is_num(a) and _is_num(b):
+        return _fold(lambda x, y: x + y, a, b) or ("bin", "+", a, b)
+    if _is_num(a, 0):
+        return b
+    if _is_num(b, 0):
+        return a
+    if b[0] == "neg":
+        return sub(a, b[1])
+    return ("bin", "+", a, b)
+
+
+def sub(a, b):
+    if _is_num(a) and _is_num(b):
+        return _fold(lambda x, y: x - y, a, b) or ("bin", "-", a, b)
+    if _is_num(b, 0):
+        return a
+    if _is_num(a, 0):
+        return neg(b)
+    if a == b:
+        return _num(0)
+    return ("bin", "-", a, b)
+
+
+def mul(a, b):
+    if _is_num(a) and _is_num(b):
+        return _fold(lambda x, y: x * y, a, b) or ("bin", "*", a, b)
+    if _is_num(a, 0) or _is_num(b, 0):
+        return _num(0)
+    if _is_num(a, 1):
+        return b
+    if _is_num(b, 1):
+        return a
+    if _is_num(a, -1):
+        return neg(b)
+    if _is_num(b, -1):
+        return neg(a)
+    if _is_num(b):
+        a, b = b, a  # Constants first: 2 * x rather than x * 2
+    if _is_num(a) and b[0] == "bin" and b[1] == "*" and _is_num(b[2]):
+        return mul(mul(a, b[2]), b[3])
+    if a[0] == "bin" and a[1] == "/" and _is_num(a[2], 1):
+        return div(b, a[3])
+    if b[0] == "bin" and b[1] == "/" and _is_num(b[2], 1):
+        return div(a, b[3])
+    if a[0] == "neg":
+        return neg(mul(a[1], b))
+    if b[0] == "neg":
+        return neg(mul(a, b[1]))
+    return ("bin", "*", a, b)
+
+
+def div(a, b):
+    if _is_num(b, 1):
+        return a
+    if _is_num(a, 0) and not _is_num(b, 0):
+        return _num(0)
+    if _is_num(a) and _is_num(b) and b[1] != 0:
+        if isinstance(a[1], int) and isinstance(b[1], int) and a[1] % b[1]:
+            return ("bin", "/", a, b)  # Keep 1/3 readable instead of 0.333...
+        return _fold(lambda x, y: x / y, a, b) or ("bin", "/", a, b)
+    if a == b:
+        return _num(1)
+    return ("bin", "/", a, b)
+
+
+def power(a, b):
+    if _is_num(b, 0):
+        return _num(1)
+    if _is_num(b, 1):
+        return a
+    if _is_num(a) and _is_num(b) and isinstance(b[1], int) and abs(b[1]) <= 64:
+        return _fold(lambda x, y: x ** y, a, b) or ("bin", "**", a, b)
+    return ("bin", "**", a, b)
+
+
+def neg(a):
+    if _is_num(a):
+        return _num(-a[1])
+    if a[0] == "neg":
+        return a[1]
+    return ("neg", a)
+
+
+def call(name, *args):
+    return ("call", name, args)
+
+
+# Derivatives
+
+def _depends_on(node, var):
+    # A walk with an explicit stack, so long sums don't recurse once per term
+    stack = [node]
+    while stack:
+        node = stack.pop()
+        kind = node[0]
+        if kind == "name":
+            if node[1] == var:
+                return True
+        elif kind == "neg" or kind == "pos":
+            stack.append(node[1])
+        elif kind == "bin":
+            stack.append(node[2])
+            stack.append(node[3])
+        elif kind == "call":
+            stack.extend(node[2])
+    return False
+
+
+# d/du of f(u) for one-argument functions, as a function of the argument node
+_CHAIN_RULES = {
+    "sin": lambda u: call("cos", u),
+    "cos": lambda u: neg(call("sin", u)),
+    "tan": lambda u: div(_num(1), power(call("cos", u), _num(2))),
+    "asin": lambda u: div(_num(1), call("sqrt", sub(_num(1), power(u, _num(2))))),
+    "acos": lambda u: neg(div(_num(1), call("sqrt", sub(_num(1), power(u, _num(2)))))),
+    "atan": lambda u: div(_num(1), add(_num(1), power(u, _num(2)))),
+    "sinh": lambda u: call("cosh", u),
+    "cosh": lambda u: call("sinh", u),
+    "tanh": lambda u: sub(_num(1), power(call("tanh", u), _num(2))),
+    "asinh": lambda u: div(_num(1), call("sqrt", add(power(u, _num(2)), _num(1)))),
+    "acosh": lambda u: div(_num(1), call("sqrt", sub(power(u, _num(2)), _num(1)))),
+    "atanh": lambda u: div(_num(1), sub(_num(1), power(u, _num(2)))),
+    "exp": lambda u: call("exp", u),
+    "expm1": lambda u: call("exp", u),
+    "log": lambda u: div(_num(1), u),
+    "log10": lambda u: div(_num(1), mul(u, call("log", _num(10)))),
+    "log2": lambda u: div(_num(1), mul(u, call("log", _num(2)))),
+    "log1p": lambda u: div(_num(1), add(_num(1), u)),
+    "sqrt": lambda u: div(_num(1), mul(_num(2), call("sqrt", u))),
+    "fabs": lambda u: div(u, call("fabs", u)),
+    "erf": lambda u: mul(div(_num(2), call("sqrt", ("name", "pi"))), call("exp", neg(power(u, _num(2))))),
+    "erfc": lambda u: neg(mul(div(_num(2), call("sqrt", ("name", "pi"))), call("exp", neg(power(u, _num(2)))))),
+    "degrees": lambda u: div(_num(180), ("name", "pi")),
+    "radians": lambda u: div(("name", "pi"), _num(180)),
+    # Piecewise constant; the derivative is zero wherever it exists
+    "floor": lambda u: _num(0),
+    "ceil": lambda u: _num(0),
+    "trunc": lambda u: _num(0),
+}
+
+
+def differentiate(node, var):
+    kind = node[0]
+    if kind == "num":
+        return _num(0)
+    if kind == "name":
+        return _num(1 if node[1] == var else 0)
+    if kind == "neg":
+        return neg(differentiate(node[1], var))
+    if kind == "pos":
+        return differentiate(node[1], var)
+    if kind == "bin":
+        if node[1] == "**":
+            return _differentiate_power(node[2], node[3], var)
+        # Long sums and products are walked in a loop, carrying the derivative
+        # of the part to the left of each step
+        u, chain = _left_spine(node)
+        du = differentiate(u, var)
+        for op, v in chain:
+            dv = differentiate(v, var)
+            if op == "+":
+                du = add(du, dv)
+            elif op == "-":
+                du = sub(du, dv)
+            elif op == "*":
+                du = add(mul(du, v), mul(u, dv))
+            elif op == "/":
+                if _is_num(dv, 0):
+                    du = div(du, v)
+                else:
+                    du = div(sub(mul(du, v), mul(u, dv)), power(v, _num(2)))
+            else:
+                raise ExpressionError(f"cannot differentiate '{op}'")
+            u = ("bin", op, u, v)
+        return du
+    if kind == "call":
+        return _differentiate_call(node[1], node[2], var)
+    raise ExpressionError(f"unknown node {kind!r}")
+
+
+def _differentiate_power(u, v, var):
+    du = differentiate(u, var)
+    if not _depends_on(v, var):
+        # d(u**c) = c * u**(c - 1) * u'
+        return mul(mul(v, power(u, sub(v, _num(1)))), du)
+    dv = differentiate(v, var)
+    if not _depends_on(u, var):
+        # d(c**v) = c**v * log(c) * v'
+        return mul(mul(power(u, v), call("log", u)), dv)
+    # d(u**v) = u**v * (v' * log(u) + v * u' / u)
+    return mul(power(u, v), add(mul(dv, call("log", u)), div(mul(v, du), u)))
+
+
+def _differentiate_call(name, args, var):
+    if name == "pow" and len(args) == 2:
+        return _differentiate_power(args[0], args[1], var)
+    if name == "log" and len(args) == 2:
+        return differentiate(div(call("log", args[0]), call("log", args[1])), var)
+    if name == "hypot" and len(args) == 2:
+        a, b = args
+        numerator = add(mul(a, differentiate(a, var)), mul(b, differentiate(b, var)))
+        return div(numerator, call("hypot", a, b))
+    if name == "atan2" and len(args) == 2:
+        y, x = args
+        numerator = sub(mul(x, differentiate(y, var)), mul(y, differentiate(x, var)))
+        return div(numerator, add(power(x, _num(2)), power(y, _num(2))))
+    rule = _CHAIN_RULES.get(name)
+    if rule is None or len(args) != 1:
+        raise ExpressionError(f"cannot differentiate '{name}'")
+    du = differentiate(args[0], var)
+    if _is_num(du, 0):
+        return _num(0)
+    return mul(rule(args[0]), du)
+
+
+# Printing nodes back as expression text
+
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "//": 2, "%": 2, "**": 4}
+
+
+def _precedence(node):
+    kind = node[0]
+    if kind == "bin":
+        return _PRECEDENCE[node[1]]
+    if kind == "neg" or kind == "pos":
+        return 3
+    if kind == "num" and (node[1] < 0 or isinstance(node[1], float) and "e" in repr(node[1])):
+        return 3
+    return 5
+
+
+def to_text(node):
+    kind = node[0]
+    if kind == "num":
+        return repr(node[1])
+    if kind == "name":
+        return node[1]
+    if kind == "neg" or kind == "pos":
+        operand = to_text(node[1])
+        if _precedence(node[1]) < 3:
+            operand = f"({operand})"
+        return ("-" if kind == "neg" else "+") + operand
+    if kind == "bin" and node[1] == "**":
+        left, right = node[2], node[3]
+        left_text, right_text = to_text(left), to_text(right)
+        if _precedence(left) <= _PRECEDENCE["**"]:
+            left_text = f"({left_text})"
+        if _precedence(right) < 3:
+            right_text = f"({right_text})"
+        return f"{left_text} ** {right_text}"
+    if kind == "bin":
+        # Left-leaning chains in a loop; the text so far binds as its last operator
+        base, chain = _left_spine(node)
+        text, left_level = to_text(base), _precedence(base)
+        for op, right in chain:
+            level = _PRECEDENCE[op]
+            if left_level < level:
+                text = f"({text})"
+            right_text = to_text(right)
+            if _precedence(right) <= level:
+                right_text = f"({right_text})"
+            text = f"{text} {op} {right_text}"
+            left_level = level
+        return text
+    if kind == "call":
+        return f"{node[1]}({', '.join(to_text(arg) for arg in node[2])})"
+    raise ExpressionError(f"unknown node {kind!r}")
+
+
+def derivative(text, var="x", order=1):
+    node = parse(text)
+    try:
+        for _ in range(order):
+            node = differentiate(node, var)
+        return to_text(node)
+    except RecursionError:
+        # Chains are walked in loops, but a derivative can still nest too deeply
+        raise ExpressionError("expression is too deeply nested to differentiate") from None
+
+
+# Compiled scalar functions
+
+def compile_function(text, var="x", variables=None):
+    # f(x) as a closure over one reused binding dict; every other name must be
+    # bound in variables (or be a constant)
+    compiled = compile_expression(text)
+    env = {name: value for name, value in (variables or {}).items() if name != var}
+    missing = sorted(name for name in compiled.names if name != var and name not in env)
+    if missing:
+        raise ExpressionError(f"name '{missing[0]}' is not defined")
+    evaluate = compiled.evaluate
+
+    def f(x):
+        env[var] = x
+        return evaluate(env)
+    return f
+
+
+def _safe(f):
+    def call(x):
+        try:
+            return float(f(x))
+        except (ArithmeticError, ValueError, TypeError):
+            return math.nan
+    return call
+
+
+def _sample(text, var, lo, hi, samples, variables):
+    # Grid and values; NumPy evaluates the whole grid at once when available
+    from vectorized import evaluate_many
+
+    step = (hi - lo) / samples
+    grid = [lo + i * step for i in range(samples)] + [hi]
+    columns = {name: value for name, value in (variables or {}).items()
+               if name != var and isinstance(value, (int, float))}
+    columns[var] = grid
+    try:
+        values = [float(value) for value in evaluate_many(text, columns)]
+    except (ArithmeticError, ValueError, TypeError):
+        f = _safe(compile_function(text, var, variables))
+        values = [f(x) for x in grid]
+    return grid, values
+
+
+def _check_interval(lo, hi, samples):
+    if not lo < hi:
+        raise ValueError("the interval must have lo < hi")
+    if samples < 1:
+        raise ValueError("samples must be at least 1")
+
+
+def newton(f, df, x0, tolerance=DEFAULT_TOLERANCE, max_iterations=MAX_ITERATIONS):
+    x = x0
+    for _ in range(max_iterations):
+        slope = df(x)
+        if not slope or not math.isfinite(slope):
+            break
+        step = f(x) / slope
+        x -= step
+        if not math.isfinite(x):
+            break
+        if abs(step) <= tolerance * max(1.0, abs(x)):
+            return x
+    raise ExpressionError("Newton's method did not converge")
+
+
+def _bracketed_root(f, df, a, b, fa, tolerance):
+    # Newton steps where they stay inside [a, b], bisection otherwise
+    x = (a + b) / 2
+    for _ in range(MAX_ITERATIONS):
+        fx = f(x)
+        if fx == 0:
+            return x
+        if (fx < 0) == (fa < 0):
+            a, fa = x, fx
+        else:
+            b = x
+        if b - a <= tolerance * max(1.0, abs(x)):
+            return (a + b) / 2
+        slope = df(x) if df is not None else math.nan
+        candidate = x - fx / slope if slope and math.isfinite(slope) else math.nan
+        x = candidate if a < candidate < b else (a + b) / 2
+    return x
+
+
+def find_root(text, var="x", x0=0.0, variables=None, tolerance=DEFAULT_TOLERANCE):
+    f = compile_function(text, var, variables)
+    df = compile_function(derivative(text, var), var, variables)
+    return newton(f, df, x0, tolerance)
+
+
+def find_roots(text, var="x", lo=-10.0, hi=10.0, variables=None, samples=DEFAULT_SAMPLES,
+               tolerance=DEFAULT_TOLERANCE):
+    # Roots in [lo, hi] where the expression changes sign or is exactly zero at a
+    # grid point. Roots that only touch zero between grid points are not found.
+    _check_interval(lo, hi, samples)
+    grid, values = _sample(text, var, lo, hi, samples, variables)
+    f = _safe(compile_function(text, var, variables))
+    try:
+        df = _safe(compile_function(derivative(text, var), var, variables))
+    except ExpressionError:
+        df = None  # Not differentiable symbolically; bisection alone still works
+    roots = []
+    for i in range(len(grid)):
+        if values[i] == 0:
+            roots.append(grid[i])
+        elif i + 1 < len(grid) and math.isfinite(values[i]) and math.isfinite(values[i + 1]) \
+                and values[i + 1] != 0 and (values[i] < 0) != (values[i + 1] < 0):
+            root = _bracketed_root(f, df, grid[i], grid[i + 1], values[i], tolerance)
+            # A pole also changes sign; keep only points where f is actually small
+            if abs(f(root)) <= 1e-6 * max(1.0, abs(values[i]), abs(values[i + 1])):
+                roots.append(root)
+    return roots
+
+
+def integrate(text, var="x", a=0.0, b=1.0, variables=None, tolerance=1e-10):
+    # Adaptive Simpson quadrature, iterative so deep refinement cannot overflow
+    # the stack; MAX_SIMPSON_INTERVALS caps the work on badly behaved integrands
+    f = compile_function(text, var, variables)
+    if a == b:
+        return 0.0
+    sign = 1.0
+    if a > b:
+        a, b, sign = b, a, -1.0
+    fa, fm, fb = f(a), f((a + b) / 2), f(b)
+    whole = (b - a) / 6 * (fa + 4 * fm + fb)
+    stack = [(a, b, fa, fm, fb, whole, tolerance)]
+    total = 0.0
+    intervals = 0
+    while stack:
+        a, b, fa, fm, fb, whole, tolerance = stack.pop()
+        m = (a + b) / 2
+        lm, rm = (a + m) / 2, (m + b) / 2
+        flm, frm = f(lm), f(rm)
+        left = (m - a) / 6 * (fa + 4 * flm + fm)
+        right = (b - m) / 6 * (fm + 4 * frm + fb)
+        delta = left + right - whole
+        intervals += 1
+        if abs(delta) <= 15 * tolerance or m - a <= 1e-15 * max(1.0, abs(m)):
+            total += left + right + delta / 15
+        elif intervals > MAX_SIMPSON_INTERVALS:
+            raise ExpressionError("integral did not converge")
+        else:
+            stack.append((a, m, fa, flm, fm, left, tolerance / 2))
+            stack.append((m, b, fm, frm, fb, right, tolerance / 2))
+    result = sign * total
+    if not math.isfinite(result):
+        raise ExpressionError("integral does not converge")
+    return result
+
+
+_GOLDEN = (math.sqrt(5) - 1) / 2
+
+
+def _golden_section(f, a, b, tolerance):
+    c, d = b - _GOLDEN * (b - a), a + _GOLDEN * (b - a)
+    fc, fd = f(c), f(d)
+    for _ in range(MAX_ITERATIONS * 2):
+        if b - a <= tolerance * max(1.0, abs(a) + abs(b)):
+            break
+        if fc < fd:
+            b, d, fd = d, c, fc
+            c = b - _GOLDEN * (b - a)
+            fc = f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + _GOLDEN * (b - a)
+            fd = f(d)
+    return (a + b) / 2
+
+
+def minimize(text, var="x", lo=-10.0, hi=10.0, variables=None, samples=DEFAULT_SAMPLES,
+             tolerance=1e-10):
+    # (x, f(x)) of the smallest value on [lo, hi]: the best grid point is refined
+    # by golden-section search between its neighbours
+    _check_interval(lo, hi, samples)
+    grid, values = _sample(text, var, lo, hi, samples, variables)
+    finite = [(value, i) for i, value in enumerate(values) if math.isfinite(value)]
+    if not finite:
+        raise ExpressionError("expression has no finite value on the interval")
+    _, best = min(finite)
+    f = _safe(compile_function(text, var, variables))
+    a, b = grid[max(best - 1, 0)], grid[min(best + 1, len(grid) - 1)]
+    x = _golden_section(lambda t: f(t) if math.isfinite(f(t)) else math.inf, a, b, tolerance)
+    fx = f(x)
+    if not fx <= values[best]:
+        x, fx = grid[best], values[best]
+    return x, fx
+
+
+def maximize(text, var="x", lo=-10.0, hi=10.0, variables=None, samples=DEFAULT_SAMPLES,
+             tolerance=1e-10):
+    x, value = minimize(f"-({text})", var, lo, hi, variables, samples, tolerance)
+    return x, -value
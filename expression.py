@@ -0,0 +1,497 @@
+import math
+import operator
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from types import MappingProxyType
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+# Limits for untrusted input. Floats cannot be slow, but Python integers grow
+# without bound, so integer powers, products and factorials are checked before
+# they are computed: none may produce more than MAX_INTEGER_BITS bits (about
+# 315,000 digits, a few milliseconds of work). Constant folding goes through
+# the same operators, so "9 ** 9 ** 9" fails at once instead of hanging the
+# compiler. Parentheses, unary signs and powers may nest MAX_DEPTH deep. Within
+# time_limit() the checked operations also stop once the deadline has passed,
+# which bounds long chains of large products. Integer division, remainders,
+# gcd and lcm are quadratic in CPython, so they refuse operands whose cost
+# would pass _DIVISION_BITS and check the deadline too.
+MAX_INTEGER_BITS = 1 << 20
+MAX_DEPTH = 100
+DEFAULT_TIME_LIMIT = 2.0
+
+# Integer products below this many bits are too cheap to be worth checking
+_CHECK_BITS = 4096
+# math.comb slows down sharply on large results; keep it to a quarter second
+_COMB_BITS = MAX_INTEGER_BITS // 8
+# Quadratic integer operations: about a tenth of a second at this size
+_DIVISION_BITS = MAX_INTEGER_BITS // 4
+
+_deadline = threading.local()
+
+
+@contextmanager
+def time_limit(seconds=DEFAULT_TIME_LIMIT):
+    previous = getattr(_deadline, "at", None)
+    _deadline.at = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _deadline.at = previous
+
+
+def _check_deadline():
+    at = getattr(_deadline, "at", None)
+    if at is not None and time.monotonic() > at:
+        raise ExpressionError("evaluation took too long")
+
+
+def check_integer_bits(bits):
+    # Raises before an integer result of about `bits` bits is computed
+    if bits > MAX_INTEGER_BITS:
+        raise ExpressionError(f"result would exceed {MAX_INTEGER_BITS} bits")
+    _check_deadline()
+
+
+def power(base, exponent):
+    if (exponent.__class__ is int and exponent > 1 and base.__class__ is int
+            and not -1 <= base <= 1):
+        check_integer_bits(base.bit_length() * exponent)
+    return base ** exponent
+
+
+def multiply(left, right):
+    if left.__class__ is int and right.__class__ is int:
+        bits = left.bit_length() + right.bit_length()
+        if bits > _CHECK_BITS:
+            check_integer_bits(bits)
+    return left * right
+
+
+def _check_division(dividend, divisor):
+    if dividend.__class__ is int and divisor.__class__ is int:
+        bits, divisor_bits = dividend.bit_length(), divisor.bit_length()
+        if bits > _CHECK_BITS:
+            # Long division costs the divisor's size times the quotient's
+            if min(divisor_bits, bits - divisor_bits) > _DIVISION_BITS:
+                raise ExpressionError(f"integer division needs more than {_DIVISION_BITS}-bit operands")
+            _check_deadline()
+
+
+def floor_divide(left, right):
+    _check_division(left, right)
+    return left // right
+
+
+def modulo(left, right):
+    _check_division(left, right)
+    return left % right
+
+
+def _check_gcd(integers):
+    sizes = sorted(value.bit_length() for value in integers if value.__class__ is int)
+    if sizes and sizes[-1] > _CHECK_BITS:
+        # Euclid's algorithm is quadratic in the second-largest operand
+        if len(sizes) > 1 and sizes[-2] > _DIVISION_BITS:
+            raise ExpressionError(f"gcd and lcm need operands of at most {_DIVISION_BITS} bits")
+        _check_deadline()
+    return sizes
+
+
+def gcd(*integers):
+    _check_gcd(integers)
+    return math.gcd(*integers)
+
+
+def lcm(*integers):
+    sizes = _check_gcd(integers)
+    if sum(sizes) > _CHECK_BITS:
+        check_integer_bits(sum(sizes))
+    return math.lcm(*integers)
+
+
+def isqrt(n):
+    if n.__class__ is int and n.bit_length() > _CHECK_BITS:
+        _check_deadline()
+    return math.isqrt(n)
+
+
+def _log2_factorial(n):
+    return math.lgamma(n + 1) / math.log(2)
+
+
+def factorial(n):
+    if n.__class__ is int and n > 1:
+        check_integer_bits(_log2_factorial(n))
+    return math.factorial(n)
+
+
+def comb(n, k):
+    if n.__class__ is int and k.__class__ is int and 0 <= k <= n:
+        bits = _log2_factorial(n) - _log2_factorial(k) - _log2_factorial(n - k)
+        if bits > _COMB_BITS:
+            raise ExpressionError(f"result would exceed {_COMB_BITS} bits")
+        check_integer_bits(bits)
+    return math.comb(n, k)
+
+
+def perm(n, k=None):
+    if n.__class__ is int and (k is None or k.__class__ is int and 0 <= k <= n):
+        check_integer_bits(_log2_factorial(n) - _log2_factorial(n - (n if k is None else k)))
+    return math.perm(n, k)
+
+
+# Names that resolve to numbers unless a variable of the same name is bound
+CONSTANTS = MappingProxyType({
+    "pi": math.pi,
+    "e": math.e,
+    "tau": math.tau,
+    "inf": math.inf,
+    "nan": math.nan,
+})
+
+# Callables available inside expressions: the public math functions, with the
+# integer ones that can grow without bound replaced by checked versions. The
+# table is read-only; expressions can reach nothing else.
+FUNCTIONS = MappingProxyType({
+    **{name: value for name, value in vars(math).items() if callable(value) and not name.startswith("_")},
+    "factorial": factorial,
+    "comb": comb,
+    "perm": perm,
+    "gcd": gcd,
+    "lcm": lcm,
+    "isqrt": isqrt,
+})
+
+# Spellings that the buttons put in the display, mapped to their canonical token
+ALIASES = {
+    "π": "pi",
+    "^": "**",
+}
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<name>[^\W\d]\w*)
+  | (?P<op>\*\*|//|[-+*/%^(),])
+""", re.VERBOSE)
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    end = len(text)
+    while pos < end:
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise ExpressionError(f"unexpected character {text[pos]!r} at position {pos}")
+        kind = match.lastgroup
+        value = match.group()
+        pos = match.end()
+        if kind == "space":
+            continue
+        value = ALIASES.get(value, value)
+        tokens.append((kind, value))
+    return tokens
+
+
+def normalize(text):
+    return " ".join(value for _, value in tokenize(text))
+
+
+# AST nodes are plain tuples:
+#   ("num", value)
+#   ("name", identifier)
+#   ("neg", operand) / ("pos", operand)
+#   ("bin", operator, left, right)
+#   ("call", function_name, (arg, ...))
+
+class _Parser:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos][1]
+        return None
+
+    def advance(self):
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def expect(self, value):
+        if self.peek() != value:
+            found = self.peek()
+            raise ExpressionError(f"expected {value!r} but found {found!r}" if found else f"expected {value!r}")
+        self.pos += 1
+
+    def parse(self):
+        if not self.tokens:
+            raise ExpressionError("empty expression")
+        node = self.expression()
+        if self.pos != len(self.tokens):
+            raise ExpressionError(f"unexpected {self.peek()!r}")
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.peek() in ("+", "-"):
+            op = self.advance()[1]
+            node = ("bin", op, node, self.term())
+        return node
+
+    def term(self):
+        node = self.unary()
+        while self.peek() in ("*", "/", "//", "%"):
+            op = self.advance()[1]
+            node = ("bin", op, node, self.unary())
+        return node
+
+    def unary(self):
+        # Every level of nesting passes through here
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ExpressionError(f"expression is nested more than {MAX_DEPTH} levels deep")
+        try:
+            if self.peek() == "-":
+                self.pos += 1
+                return ("neg", self.unary())
+            if self.peek() == "+":
+                self.pos += 1
+                return ("pos", self.unary())
+            return self.power()
+        finally:
+            self.depth -= 1
+
+    def power(self):
+        node = self.atom()
+        if self.peek() == "**":
+            self.pos += 1
+            # Right associative and binds tighter than unary minus on the left, as in Python
+            node = ("bin", "**", node, self.unary())
+        return node
+
+    def number(self, text):
+        if "." in text or "e" in text or "E" in text:
+            return ("num", float(text))
+        return ("num", int(text))
+
+    def atom(self):
+        if self.pos >= len(self.tokens):
+            raise ExpressionError("unexpected end of expression")
+        kind, value = self.advance()
+        if kind == "number":
+            return self.number(value)
+        if kind == "name":
+            if self.peek() == "(":
+                self.pos += 1
+                args = []
+                if self.peek() != ")":
+                    args.append(self.expression())
+                    while self.peek() == ",":
+                        self.pos += 1
+                        args.append(self.expression())
+                self.expect(")")
+                return ("call", value, tuple(args))
+            return ("name", value)
+        if value == "(":
+            node = self.expression()
+            self.expect(")")
+            return node
+        raise ExpressionError(f"unexpected {value!r}")
+
+
+def parse(text):
+    return _Parser(tokenize(text)).parse()
+
+
+BINARY_OPERATORS = MappingProxyType({
+    "+": operator.add,
+    "-": operator.sub,
+    "*": multiply,
+    "/": operator.truediv,
+    "//": floor_divide,
+    "%": modulo,
+    "**": power,
+})
+
+
+def _left_spine(node):
+    # Flattens a left-leaning chain like a + b - c * d ... into its first operand
+    # and the (operator, right operand) steps, so long pasted sums don't recurse
+    # once per term
+    chain = []
+    while node[0] == "bin" and node[1] != "**":
+        chain.append((node[1], node[3]))
+        node = node[2]
+    chain.reverse()
+    return node, chain
+
+
+def _fold(node):
+    # Collapse constant subtrees so they are computed once at compile time
+    kind = node[0]
+    if kind == "neg" or kind == "pos":
+        operand = _fold(node[1])
+        if operand[0] == "num":
+            return ("num", -operand[1] if kind == "neg" else operand[1])
+        return (kind, operand)
+    if kind == "bin":
+        if node[1] == "**":
+            base, chain = node[2], [("**", node[3])]
+        else:
+            base, chain = _left_spine(node)
+        result = _fold(base)
+        for op, right in chain:
+            right = _fold(right)
+            if result[0] == "num" and right[0] == "num":
+                try:
+                    result = ("num", BINARY_OPERATORS[op](result[1], right[1]))
+                    continue
+                except (ArithmeticError, ValueError):
+                    pass  # Leave it for evaluation time so the error surfaces there
+            result = ("bin", op, result, right)
+        return result
+    if kind == "call":
+        return ("call", node[1], tuple(_fold(arg) for arg in node[2]))
+    return node
+
+
+def free_names(node, constants=CONSTANTS):
+    names = set()
+    stack = [node]
+    while stack:
+        current = stack.pop()
+        kind = current[0]
+        if kind == "name":
+            if current[1] not in constants:
+                names.add(current[1])
+        elif kind == "neg" or kind == "pos":
+            stack.append(current[1])
+        elif kind == "bin":
+            stack.append(current[2])
+            stack.append(current[3])
+        elif kind == "call":
+            stack.extend(current[2])
+    return frozenset(names)
+
+
+def compile_node(node, functions=FUNCTIONS, constants=CONSTANTS, operators=BINARY_OPERATORS):
+    kind = node[0]
+
+    if kind == "num":
+        value = node[1]
+        return lambda env: value
+
+    if kind == "name":
+        name = node[1]
+        if name in constants:
+            default = constants[name]
+            return lambda env: env.get(name, default)
+
+        def load(env):
+            try:
+                return env[name]
+            except KeyError:
+                raise ExpressionError(f"name '{name}' is not defined") from None
+        return load
+
+    if kind == "neg":
+        operand = compile_node(node[1], functions, constants, operators)
+        return lambda env: -operand(env)
+
+    if kind == "pos":
+        operand = compile_node(node[1], functions, constants, operators)
+        return lambda env: +operand(env)
+
+    if kind == "bin":
+        op = node[1]
+        if op != "**" and node[2][0] == "bin" and node[2][1] != "**":
+            base, chain = _left_spine(node)
+            if len(chain) > 8:
+                # Evaluate long chains in a loop rather than nested closures
+                first = compile_node(base, functions, constants, operators)
+                steps = [
+                    (operators[step_op], compile_node(right, functions, constants, operators))
+                    for step_op, right in chain
+                ]
+
+                def run_chain(env):
+                    value = first(env)
+                    for fn, right in steps:
+                        value = fn(value, right(env))
+                    return value
+                return run_chain
+        left = compile_node(node[2], functions, constants, operators)
+        right = compile_node(node[3], functions, constants, operators)
+        # Specialize the common operators to skip the extra call through the table
+        if operators is BINARY_OPERATORS:
+            if op == "+":
+                return lambda env: left(env) + right(env)
+            if op == "-":
+                return lambda env: left(env) - right(env)
+            if op == "*":
+                return lambda env: multiply(left(env), right(env))
+            if op == "/":
+                return lambda env: left(env) / right(env)
+        fn = operators[op]
+        return lambda env: fn(left(env), right(env))
+
+    if kind == "call":
+        name = node[1]
+        if name not in functions:
+            raise ExpressionError(f"unknown function '{name}'")
+        fn = functions[name]
+        args = [compile_node(arg, functions, constants, operators) for arg in node[2]]
+        if len(args) == 1:
+            arg = args[0]
+            return lambda env: fn(arg(env))
+        if len(args) == 2:
+            first, second = args
+            return lambda env: fn(first(env), second(env))
+        return lambda env: fn(*[arg(env) for arg in args])
+
+    raise ExpressionError(f"unknown node {kind!r}")
+
+
+class CompiledExpression:
+    __slots__ = ("source", "tree", "names", "_fn")
+
+    def __init__(self, source, tree, functions=FUNCTIONS, constants=CONSTANTS, operators=BINARY_OPERATORS):
+        self.source = source
+        self.tree = tree
+        self.names = free_names(tree, constants)
+        self._fn = compile_node(tree, functions, constants, operators)
+
+    def evaluate(self, variables=None):
+        return self._fn(variables if variables is not None else {})
+
+    __call__ = evaluate
+
+    def __repr__(self):
+        return f"CompiledExpression({self.source!r})"
+
+
+@lru_cache(maxsize=4096)
+def _compile_normalized(source):
+    return CompiledExpression(source, _fold(parse(source)))
+
+
+@lru_cache(maxsize=4096)
+def compile_expression(text):
+    # Two cache levels: the raw display text for repeat presses of "=", and the
+    # normalized token stream so "2*x" and "2 * x" share one compiled form
+    return _compile_normalized(normalize(text))
+
+
+def evaluate(text, variables=None):
+    return compile_expression(text).evaluate(variables)
@@ -0,0 +1,155 @@
+from collections import deque
+
+from expression import ExpressionError, compile_expression, free_names
+
+# Named formulas over a variables dict, spreadsheet style: "area = w * h",
+# "cost = area * rate". Every formula's result is written back into the same
+# dict, so formulas and ordinary expressions can read it like any variable.
+#
+# The sheet keeps the dependency graph both ways (what each formula reads, and
+# which formulas read each name). Changing a value walks the graph downstream
+# from that name and recomputes only the formulas it reaches, in topological
+# order, so the cost is proportional to what actually depends on the change.
+# Defining a formula that would read its own result, directly or through
+# others, raises CycleError and leaves the sheet unchanged. Constants such as
+# pi count as names read too, since a variable of the same name shadows them.
+
+
+class CycleError(ExpressionError):
+    pass
+
+
+class FormulaSheet:
+    def __init__(self, variables=None, compile=compile_expression):
+        self.values = variables if variables is not None else {}
+        self.compile = compile
+        self.formulas = {}     # name -> source text
+        self.errors = {}       # name -> message, for formulas that failed
+        self._compiled = {}    # name -> CompiledExpression
+        self._reads = {}       # name -> names the formula reads
+        self._readers = {}     # name -> formulas that read it
+
+    def __contains__(self, name):
+        return name in self.formulas
+
+    def __len__(self):
+        return len(self.formulas)
+
+    # Graph
+
+    def _link(self, name, reads):
+        self._reads[name] = reads
+        for dependency in reads:
+            self._readers.setdefault(dependency, set()).add(name)
+
+    def _unlink(self, name):
+        for dependency in self._reads.pop(name, ()):
+            readers = self._readers.get(dependency)
+            if readers is not None:
+                readers.discard(name)
+                if not readers:
+                    del self._readers[dependency]
+
+    def downstream(self, names):
+        # Every formula that reads any of names, directly or indirectly
+        reached = set()
+        stack = list(names)
+        while stack:
+            for reader in self._readers.get(stack.pop(), ()):
+                if reader not in reached:
+                    reached.add(reader)
+                    stack.append(reader)
+        return reached
+
+    def _order(self, names):
+        # Topological order of the given formulas, counting only edges inside the set
+        pending = {name: sum(1 for d in self._reads[name] if d in names) for name in names}
+        ready = deque(name for name, count in pending.items() if count == 0)
+        order = []
+        while ready:
+            name = ready.popleft()
+            order.append(name)
+            for reader in self._readers.get(name, ()):
+                if reader in pending:
+                    pending[reader] -= 1
+                    if pending[reader] == 0:
+                        ready.append(reader)
+        if len(order) != len(names):
+            stuck = sorted(name for name in names if pending[name])
+            raise CycleError(f"circular formulas: {', '.join(stuck)}")
+        return order
+
+    def _recompute(self, names):
+        values = self.values
+        errors = self.errors
+        for name in self._order(names):
+            try:
+                values[name] = self._compiled[name].evaluate(values)
+                errors.pop(name, None)
+            except (ArithmeticError, ValueError, TypeError) as e:
+                values.pop(name, None)
+                errors[name] = str(e)
+        return names
+
+    # Formulas
+
+    def define(self, name, text):
+        # Adds or replaces a formula; returns the set of formulas recomputed
+        return self.define_many({name: text})
+
+    def define_many(self, formulas):
+        # Adds several formulas at once and computes each of them exactly once
+        compiled = {name: self.compile(text) for name, text in formulas.items()}
+        for name in formulas:
+            if not name.isidentifier():
+                raise ExpressionError(f"invalid formula name '{name}'")
+        previous = {name: (self._compiled.get(name), self._reads.get(name)) for name in formulas}
+        for name, expression in compiled.items():
+            self._unlink(name)
+            self._compiled[name] = expression
+            self._link(name, free_names(expression.tree, constants=()))
+        affected = set(formulas) | self.downstream(formulas)
+        try:
+            self._order(affected)
+        except CycleError:
+            for name, (expression, reads) in previous.items():
+                self._unlink(name)
+                if expression is None:
+                    del self._compiled[name]
+                else:
+                    self._compiled[name] = expression
+                    self._link(name, reads)
+            raise
+        self.formulas.update(formulas)
+        return self._recompute(affected)
+
+    def remove(self, name):
+        # Drops a formula and its value; whatever read it is recomputed
+        if name not in self.formulas:
+            raise KeyError(name)
+        self._unlink(name)
+        del self.formulas[name]
+        del self._compiled[name]
+        self.errors.pop(name, None)
+        self.values.pop(name, None)
+        return self._recompute(self.downstream([name]))
+
+    # Values
+
+    def set(self, name, value):
+        return self.update({name: value})
+
+    def update(self, values):
+        # Sets plain values (replacing any formula of the same name) and
+        # recomputes everything downstream of them once
+        for name in values:
+            if name in self.formulas:
+                self._unlink(name)
+                del self.formulas[name]
+                del self._compiled[name]
+                self.errors.pop(name, None)
+        self.values.update(values)
+        return self._recompute(self.downstream(values))
+
+    def recompute_all(self):
+        return self._recompute(set(self.formulas))
@@ -0,0 +1,188 @@
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from programmer import to_string
+
+# Calculation history: a bounded deque in memory (appends and trimming are O(1))
+# backed by an append-only JSON-lines journal. The journal is the full record,
+# kept for auditing: the deque holds only the newest `capacity` entries, but
+# every entry ever appended stays on disk until the history is cleared. Appends
+# are buffered and written in batches. A crash mid-append can leave a torn last
+# line; load() skips such lines and starts a background compaction, which
+# streams the journal into a new file without them. Compaction never drops an
+# entry, and it never holds more than one line in memory.
+
+DEFAULT_CAPACITY = 100000
+DEFAULT_BATCH_SIZE = 256
+# Larger ints are journaled as text: json.dumps would hit Python's 4300-digit limit
+MAX_JSON_INT_BITS = 14000
+
+
+def make_entry(expression, result, function=None, argument=None, kind=None, **details):
+    # Entries from the scientific buttons also record the function and its input
+    # so they can be replayed exactly (the buttons work in degrees). Anything
+    # but a plain expression records its kind ("units", "programmer",
+    # "calculus") and the settings it ran with, e.g. word_size and base.
+    entry = {"time": time.time(), "expression": expression, "result": _plain(result)}
+    if function is not None:
+        entry["function"] = function
+        entry["argument"] = _plain(argument)
+    if kind is not None:
+        entry["kind"] = kind
+        entry.update(details)
+    return entry
+
+
+def _plain(value):
+    # Decimal and Fraction results are journaled as their text
+    if isinstance(value, int) and value.bit_length() > MAX_JSON_INT_BITS:
+        return to_string(value)
+    return value if isinstance(value, (int, float)) else str(value)
+
+
+def format_entry(entry):
+    # Plain strings are entries saved before history was structured
+    if isinstance(entry, str):
+        return entry
+    return f"{entry['expression']} = {entry['result']}"
+
+
+class HistoryStore:
+    def __init__(self, path=None, capacity=DEFAULT_CAPACITY, batch_size=DEFAULT_BATCH_SIZE):
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.path = path
+        self.capacity = capacity
+        self.batch_size = batch_size
+        self.entries = deque(maxlen=capacity)
+        self.torn_lines = 0  # found by the last load()
+        self._pending = []
+        self._open_line = False  # the journal ends mid-line
+        self._lock = threading.RLock()
+        self._compactor = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(list(self.entries))
+
+    def __getitem__(self, index):
+        return self.entries[index]
+
+    def append(self, entry):
+        with self._lock:
+            self.entries.append(entry)
+            if self.path is None:
+                return
+            self._pending.append(entry)
+            if len(self._pending) >= self.batch_size:
+                self.flush()
+
+    def extend(self, entries):
+        for entry in entries:
+            self.append(entry)
+
+    def tail(self, count):
+        with self._lock:
+            start = max(len(self.entries) - count, 0)
+            return [self.entries[i] for i in range(start, len(self.entries))]
+
+    def flush(self):
+        with self._lock:
+            if self.path is None or not self._pending:
+                return
+            data = "".join(json.dumps(entry) + "\n" for entry in self._pending)
+            if self._open_line:
+                # Don't glue the first entry onto a torn line
+                data = "\n" + data
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(data)
+            self._open_line = False
+            self._pending = []
+
+    def load(self):
+        # Replays the journal; the deque keeps only the newest `capacity` entries
+        self.wait_for_compaction()
+        with self._lock:
+            self.entries.clear()
+            self._pending = []
+            self.torn_lines = 0
+            self._open_line = False
+            if self.path is None or not os.path.exists(self.path):
+                return 0
+            line = ""
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        self.entries.append(json.loads(line))
+                    except ValueError:
+                        self.torn_lines += 1  # From a crash mid-append
+            self._open_line = not line.endswith("\n")
+        if self.torn_lines:
+            self.compact(wait=False)
+        return len(self.entries)
+
+    def clear(self):
+        self.wait_for_compaction()
+        with self._lock:
+            self.entries.clear()
+            self._pending = []
+            self._open_line = False
+            if self.path is not None and os.path.exists(self.path):
+                open(self.path, "w").close()
+
+    def compact(self, wait=True):
+        with self._lock:
+            compactor = self._compactor
+            if self.path is not None and (compactor is None or not compactor.is_alive()):
+                compactor = threading.Thread(target=self._compact, name="history-compactor", daemon=True)
+                self._compactor = compactor
+                compactor.start()
+        if wait and compactor is not None:
+            compactor.join()
+
+    def wait_for_compaction(self):
+        compactor = self._compactor
+        if compactor is not None:
+            compactor.join()
+
+    def _compact(self):
+        # Copies every entry into a new journal, line by line, dropping only
+        # lines that don't parse; entries appended meanwhile are copied at the end
+        with self._lock:
+            self.flush()
+            if not os.path.exists(self.path):
+                return
+            copied = os.path.getsize(self.path)
+        temp_path = self.path + ".tmp"
+        with open(self.path, "rb") as source, open(temp_path, "wb") as f:
+            remaining = copied
+            for line in source:
+                if remaining <= 0:
+                    break
+                remaining -= len(line)
+                if not line.strip():
+                    continue
+                try:
+                    json.loads(line)
+                except ValueError:
+                    continue
+                f.write(line if line.endswith(b"\n") else line + b"\n")
+        with self._lock:
+            self.flush()
+            with open(self.path, "rb") as source, open(temp_path, "ab") as f:
+                source.seek(copied)
+                shutil.copyfileobj(source, f)
+            os.replace(temp_path, self.path)
+
+    def close(self):
+        self.flush()
+        self.wait_for_compaction()
+        self.flush()
@@ -0,0 +1,382 @@
+import argparse
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+from calc_core import apply_function, evaluate, evaluate_quantity, format_result
+from history import format_entry
+from programmer import IntegerEngine
+
+# Searchable view of a history journal (see history.HistoryStore) that never
+# loads the journal into memory. Next to JOURNAL it keeps:
+#
+#   JOURNAL.idx   header + one fixed-size record per entry:
+#                 (byte offset in the journal, time, numeric result or nan)
+#   JOURNAL.ridx  (result, entry number) pairs sorted by result, covering the
+#                 first `sorted_count` entries; newer entries are scanned directly
+#
+# Both files and the journal are opened with mmap, so lookups touch only the
+# pages they need. Time queries bisect the time column (the journal is written
+# in time order), result queries bisect .ridx, and text queries run mmap.find
+# over the raw journal bytes. refresh() indexes whatever was appended since the
+# last call; if the journal was replaced (e.g. compacted) the index is rebuilt.
+
+MAGIC = b"CHIX"
+VERSION = 1
+HEADER = struct.Struct("<4sIQQQQ")  # magic, version, count, covered bytes, inode, sorted_count
+RECORD = struct.Struct("<Qdd")      # offset, time, result
+SORTED_RECORD = struct.Struct("<dQ")  # result, entry number
+
+# Re-sort .ridx once the unsorted tail grows past this share of the index
+RESORT_FRACTION = 0.125
+RESORT_MINIMUM = 4096
+WRITE_BATCH = 65536
+# Records sorted in memory at a time; larger indexes are sorted in runs and merged
+SORT_RUN = 1 << 18
+
+
+def _entry_fields(entry):
+    # (time, numeric result) for one decoded journal line
+    if isinstance(entry, str):
+        _, sep, result = entry.rpartition(" = ")
+        timestamp = 0.0
+    else:
+        result = entry.get("result")
+        timestamp = float(entry.get("time") or 0.0)
+        sep = True
+    try:
+        value = float(result) if sep else math.nan
+    except (TypeError, ValueError):
+        value = math.nan
+    return timestamp, value
+
+
+class _Column:
+    # Read-only sequence view of one field of the fixed-size records, for bisect
+    def __init__(self, buffer, record, field, start, count):
+        self.buffer = buffer
+        self.record = record
+        self.field = field
+        self.start = start
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.record.unpack_from(self.buffer, self.start + i * self.record.size)[self.field]
+
+
+class HistoryIndex:
+    def __init__(self, journal_path, index_path=None):
+        self.journal_path = journal_path
+        self.index_path = index_path or journal_path + ".idx"
+        self.sorted_path = self.index_path.rsplit(".", 1)[0] + ".ridx"
+        self.count = 0
+        self.sorted_count = 0
+        self._covered = 0
+        self._journal_map = None
+        self._index_map = None
+        self._sorted_map = None
+
+    def __enter__(self):
+        self.refresh()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    # Building
+
+    def _read_header(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = f.read(HEADER.size)
+        except FileNotFoundError:
+            return None
+        if len(data) < HEADER.size:
+            return None
+        magic, version, count, covered, inode, sorted_count = HEADER.unpack(data)
+        if magic != MAGIC or version != VERSION:
+            return None
+        return count, covered, inode, sorted_count
+
+    def refresh(self):
+        self._unmap()
+        try:
+            stat = os.stat(self.journal_path)
+        except FileNotFoundError:
+            self.count = self.sorted_count = self._covered = 0
+            return 0
+
+        header = self._read_header()
+        if header is None or header[2] != stat.st_ino or header[1] > stat.st_size:
+            header = (0, 0, stat.st_ino, 0)
+            with open(self.index_path, "wb") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, 0, 0, stat.st_ino, 0))
+            open(self.sorted_path, "wb").close()
+        count, covered, inode, sorted_count = header
+
+        if covered < stat.st_size:
+            count, covered = self._index_tail(count, covered)
+            if count - sorted_count > max(RESORT_MINIMUM, count * RESORT_FRACTION):
+                sorted_count = self._resort(count)
+            with open(self.index_path, "r+b") as f:
+                f.write(HEADER.pack(MAGIC, VERSION, count, covered, inode, sorted_count))
+
+        self.count = count
+        self.sorted_count = sorted_count
+        self._covered = covered
+        self._map()
+        return count
+
+    def _index_tail(self, count, covered):
+        records = []
+        offset = covered
+        with open(self.journal_path, "rb") as journal, open(self.index_path, "r+b") as index:
+            index.seek(HEADER.size + count * RECORD.size)
+            journal.seek(covered)
+            for line in journal:
+                if not line.endswith(b"\n"):
+                    break  # Partially written line; picked up by the next refresh
+                if line.strip():
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        entry = None
+                    if entry is not None:
+                        timestamp, value = _entry_fields(entry)
+                        records.append(RECORD.pack(offset, timestamp, value))
+                        if len(records) >= WRITE_BATCH:
+                            index.write(b"".join(records))
+                            count += len(records)
+                            records = []
+                offset += len(line)
+            index.write(b"".join(records))
+            count += len(records)
+            index.truncate()
+        return count, offset
+
+    def _resort(self, count):
+        # External merge sort: sorted runs of SORT_RUN records go to temporary
+        # files and are merged from there, so memory stays flat however long
+        # the history is
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(self.sorted_path))) as directory:
+            runs = []
+            with open(self.index_path, "rb") as f:
+                f.seek(HEADER.size)
+                for first in range(0, count, SORT_RUN):
+                    data = f.read(min(SORT_RUN, count - first) * RECORD.size)
+                    pairs = [
+                        (value, number)
+                        for number, (_, _, value) in enumerate(RECORD.iter_unpack(data), first)
+                        if not math.isnan(value)
+                    ]
+                    pairs.sort()
+                    path = os.path.join(directory, f"run{len(runs)}")
+                    with open(path, "wb") as run:
+                        run.write(b"".join(SORTED_RECORD.pack(value, number) for value, number in pairs))
+                    runs.append(path)
+            files = [open(path, "rb") for path in runs]
+            try:
+                merged = heapq.merge(*(_read_sorted(run) for run in files))
+                with open(self.sorted_path, "wb") as f:
+                    while True:
+                        batch = list(islice(merged, WRITE_BATCH))
+                        if not batch:
+                            break
+                        f.write(b"".join(SORTED_RECORD.pack(value, number) for value, number in batch))
+            finally:
+                for run in files:
+                    run.close()
+        return count
+
+    def _map(self):
+        if self._covered:
+            with open(self.journal_path, "rb") as f:
+                self._journal_map = mmap.mmap(f.fileno(), self._covered, access=mmap.ACCESS_READ)
+        if self.count:
+            with open(self.index_path, "rb") as f:
+                self._index_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if os.path.exists(self.sorted_path) and os.path.getsize(self.sorted_path):
+            with open(self.sorted_path, "rb") as f:
+                self._sorted_map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _unmap(self):
+        for name in ("_journal_map", "_index_map", "_sorted_map"):
+            mapped = getattr(self, name)
+            if mapped is not None:
+                mapped.close()
+                setattr(self, name, None)
+
+    def close(self):
+        self._unmap()
+
+    # Reading
+
+    def _record(self, number):
+        return RECORD.unpack_from(self._index_map, HEADER.size + number * RECORD.size)
+
+    def _span(self, number):
+        start = self._record(number)[0]
+        end = self._record(number + 1)[0] if number + 1 < self.count else self._covered
+        return start, end
+
+    def entry(self, number):
+        if not 0 <= number < self.count:
+            raise IndexError("history entry out of range")
+        start, end = self._span(number)
+        return json.loads(self._journal_map[start:end])
+
+    def entries(self, start=0, stop=None):
+        stop = self.count if stop is None else min(stop, self.count)
+        for number in range(max(start, 0), stop):
+            yield number, self.entry(number)
+
+    # Searching
+
+    def _time_range(self, since, until):
+        times = _Column(self._index_map, RECORD, 1, HEADER.size, self.count)
+        lo = 0 if since is None else bisect_left(times, since)
+        hi = self.count if until is None else bisect_right(times, until)
+        return lo, hi
+
+    def _result_matches(self, low, high, lo, hi, limit=None):
+        # Ascending entry numbers; at most `limit` of them
+        low = -math.inf if low is None else low
+        high = math.inf if high is None else high
+        numbers = []
+        if self._sorted_map is not None and self.sorted_count:
+            size = len(self._sorted_map) // SORTED_RECORD.size
+            results = _Column(self._sorted_map, SORTED_RECORD, 0, 0, size)
+            first = bisect_left(results, low)
+            last = bisect_right(results, high)
+            found = (number for number in (
+                SORTED_RECORD.unpack_from(self._sorted_map, i * SORTED_RECORD.size)[1]
+                for i in range(first, last)
+            ) if lo <= number < hi)
+            # The sorted part is in result order, so all of it is read, but only
+            # the first `limit` entries are kept
+            numbers = sorted(found) if limit is None else heapq.nsmallest(limit, found)
+        for number in range(max(self.sorted_count, lo), hi):
+            if limit is not None and len(numbers) >= limit:
+                break
+            value = self._record(number)[2]
+            if low <= value <= high:
+                numbers.append(number)
+        return numbers
+
+    def _text_matches(self, text, candidates, lo, hi, limit=None):
+        if candidates is not None:
+            matches = (n for n in candidates if text in format_entry(self.entry(n)))
+            return list(islice(matches, limit))
+        # Scan the raw bytes for the JSON-escaped needle, then confirm on the decoded
+        # entry (the needle may also match a key name or straddle fields)
+        needle = json.dumps(text)[1:-1].encode("utf-8")
+        offsets = _Column(self._index_map, RECORD, 0, HEADER.size, self.count)
+        numbers = []
+        position = self._span(lo)[0] if lo < hi else self._covered
+        end = self._span(hi - 1)[1] if lo < hi else self._covered
+        while limit is None or len(numbers) < limit:
+            found = self._journal_map.find(needle, position, end)
+            if found < 0:
+                break
+            number = bisect_right(offsets, found) - 1
+            if text in format_entry(self.entry(number)):
+                numbers.append(number)
+            position = self._span(number)[1]
+        return numbers
+
+    def search(self, text=None, min_result=None, max_result=None, since=None, until=None, limit=None):
+        # Entry numbers (ascending) matching every given filter; scanning stops
+        # once `limit` matches are found
+        if not self.count:
+            return []
+        lo, hi = self._time_range(since, until)
+        candidates = None
+        if min_result is not None or max_result is not None:
+            candidates = self._result_matches(min_result, max_result, lo, hi, None if text else limit)
+        if text:
+            return self._text_matches(text, candidates, lo, hi, limit)
+        if candidates is None:
+            candidates = range(lo, hi)
+        return list(candidates[:limit] if limit is not None else candidates)
+
+    def replay(self, start=0, stop=None, variables=None):
+        # Re-evaluates a range of entries, yielding (number, entry, result, error)
+        for number, entry in self.entries(start, stop):
+            try:
+                yield number, entry, replay_entry(entry, variables), None
+            except Exception as e:
+                yield number, entry, None, e
+
+
+def _read_sorted(f):
+    # (result, entry number) pairs from a sorted run, a block at a time
+    while True:
+        data = f.read(WRITE_BATCH * SORTED_RECORD.size)
+        if not data:
+            return
+        yield from SORTED_RECORD.iter_unpack(data)
+
+
+def replay_entry(entry, variables=None):
+    # Re-evaluates an entry the way it was first computed. Calculus entries
+    # keep only a label of what was run, so they are refused.
+    if isinstance(entry, str):
+        expression = entry.rpartition(" = ")[0] or entry
+        return evaluate(expression, variables)
+    if "function" in entry:
+        return apply_function(entry["function"], float(entry["argument"]))
+    kind = entry.get("kind")
+    if kind is None:
+        return evaluate(entry["expression"], variables)
+    if kind == "units":
+        return evaluate_quantity(entry["expression"], variables)
+    if kind == "programmer":
+        engine = IntegerEngine(entry.get("word_size", 64))
+        return engine.format(engine.evaluate(entry["expression"]), entry.get("base", "DEC"))
+    raise ValueError(f"{kind} entries cannot be replayed")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m history_index",
+        description="Search or replay a calculator history journal.",
+    )
+    parser.add_argument("journal", help="history journal (calculator_history.jsonl)")
+    parser.add_argument("-t", "--text", help="substring of the entry")
+    parser.add_argument("--min", type=float, dest="min_result", help="smallest result")
+    parser.add_argument("--max", type=float, dest="max_result", help="largest result")
+    parser.add_argument("--since", type=float, help="earliest time (Unix seconds)")
+    parser.add_argument("--until", type=float, help="latest time (Unix seconds)")
+    parser.add_argument("-n", "--limit", type=int, help="stop after this many matches")
+    parser.add_argument("--replay", action="store_true", help="re-evaluate the matching entries")
+    args = parser.parse_args(argv)
+
+    with HistoryIndex(args.journal) as index:
+        matches = index.search(args.text, args.min_result, args.max_result, args.since, args.until, args.limit)
+        for number in matches:
+            entry = index.entry(number)
+            line = f"{number}\t{format_entry(entry)}"
+            if args.replay:
+                try:
+                    line += f"\t{format_result(replay_entry(entry))}"
+                except Exception as e:
+                    line += f"\terror: {e}"
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+from expression import ALIASES, BINARY_OPERATORS, CONSTANTS, FUNCTIONS
+
+# Incremental evaluator for the live preview under the display. It runs an
+# operator-precedence (shunting-yard) parse one character at a time and reduces
+# operators as soon as precedence allows, so the state after each character is
+# just two short stacks of values and pending operators. The stacks are
+# immutable linked lists, which makes each state O(1) to derive from the
+# previous one; LiveExpression keeps one state and one character per list
+# slot, so appending a character is O(1) and backspace is a list pop.
+# set_text(), which the display calls with its whole text, still compares the
+# new text with the old one, but that is a linear scan and no parsing. Computing
+# the preview only folds the pending operators (bounded by the nesting depth),
+# never the text.
+#
+# The preview is advisory: "=" still evaluates the full text with the compiled
+# engine, which is the authority on errors.
+
+_PRECEDENCE = {"+": 1, "-": 1, "*": 2, "/": 2, "//": 2, "%": 2, "neg": 3, "pos": 3, "**": 4}
+_RIGHT_ASSOCIATIVE = {"**", "neg", "pos"}
+_OPERATOR_CHARS = set("+-*/%^")
+
+
+class _State:
+    __slots__ = ("values", "ops", "token", "kind", "expect", "error", "last_op")
+
+    def __init__(self, values=None, ops=None, token="", kind=None, expect=True, error=None, last_op=None):
+        self.values = values    # (value, rest) linked list
+        self.ops = ops          # (op, rest); op is a str, ("(",) or ("call", name, argc)
+        self.token = token      # number or name being typed
+        self.kind = kind        # "num", "name", "name!" (name followed by a space) or None
+        self.expect = expect    # True while an operand is expected
+        self.error = error
+        self.last_op = last_op  # operator pushed by the last character, for ** and //
+
+    def replace(self, **changes):
+        state = _State(self.values, self.ops, self.token, self.kind, self.expect, None, None)
+        for name, value in changes.items():
+            setattr(state, name, value)
+        return state
+
+    def fail(self, message):
+        return _State(self.values, self.ops, self.token, self.kind, self.expect, message)
+
+
+class _Failure(Exception):
+    pass
+
+
+def _resolve_name(name, variables):
+    name = ALIASES.get(name, name)
+    if name in variables:
+        return variables[name]
+    if name in CONSTANTS:
+        return CONSTANTS[name]
+    raise _Failure(f"name '{name}' is not defined")
+
+
+def _number(token):
+    try:
+        return float(token) if any(c in token for c in ".eE") else int(token)
+    except ValueError:
+        raise _Failure(f"invalid number {token!r}") from None
+
+
+def _apply(op, values):
+    if op == "neg" or op == "pos":
+        if values is None:
+            raise _Failure("missing operand")
+        value, rest = values
+        return (-value if op == "neg" else +value, rest)
+    if values is None or values[1] is None:
+        raise _Failure("missing operand")
+    right, (left, rest) = values
+    try:
+        return (BINARY_OPERATORS[op](left, right), rest)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise _Failure(str(e)) from None
+
+
+def _reduce_while(state_values, ops, precedence, right_associative):
+    # Applies stacked operators that bind at least as tightly as the incoming one
+    while ops is not None:
+        top = ops[0]
+        if not isinstance(top, str):
+            break
+        top_precedence = _PRECEDENCE[top]
+        if top_precedence < precedence or (top_precedence == precedence and right_associative):
+            break
+        state_values = _apply(top, state_values)
+        ops = ops[1]
+    return state_values, ops
+
+
+def _flush(state, variables):
+    # Turns a finished number or name token into a value
+    if state.kind is None:
+        return state
+    if state.kind == "num":
+        value = _number(state.token)
+    else:
+        value = _resolve_name(state.token, variables)
+    return state.replace(values=(value, state.values), token="", kind=None, expect=False)
+
+
+def _call(name, args):
+    fn = FUNCTIONS.get(ALIASES.get(name, name))
+    if fn is None:
+        raise _Failure(f"unknown function '{name}'")
+    try:
+        return fn(*args)
+    except (ArithmeticError, ValueError, TypeError) as e:
+        raise _Failure(str(e)) from None
+
+
+def _close_group(state):
+    # Reduces to the innermost "(" or function call and closes it. A call's
+    # marker counts the arguments before the last one, which is on the stack.
+    values, ops = _reduce_while(state.values, state.ops, 0, False)
+    if ops is None:
+        raise _Failure("unbalanced ')'")
+    marker, ops = ops
+    if marker[0] == "call":
+        args = []
+        for _ in range(marker[2] + 1):
+            value, values = values
+            args.append(value)
+        args.reverse()
+        values = (_call(marker[1], args), values)
+    return state.replace(values=values, ops=ops, expect=False)
+
+
+def step(state, char, variables):
+    if state.error is not None:
+        return state
+    try:
+        return _step(state, char, variables)
+    except _Failure as e:
+        return state.fail(str(e))
+
+
+def _step(state, char, variables):
+    kind = state.kind
+
+    if char.isdigit() or char == ".":
+        if kind == "num" or kind == "name":
+            return state.replace(token=state.token + char, kind=kind)
+        if kind is None and state.expect:
+            return state.replace(token=char, kind="num")
+        raise _Failure(f"unexpected {char!r}")
+
+    if kind == "num" and state.token[-1:] in ("e", "E") and char in "+-":
+        return state.replace(token=state.token + char, kind=kind)
+
+    if char.isalpha() or char == "_":
+        if kind == "name":
+            return state.replace(token=state.token + char, kind=kind)
+        if kind == "num" and char in "eE" and "e" not in state.token.lower():
+            return state.replace(token=state.token + char, kind=kind)
+        if kind is None and state.expect:
+            return state.replace(token=char, kind="name")
+        raise _Failure(f"unexpected {char!r}")
+
+    if char.isspace():
+        if kind == "name":
+            return state.replace(token=state.token, kind="name!")
+        if kind == "num":
+            return _flush(state, variables)
+        return state.replace(token=state.token, kind=kind, expect=state.expect)
+
+    if char == "(":
+        if kind in ("name", "name!"):
+            return state.replace(ops=(("call", state.token, 0), state.ops), token="", kind=None, expect=True)
+        if kind is None and state.expect:
+            return state.replace(ops=(("(",), state.ops), expect=True)
+        raise _Failure("unexpected '('")
+
+    state = _flush(state, variables)
+
+    if char == ")":
+        if state.expect:
+            # Only a call with no arguments may close right after opening
+            top = state.ops[0] if state.ops is not None else None
+            if top is None or isinstance(top, str) or top[0] != "call" or top[2] != 0:
+                raise _Failure("unexpected ')'")
+            return state.replace(values=(_call(top[1], []), state.values), ops=state.ops[1], expect=False)
+        return _close_group(state)
+
+    if char == ",":
+        if state.expect:
+            raise _Failure("unexpected ','")
+        values, ops = _reduce_while(state.values, state.ops, 0, False)
+        if ops is None or isinstance(ops[0], str) or ops[0][0] != "call":
+            raise _Failure("',' outside a function call")
+        marker = ops[0]
+        return state.replace(values=values, ops=(("call", marker[1], marker[2] + 1), ops[1]), expect=True)
+
+    if char in _OPERATOR_CHARS:
+        op = "**" if char == "^" else char
+        if state.expect:
+            if op in ("-", "+"):
+                unary = "neg" if op == "-" else "pos"
+                return state.replace(ops=(unary, state.ops), expect=True, last_op=unary)
+            raise _Failure(f"unexpected {char!r}")
+        values, ops = _reduce_while(state.values, state.ops, _PRECEDENCE[op], op in _RIGHT_ASSOCIATIVE)
+        return state.replace(values=values, ops=(op, ops), expect=True, last_op=op)
+
+    raise _Failure(f"unexpected character {char!r}")
+
+
+def finish(state, variables):
+    # Value of the text so far, closing any open parentheses; None if incomplete
+    if state.error is not None:
+        return None
+    try:
+        state = _flush(state, variables)
+        if state.expect:
+            return None
+        while state.ops is not None:
+            values, ops = _reduce_while(state.values, state.ops, 0, False)
+            if ops is None:
+                state = state.replace(values=values, ops=None, expect=False)
+                break
+            state = _close_group(state)
+        values = state.values
+        if values is None or values[1] is not None:
+            return None
+        return values[0]
+    except _Failure:
+        return None
+
+
+class LiveExpression:
+    def __init__(self, text="", variables=None):
+        self.variables = variables if variables is not None else {}
+        self._chars = []
+        self._states = [_State()]
+        self.set_text(text)
+
+    def __len__(self):
+        return len(self._chars)
+
+    @property
+    def text(self):
+        return "".join(self._chars)
+
+    def append(self, chars):
+        states = self._states
+        text = self._chars
+        for char in chars:
+            current = states[-1]
+            previous_char = text[-1] if text else ""
+            if (char == previous_char and char in "*/" and current.last_op == char
+                    and current.kind is None):
+                # "**" and "//" arrive as two keystrokes; redo the operator from the
+                # state before the first one
+                state = _double_operator(states[-2], char + char, self.variables)
+            else:
+                state = step(current, char, self.variables)
+            states.append(state)
+            text.append(char)
+
+    def backspace(self, count=1):
+        count = min(count, len(self._chars))
+        if count:
+            del self._states[-count:]
+            del self._chars[-count:]
+
+    def clear(self):
+        self._states = [_State()]
+        self._chars = []
+
+    def set_text(self, text):
+        # Reuses the states for the common prefix, so typing at the end or
+        # deleting from it costs only the changed characters
+        current = self.text
+        if text == current:
+            return
+        if text.startswith(current):
+            self.append(text[len(current):])
+            return
+        if current.startswith(text):
+            self.backspace(len(current) - len(text))
+            return
+        common = 0
+        limit = min(len(text), len(current))
+        while common < limit and text[common] == current[common]:
+            common += 1
+        self.backspace(len(current) - common)
+        self.append(text[common:])
+
+    @property
+    def error(self):
+        return self._states[-1].error
+
+    def value(self):
+        return finish(self._states[-1], self.variables)
+
+
+def _double_operator(state, op, variables):
+    if state.error is not None:
+        return state
+    try:
+        state = _flush(state, variables)
+        if state.expect:
+            raise _Failure(f"unexpected {op!r}")
+        values, ops = _reduce_while(state.values, state.ops, _PRECEDENCE[op], op in _RIGHT_ASSOCIATIVE)
+        return state.replace(values=values, ops=(op, ops), expect=True, last_op=op)
+    except _Failure as e:
+        return state.fail(str(e))
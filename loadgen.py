@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+import server
+
+# Load generator for server.py. Opens --connections clients, each keeping up to
+# --pipeline requests in flight, and reports latency percentiles (from writing a
+# request to reading its response) and overall throughput. With --spawn it
+# starts a server in-process first, so a whole run needs nothing but localhost.
+
+DEFAULT_EXPRESSIONS = [
+    "2 + 3 * 4",
+    "x ** 2 + 3 * x - 7",
+    "sqrt(x) + sin(x / 2) * log(x + 1)",
+]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def _client(open_connection, requests, pipeline, expressions, latencies, errors):
+    reader, writer = await open_connection()
+    writer.write(json.dumps({"id": 0, "op": "set", "name": "x", "value": 1.75}).encode() + b"\n")
+    await reader.readline()
+
+    sent_at = {}
+    window = asyncio.Semaphore(pipeline)
+
+    async def send():
+        for i in range(1, requests + 1):
+            await window.acquire()
+            expression = expressions[i % len(expressions)]
+            sent_at[i] = time.perf_counter()
+            writer.write(json.dumps({"id": i, "op": "evaluate", "expression": expression}).encode() + b"\n")
+            if i % pipeline == 0:
+                await writer.drain()
+        await writer.drain()
+
+    sender = asyncio.create_task(send())
+    for _ in range(requests):
+        line = await reader.readline()
+        now = time.perf_counter()
+        response = json.loads(line)
+        latencies.append(now - sent_at.pop(response["id"]))
+        if not response["ok"]:
+            errors.append(response["error"])
+        window.release()
+    await sender
+    writer.close()
+    await writer.wait_closed()
+
+
+async def run(connections, requests, pipeline, expressions, host, port, path=None, spawn=False, workers=None):
+    calculator = None
+    if spawn:
+        calculator = server.CalculatorServer(workers)
+        await calculator.start(host, port, path)
+        if path is None:
+            port = calculator.server.sockets[0].getsockname()[1]
+
+    if path is not None:
+        def open_connection():
+            return asyncio.open_unix_connection(path, limit=server.MAX_LINE)
+    else:
+        def open_connection():
+            return asyncio.open_connection(host, port, limit=server.MAX_LINE)
+
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(
+            _client(open_connection, requests, pipeline, expressions, latencies, errors)
+            for _ in range(connections)
+        ))
+    finally:
+        if calculator is not None:
+            await calculator.close()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "connections": connections,
+        "pipeline": pipeline,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_per_second": len(latencies) / elapsed if elapsed else None,
+        "p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "max_ms": latencies[-1] * 1000 if latencies else None,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m loadgen",
+        description="Drive a calculator server and report latency and throughput.",
+    )
+    parser.add_argument("--host", default=server.DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=server.DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", help="connect to a Unix socket instead of TCP")
+    parser.add_argument("-c", "--connections", type=int, default=8, help="concurrent clients (default 8)")
+    parser.add_argument("-n", "--requests", type=int, default=2000, help="requests per client (default 2000)")
+    parser.add_argument("-p", "--pipeline", type=int, default=16, help="requests in flight per client (default 16)")
+    parser.add_argument("-e", "--expression", action="append", help="expression to send (repeatable; x is 1.75)")
+    parser.add_argument("--spawn", action="store_true", help="start a server in this process on a free port")
+    parser.add_argument("-w", "--workers", type=int, help="worker processes for --spawn")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    port = 0 if args.spawn and args.unix is None else args.port
+    report = asyncio.run(run(
+        args.connections, args.requests, args.pipeline, args.expression or DEFAULT_EXPRESSIONS,
+        args.host, port, args.unix, args.spawn, args.workers,
+    ))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['requests']} requests over {report['connections']} connections "
+              f"(pipeline {report['pipeline']}) in {report['seconds']:.2f}s, {report['errors']} errors")
+        print(f"{report['requests_per_second']:.0f} req/s, p50 {report['p50_ms']:.3f} ms, "
+              f"p99 {report['p99_ms']:.3f} ms, max {report['max_ms']:.3f} ms")
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
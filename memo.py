@@ -0,0 +1,136 @@
+import json
+from collections import OrderedDict
+
+import backends
+from persistence import atomic_write
+
+# Memoized results for the calculator. Entries are keyed on
+#   (kind, backend name, backend precision, normalized text, bindings)
+# where bindings holds only the variables the expression actually reads (plus
+# any variable shadowing a constant). Changing a variable therefore changes the
+# key of every expression that depends on it, and results for expressions that
+# don't read it stay valid. Errors are never cached.
+
+DEFAULT_MAX_ENTRIES = 4096
+
+
+def _backend_key(backend):
+    return backend.name, backend.precision
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def get(self, key, default=None):
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        entries = self._entries
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    _MISSING = object()
+
+    def expression_key(self, compiled, variables, backend):
+        relevant = compiled.names
+        if variables:
+            shadowed = variables.keys() & backend.constants.keys()
+            if shadowed:
+                relevant = relevant | shadowed
+        bindings = tuple(sorted((name, variables[name]) for name in relevant if name in variables))
+        return ("expr",) + _backend_key(backend) + (compiled.source, bindings)
+
+    def evaluate(self, text, variables=None, backend=backends.FLOAT):
+        compiled = backend.compile(text)
+        key = self.expression_key(compiled, variables or {}, backend)
+        result = self.get(key, self._MISSING)
+        if result is self._MISSING:
+            result = backend.evaluate(text, variables)
+            self.put(key, result)
+        return result
+
+    def apply_function(self, name, value, backend=backends.FLOAT):
+        key = ("func",) + _backend_key(backend) + (name, value)
+        result = self.get(key, self._MISSING)
+        if result is self._MISSING:
+            result = backend.apply_function(name, value)
+            self.put(key, result)
+        return result
+
+    # Persistence. Only float-backend entries with plain numeric bindings and
+    # results are written; anything else is rebuilt on demand.
+
+    def save(self, path):
+        records = []
+        for key, value in self._entries.items():
+            if key[1] != "float" or not _plain_number(value):
+                continue
+            if key[0] == "expr":
+                if not all(_plain_number(v) for _, v in key[4]):
+                    continue
+                records.append({"key": [key[0], key[3], [list(pair) for pair in key[4]]], "value": value})
+            elif _plain_number(key[4]):
+                records.append({"key": [key[0], key[3], key[4]], "value": value})
+        atomic_write(path, json.dumps({"version": 1, "entries": records}))
+        return len(records)
+
+    def load(self, path):
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != 1:
+            return 0
+        backend_key = _backend_key(backends.FLOAT)
+        loaded = 0
+        for record in data.get("entries", []):
+            kind, name, extra = record["key"]
+            if kind == "expr":
+                key = (kind,) + backend_key + (name, tuple((n, v) for n, v in extra))
+            else:
+                key = (kind,) + backend_key + (name, extra)
+            self.put(key, record["value"])
+            loaded += 1
+        return loaded
+
+
+def _plain_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
@@ -0,0 +1,167 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from functools import wraps
+
+# Opt-in, in-process metrics for the GUI's entry points. Each instrumented call
+# adds its latency to a fixed-bucket histogram and bumps a call and an error
+# counter for its operation name. While the registry is disabled the wrapper
+# costs one attribute check. The GUI methods report failures through message
+# boxes rather than exceptions, so they call mark_error() in their error paths,
+# before the dialog opens: the call's latency stops there, so the time a user
+# takes to dismiss the dialog is not counted. An exception escaping the call
+# counts as an error too.
+#
+# CALC_METRICS=1 enables collection at startup. CALC_PROFILE=path runs the whole
+# session under cProfile and writes the stats to path on exit (read them with
+# python -m pstats path).
+
+METRICS_ENV = "CALC_METRICS"
+PROFILE_ENV = "CALC_PROFILE"
+
+# Upper bounds in seconds; the last bucket (+Inf) catches everything slower
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+PROMETHEUS_PREFIX = "calculator"
+
+
+class _Operation:
+    __slots__ = ("counts", "total", "calls", "errors")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.calls = 0
+        self.errors = 0
+
+
+class MetricsRegistry:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._operations = {}
+        self._lock = threading.Lock()
+        self._failed_at = None
+
+    def record(self, name, seconds, error=False):
+        with self._lock:
+            operation = self._operations.get(name)
+            if operation is None:
+                operation = self._operations[name] = _Operation()
+            operation.counts[bisect_left(BUCKETS, seconds)] += 1
+            operation.total += seconds
+            operation.calls += 1
+            if error:
+                operation.errors += 1
+
+    def mark_error(self):
+        # Marks the instrumented call in progress as failed as of now
+        self._failed_at = time.perf_counter()
+
+    def reset(self):
+        with self._lock:
+            self._operations.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                name: {
+                    "calls": operation.calls,
+                    "errors": operation.errors,
+                    "error_rate": operation.errors / operation.calls if operation.calls else 0.0,
+                    "seconds_total": operation.total,
+                    "buckets": dict(zip([*map(str, BUCKETS), "+Inf"], operation.counts)),
+                }
+                for name, operation in sorted(self._operations.items())
+            }
+
+    def to_json(self):
+        return json.dumps({"time": time.time(), "buckets": BUCKETS, "operations": self.snapshot()}, indent=2)
+
+    def to_prometheus(self):
+        metric = f"{PROMETHEUS_PREFIX}_call_duration_seconds"
+        lines = [
+            f"# HELP {metric} Latency of calculator operations.",
+            f"# TYPE {metric} histogram",
+        ]
+        snapshot = self.snapshot()
+        for name, data in snapshot.items():
+            cumulative = 0
+            for bound, count in data["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{operation="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'{metric}_sum{{operation="{name}"}} {data["seconds_total"]!r}')
+            lines.append(f'{metric}_count{{operation="{name}"}} {data["calls"]}')
+        for counter, key, description in (
+            ("calls_total", "calls", "Calls of calculator operations."),
+            ("errors_total", "errors", "Calculator operations that failed."),
+        ):
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{counter} {description}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{counter} counter")
+            for name, data in snapshot.items():
+                lines.append(f'{PROMETHEUS_PREFIX}_{counter}{{operation="{name}"}} {data[key]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path):
+        # Prometheus text format for .prom/.txt files, JSON otherwise
+        text = self.to_prometheus() if path.endswith((".prom", ".txt")) else self.to_json()
+        with open(path, "w") as f:
+            f.write(text)
+
+
+registry = MetricsRegistry(enabled=os.environ.get(METRICS_ENV, "") not in ("", "0"))
+
+
+def instrument(name, registry=registry):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return fn(*args, **kwargs)
+            outer_failed_at = registry._failed_at
+            registry._failed_at = None
+            error = True
+            start = time.perf_counter()
+            try:
+                result = fn(*args, **kwargs)
+                error = registry._failed_at is not None
+                return result
+            finally:
+                end = registry._failed_at or time.perf_counter()
+                registry.record(name, end - start, error)
+                registry._failed_at = outer_failed_at
+        return wrapper
+    return decorator
+
+
+def mark_error():
+    registry.mark_error()
+
+
+def recorder(name, registry=registry):
+    # For work timed outside an instrumented call, such as writes made by a
+    # background thread: returns record(seconds, error) for operation `name`
+    def record(seconds, error=False):
+        if registry.enabled:
+            registry.record(name, seconds, error)
+    return record
+
+
+def start_profile():
+    # Starts a session profile when CALC_PROFILE is set; returns it or None
+    path = os.environ.get(PROFILE_ENV)
+    if not path:
+        return None
+    import cProfile
+
+    profile = cProfile.Profile()
+    profile.enable()
+    return profile
+
+
+def stop_profile(profile):
+    if profile is None:
+        return
+    profile.disable()
+    profile.dump_stats(os.environ[PROFILE_ENV])
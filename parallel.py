@@ -0,0 +1,71 @@
+import os
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+
+from expression import compile_expression, time_limit
+
+# Spreads expression batches over a process pool. Input is read lazily and cut
+# into chunks; at most a few chunks per worker are in flight, so memory stays
+# bounded however long the input is. Every worker process keeps its own
+# compile_expression cache, so each distinct expression is parsed once per worker.
+# Unlike calc_core.evaluate_lines there is no assignment support: lines are
+# evaluated independently against the same variables.
+
+DEFAULT_CHUNK_SIZE = 1024
+
+
+def _evaluate_chunk(items, variables):
+    results = []
+    append = results.append
+    for number, line in items:
+        try:
+            with time_limit():
+                append((number, line, compile_expression(line).evaluate(variables), None))
+        except Exception as e:
+            append((number, line, None, e))
+    return results
+
+
+def _numbered(lines):
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if line and not line.startswith("#"):
+            yield number, line
+
+
+def evaluate_parallel(lines, variables=None, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, ordered=True):
+    # Yields (line_number, line, result, error) like calc_core.evaluate_lines.
+    # With ordered=False results come back as soon as their chunk finishes.
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    workers = workers or os.cpu_count() or 1
+    variables = dict(variables or {})
+    items = _numbered(lines)
+    max_pending = workers * 2
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+
+        def submit():
+            chunk = list(islice(items, chunk_size))
+            if not chunk:
+                return False
+            pending.append(executor.submit(_evaluate_chunk, chunk, variables))
+            return True
+
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < max_pending:
+                exhausted = not submit()
+            if not pending:
+                break
+
+            if ordered:
+                yield from pending.popleft().result()
+                continue
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                pending.remove(future)
+                yield from future.result()
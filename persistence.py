@@ -0,0 +1,272 @@
+import json
+import os
+import sys
+import threading
+import time
+from decimal import Decimal
+from fractions import Fraction
+
+# Where the calculator keeps its files, and how it writes them safely.
+#
+# atomic_write writes to a temporary file in the same directory, fsyncs it and
+# renames it over the target, so a crash leaves either the old file or the new
+# one, never a truncated mix.
+#
+# StateStore holds small key/value state (theme, memory, variables, formulas) in
+# a JSON-lines journal: each line is [key, value], or [key] for a deletion. set()
+# only updates the dict in memory; changes made within `delay` seconds are
+# coalesced (only the last value per key is kept) and appended by a timer
+# thread, so the Tk thread never waits on the disk. Once the journal holds
+# several times more lines than there are keys, it is rewritten atomically to
+# one line per key. Loading therefore reads at most a few lines per key, however
+# long the calculator has been in use. A torn final line from a crash is skipped.
+# JSON has no Decimal or Fraction, and Python refuses to write ints longer than
+# 4300 digits, so those values are stored tagged, as {"$fraction": "1/3"}, and
+# come back as the same type.
+
+APP_NAME = "advanced-calculator"
+DEFAULT_DELAY = 0.5
+# Journal lines allowed per live key before compaction (plus a fixed slack)
+COMPACT_RATIO = 4
+COMPACT_SLACK = 64
+# Larger ints are stored as decimal text
+MAX_JSON_INT_BITS = 14000
+
+
+def data_dir(create=True):
+    # $CALC_DATA_DIR, else the platform's per-user data directory
+    path = os.environ.get("CALC_DATA_DIR")
+    if not path:
+        if sys.platform == "win32":
+            base = os.environ.get("APPDATA") or os.path.expanduser("~")
+        elif sys.platform == "darwin":
+            base = os.path.expanduser("~/Library/Application Support")
+        else:
+            base = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+        path = os.path.join(base, APP_NAME)
+    if create:
+        os.makedirs(path, exist_ok=True)
+    return path
+
+
+def migrate(legacy_path, path):
+    # Moves a file left in the working directory by older versions into place,
+    # unless the data directory already has one
+    if os.path.exists(legacy_path) and not os.path.exists(path):
+        import shutil  # Only needed once, on the first run after upgrading
+        shutil.move(legacy_path, path)
+
+
+def atomic_write(path, data):
+    import tempfile  # Deferred with its random import; nothing writes at startup
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.unlink(temp_path)
+        except OSError:
+            pass
+        raise
+    _sync_directory(directory)
+
+
+def _sync_directory(directory):
+    # Makes the rename itself durable; not possible (or needed) on Windows
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    try:
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def _encode(value):
+    if isinstance(value, Fraction):
+        return {"$fraction": str(value)}
+    if isinstance(value, Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, int) and not isinstance(value, bool) and value.bit_length() > MAX_JSON_INT_BITS:
+        from programmer import to_string  # str() refuses ints this long
+        return {"$int": to_string(value)}
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict) and len(value) == 1:
+        (tag, text), = value.items()
+        if tag == "$fraction":
+            return Fraction(text)
+        if tag == "$decimal":
+            return Decimal(text)
+        if tag == "$int":
+            from programmer import from_string
+            return from_string(text)
+    return value
+
+
+def _line(key, value=None, deleted=False):
+    record = [key] if deleted else [key, _encode(value)]
+    return json.dumps(record) + "\n"
+
+
+_DELETED = object()
+
+
+class StateStore:
+    def __init__(self, path, delay=DEFAULT_DELAY, on_write=None):
+        # on_write(seconds, error) is called after every write to the file
+        self.path = path
+        self.delay = delay
+        self.on_write = on_write
+        self.values = {}
+        self.errors = 0           # failed background writes
+        self._pending = {}        # key -> value or _DELETED, not yet on disk
+        self._journal_lines = 0
+        self._lock = threading.Lock()        # values and _pending
+        self._write_lock = threading.Lock()  # the file
+        self._timer = None
+
+    def __contains__(self, key):
+        return key in self.values
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def items(self, prefix=""):
+        return [(key[len(prefix):], value) for key, value in self.values.items() if key.startswith(prefix)]
+
+    def load(self):
+        values = {}
+        lines = 0
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue  # A torn final line from a crash mid-append
+                    if not isinstance(record, list) or not record or not isinstance(record[0], str):
+                        continue
+                    if len(record) == 1:
+                        values.pop(record[0], None)
+                    else:
+                        try:
+                            values[record[0]] = _decode(record[1])
+                        except (ValueError, ArithmeticError):
+                            continue
+                    lines += 1
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self.values = values
+            self._pending = {}
+        self._journal_lines = lines
+        return values
+
+    # Changes
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def update(self, values):
+        with self._lock:
+            for key, value in values.items():
+                if self.values.get(key, _DELETED) == value and key not in self._pending:
+                    continue
+                self.values[key] = value
+                self._pending[key] = value
+        self._schedule()
+
+    def delete(self, key):
+        with self._lock:
+            if key not in self.values:
+                return
+            del self.values[key]
+            self._pending[key] = _DELETED
+        self._schedule()
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is not None or not self._pending:
+                return
+            self._timer = threading.Timer(self.delay, self._flush_in_background)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        except OSError:
+            self.errors += 1
+
+    # Writing
+
+    def flush(self):
+        # Appends everything pending; safe to call from any thread
+        with self._write_lock:
+            with self._lock:
+                timer, self._timer = self._timer, None
+                pending, self._pending = self._pending, {}
+                if not pending:
+                    return 0
+                if self._journal_lines + len(pending) > COMPACT_RATIO * len(self.values) + COMPACT_SLACK:
+                    snapshot = dict(self.values)
+                else:
+                    snapshot = None
+            if timer is not None and timer is not threading.current_thread():
+                timer.cancel()
+            start = time.perf_counter()
+            try:
+                if snapshot is not None:
+                    atomic_write(self.path, "".join(_line(key, value) for key, value in snapshot.items()))
+                    self._journal_lines = len(snapshot)
+                else:
+                    data = "".join(_line(key, deleted=True) if value is _DELETED else _line(key, value)
+                                   for key, value in pending.items())
+                    with open(self.path, "a", encoding="utf-8") as f:
+                        f.write(data)
+                        f.flush()
+                        os.fsync(f.fileno())
+                    self._journal_lines += len(pending)
+            except BaseException:
+                # Put the changes back (newer ones win) so a later flush retries them
+                with self._lock:
+                    pending.update(self._pending)
+                    self._pending = pending
+                self._report(start, True)
+                raise
+            self._report(start, False)
+            return len(pending)
+
+    def _report(self, start, error):
+        if self.on_write is not None:
+            self.on_write(time.perf_counter() - start, error)
+
+    def compact(self):
+        with self._write_lock:
+            with self._lock:
+                snapshot = dict(self.values)
+                self._pending = {}
+            start = time.perf_counter()
+            try:
+                atomic_write(self.path, "".join(_line(key, value) for key, value in snapshot.items()))
+            except BaseException:
+                self._report(start, True)
+                raise
+            self._report(start, False)
+            self._journal_lines = len(snapshot)
+
+    def close(self):
+        self.flush()
@@ -0,0 +1,361 @@
+import argparse
+import csv
+import decimal
+import math
+import os
+import sys
+import time
+from itertools import islice
+
+import programmer
+import units
+import vectorized
+from expression import ExpressionError, compile_expression
+
+# Streaming column calculator for large CSV files:
+#
+#   python -m pipeline sensors.csv -o out.csv \
+#       --eval "power = volts * amps" --convert "temp_f = temp:celsius:fahrenheit"
+#
+# The input is read a chunk of rows at a time and turned column-major. Only the
+# columns an operation reads are parsed as numbers, and each operation runs once
+# per chunk: an expression is compiled once and evaluated over the chunk (as
+# NumPy arrays when NumPy is installed, otherwise through the chunked loop in
+# vectorized.py), and a conversion is one multiply-add from the converter's unit
+# tables. Each chunk is written out before the next one is read, so memory is
+# bounded by the chunk size and not by the file.
+#
+# Operations run in order and may read the columns earlier ones produced. An
+# operation writing an existing column replaces it in place; otherwise the new
+# column is appended. Cells that are empty or not numbers read as nan, and nan
+# results (including complex ones, which a CSV column cannot hold) are written
+# as empty cells. Integers too large for str() are written in full.
+
+DEFAULT_CHUNK_SIZE = 65536
+PROGRESS_INTERVAL = 1.0
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def _cell(value, spec):
+    # Slow path of _format for integers beyond float range and str()'s digit limit
+    if value != value:
+        return ""
+    if value.__class__ is int:
+        return programmer.to_string(value) if spec is None else format(decimal.Decimal(value), spec)
+    return str(value) if spec is None else format(value, spec)
+
+
+def _format(values, digits=None):
+    if hasattr(values, "tolist"):
+        values = values.tolist()
+    spec = None if digits is None else f".{digits}g"
+    try:
+        if spec is None:
+            return ["" if value != value else str(value) for value in values]
+        return ["" if value != value else format(value, spec) for value in values]
+    except (OverflowError, ValueError):
+        return [_cell(value, spec) for value in values]
+
+
+class Chunk:
+    # A block of rows held by column: the text as read, and numbers parsed on demand
+    def __init__(self, header, rows, np=None):
+        width = len(header)
+        rows = [row if len(row) == width else (row + [""] * width)[:width] for row in rows]
+        self.length = len(rows)
+        self.text = dict(zip(header, zip(*rows))) if rows else {name: () for name in header}
+        self.numbers = {}
+        self.np = np
+
+    def numeric(self, name):
+        values = self.numbers.get(name)
+        if values is None:
+            try:
+                text = self.text[name]
+            except KeyError:
+                raise ExpressionError(f"no column '{name}'") from None
+            np = self.np
+            if np is not None:
+                try:
+                    values = np.asarray(text, dtype=float)
+                except ValueError:
+                    values = np.fromiter((_float(cell) for cell in text), dtype=float, count=self.length)
+            else:
+                try:
+                    values = list(map(float, text))
+                except ValueError:
+                    values = [_float(cell) for cell in text]
+            self.numbers[name] = values
+        return values
+
+    def set(self, name, values):
+        self.numbers[name] = values
+        self.text[name] = None  # Formatted when the chunk is written
+
+    def rows(self, header, digits=None):
+        columns = []
+        for name in header:
+            text = self.text[name]
+            columns.append(_format(self.numbers[name], digits) if text is None else text)
+        return zip(*columns)
+
+
+class Evaluate:
+    # name = expression over the row's columns
+    def __init__(self, name, expression):
+        if not name.isidentifier():
+            raise ValueError(f"invalid column name '{name}'")
+        self.name = name
+        self.expression = expression
+        self.compiled = compile_expression(expression)
+        self.reads = self.compiled.names
+
+    def __repr__(self):
+        return f"Evaluate({self.name!r}, {self.expression!r})"
+
+    def apply(self, chunk):
+        columns = {name: chunk.numeric(name) for name in self.reads}
+        if not columns:
+            # No column is read, so the value is the same on every row; a failure
+            # is nan, as it would be for each row on the column paths
+            try:
+                value = self.compiled.evaluate()
+            except (ArithmeticError, ValueError):
+                value = math.nan
+            if value.__class__ is complex:
+                value = math.nan
+            values = [value] * chunk.length
+        elif chunk.np is not None:
+            values = vectorized.evaluate_numpy(self.expression, columns)
+        else:
+            values = next(vectorized.iter_evaluate_chunks(self.expression, columns, chunk.length))
+        chunk.set(self.name, values)
+
+
+class Convert:
+    # name = column converted between two units of one converter category
+    def __init__(self, name, column, from_unit, to_unit, category=None):
+        units.coefficients(from_unit, to_unit, category)  # Unknown units fail here, not mid-file
+        self.name = name
+        self.column = column
+        self.from_unit = from_unit
+        self.to_unit = to_unit
+        self.category = category
+        self.reads = frozenset([column])
+
+    def __repr__(self):
+        return f"Convert({self.name!r}, {self.column!r}, {self.from_unit!r}, {self.to_unit!r})"
+
+    def apply(self, chunk):
+        values = units.convert_many(chunk.numeric(self.column), self.from_unit, self.to_unit, self.category)
+        chunk.set(self.name, values)
+
+
+def output_header(header, operations):
+    # Checks every operation reads columns that exist by the time it runs
+    columns = list(header)
+    available = set(header)
+    for operation in operations:
+        missing = sorted(operation.reads - available)
+        if missing:
+            raise ExpressionError(f"no column '{missing[0]}' for {operation!r}")
+        if operation.name not in available:
+            available.add(operation.name)
+            columns.append(operation.name)
+    return columns
+
+
+class Progress:
+    def __init__(self, total_bytes=None):
+        self.total_bytes = total_bytes
+        self.rows = 0
+        self.chunks = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def update(self, rows, bytes_read):
+        self.rows += rows
+        self.chunks += 1
+        self.bytes = bytes_read
+        self.elapsed = time.perf_counter() - self.started
+
+    def finish(self, bytes_read):
+        self.bytes = bytes_read
+        self.elapsed = time.perf_counter() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else None
+
+    @property
+    def fraction(self):
+        if not self.total_bytes:
+            return None
+        return min(self.bytes / self.total_bytes, 1.0)
+
+    def report(self):
+        return {
+            "rows": self.rows,
+            "chunks": self.chunks,
+            "bytes": self.bytes,
+            "seconds": self.elapsed,
+            "rows_per_second": self.rows_per_second,
+            "megabytes_per_second": self.bytes / 1e6 / self.elapsed if self.elapsed else None,
+        }
+
+    def __str__(self):
+        done = f" ({self.fraction:.0%})" if self.fraction is not None else ""
+        rate = self.rows_per_second or 0
+        return f"{self.rows} rows, {self.bytes / 1e6:.1f} MB{done} in {self.elapsed:.1f}s, {rate:.0f} rows/s"
+
+
+class _CountingLines:
+    # Feeds the csv reader while counting characters read (bytes, for ASCII data)
+    def __init__(self, lines):
+        self.lines = lines
+        self.count = 0
+
+    def __iter__(self):
+        for line in self.lines:
+            self.count += len(line)
+            yield line
+
+
+def run(source, destination, operations, chunk_size=DEFAULT_CHUNK_SIZE, use_numpy=None,
+        delimiter=",", progress=None, total_bytes=None, digits=None):
+    # source and destination are text files opened with newline=""; progress,
+    # if given, is called with the Progress object after every chunk. Computed
+    # cells are written with repr precision, or rounded to `digits` significant
+    # digits.
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if use_numpy is None:
+        use_numpy = vectorized.np is not None
+    elif use_numpy and vectorized.np is None:
+        raise RuntimeError("NumPy is not installed")
+    np = vectorized.np if use_numpy else None
+
+    counter = _CountingLines(source)
+    reader = csv.reader(counter, delimiter=delimiter)
+    state = Progress(total_bytes)
+    header = next(reader, None)
+    if header is None:
+        return state.report()
+    columns = output_header(header, operations)
+    writer = csv.writer(destination, delimiter=delimiter, lineterminator="\n")
+    writer.writerow(columns)
+
+    while True:
+        rows = list(islice(reader, chunk_size))
+        if not rows:
+            break
+        chunk = Chunk(header, rows, np)
+        for operation in operations:
+            operation.apply(chunk)
+        writer.writerows(chunk.rows(columns, digits))
+        state.update(len(rows), counter.count)
+        if progress is not None:
+            progress(state)
+    state.finish(counter.count)
+    return state.report()
+
+
+def parse_evaluate(text):
+    name, sep, expression = text.partition("=")
+    if not sep or not name.strip() or not expression.strip():
+        raise argparse.ArgumentTypeError(f"expected NAME=EXPRESSION, got {text!r}")
+    try:
+        return Evaluate(name.strip(), expression.strip())
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def parse_convert(text):
+    # [NAME=]COLUMN:FROM:TO; without NAME the column is converted in place
+    name, sep, spec = text.rpartition("=")
+    parts = [part.strip() for part in spec.split(":")]
+    if len(parts) != 3 or not all(parts) or (sep and not name.strip()):
+        raise argparse.ArgumentTypeError(f"expected [NAME=]COLUMN:FROM:TO, got {text!r}")
+    column, from_unit, to_unit = parts
+    try:
+        return Convert(name.strip() or column, column, from_unit, to_unit)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+class _Operations(argparse.Action):
+    # --eval and --convert share one list so they run in command-line order
+    def __call__(self, parser, namespace, values, option_string=None):
+        operations = getattr(namespace, self.dest, None) or []
+        operations.append(values)
+        setattr(namespace, self.dest, operations)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m pipeline",
+        description="Apply calculator expressions and unit conversions to the columns of a CSV file.",
+    )
+    parser.add_argument("input", help="CSV file with a header row ('-' for stdin)")
+    parser.add_argument("-o", "--output", default="-", help="output CSV file (default: stdout)")
+    parser.add_argument(
+        "-e", "--eval", dest="operations", action=_Operations, type=parse_evaluate, metavar="NAME=EXPR",
+        help="compute a column from an expression over other columns (repeatable)",
+    )
+    parser.add_argument(
+        "-c", "--convert", dest="operations", action=_Operations, type=parse_convert,
+        metavar="[NAME=]COLUMN:FROM:TO", help="convert a column between converter units (repeatable)",
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, metavar="ROWS",
+                        help=f"rows per chunk (default {DEFAULT_CHUNK_SIZE})")
+    parser.add_argument("-d", "--digits", type=int, metavar="N",
+                        help="write computed values with N significant digits (default: full precision)")
+    parser.add_argument("--delimiter", default=",", help="field delimiter (default ',')")
+    parser.add_argument("--no-numpy", action="store_true", help="use the pure-Python path even if NumPy is installed")
+    parser.add_argument("-p", "--progress", action="store_true", help="show progress on stderr while running")
+    parser.add_argument("-q", "--quiet", action="store_true", help="do not print the throughput summary")
+    args = parser.parse_args(argv)
+    operations = args.operations or []
+
+    last_report = [0.0]
+
+    def show(state):
+        if state.elapsed - last_report[0] >= PROGRESS_INTERVAL:
+            last_report[0] = state.elapsed
+            print(f"\r{state}", end="", file=sys.stderr, flush=True)
+
+    source = sys.stdin if args.input == "-" else open(args.input, "r", newline="", encoding="utf-8")
+    try:
+        total = None if args.input == "-" else os.path.getsize(args.input)
+        destination = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+        try:
+            report = run(source, destination, operations, args.chunk_size, False if args.no_numpy else None,
+                         args.delimiter, show if args.progress else None, total, args.digits)
+        finally:
+            if destination is not sys.stdout:
+                destination.close()
+    except (ExpressionError, ValueError, OSError) as e:
+        print(f"{parser.prog}: error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if source is not sys.stdin:
+            source.close()
+
+    if args.progress:
+        print(file=sys.stderr)
+    if not args.quiet:
+        rate = report["rows_per_second"] or 0
+        print(f"{report['rows']} rows in {report['seconds']:.2f}s ({rate:.0f} rows/s, "
+              f"{report['megabytes_per_second'] or 0:.1f} MB/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
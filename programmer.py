@@ -0,0 +1,402 @@
+import re
+import sys
+from functools import lru_cache
+
+from expression import MAX_DEPTH
+
+# Integer engine behind the Programmer tab. Values are Python ints wrapped to a
+# word size (8/16/32/64 bits, or None for unbounded) in two's complement.
+# str() and int() refuse more than 4300 decimal digits since Python 3.11, and
+# are quadratic, as is CPython's int division. Large values are therefore
+# written in base 10 by building a decimal.Decimal from their binary halves
+# (only shifts on the int side, and libmpdec's subquadratic multiplication on
+# the Decimal side), and parsed by splitting the text around powers of ten,
+# which costs Karatsuba multiplications. Bases 2, 8 and 16 use
+# format()/int(), which are already linear.
+
+WORD_SIZES = (8, 16, 32, 64, None)
+BASES = {"HEX": 16, "DEC": 10, "OCT": 8, "BIN": 2}
+PREFIXES = {16: "0x", 8: "0o", 2: "0b", 10: ""}
+_FORMAT_CODES = {16: "X", 8: "o", 2: "b"}
+
+# Below this many digits the builtin conversions are fastest
+SPLIT_THRESHOLD = 1000
+# Pieces this small convert to Decimal directly
+_DECIMAL_BITS = 256
+
+# Shifts and powers may not grow an unbounded value past this many bits
+MAX_UNBOUNDED_BITS = 1 << 24
+
+
+class ProgrammerError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def _power_of_ten(exponent):
+    if exponent <= SPLIT_THRESHOLD:
+        return 10 ** exponent
+    half = exponent // 2
+    return _power_of_ten(half) * _power_of_ten(exponent - half)
+
+
+def _decimal_digits(value):
+    # value >= 0
+    if value.bit_length() <= SPLIT_THRESHOLD * 3:
+        return str(value)
+    import decimal  # Only needed for values too long for str()
+    powers = {}
+
+    def power_of_two(bits):
+        result = powers.get(bits)
+        if result is None:
+            if bits <= _DECIMAL_BITS:
+                result = decimal.Decimal(2) ** bits
+            else:
+                half = bits >> 1
+                result = power_of_two(half) * power_of_two(bits - half)
+            powers[bits] = result
+        return result
+
+    def convert(value, bits):
+        if bits <= _DECIMAL_BITS:
+            return decimal.Decimal(value)
+        half = bits >> 1
+        high = value >> half
+        return convert(high, bits - half) * power_of_two(half) + convert(value - (high << half), half)
+
+    with decimal.localcontext() as context:
+        # Exact integer arithmetic: enough precision that nothing ever rounds
+        context.prec = decimal.MAX_PREC
+        context.Emax = decimal.MAX_EMAX
+        context.traps[decimal.Inexact] = True
+        return str(convert(value, value.bit_length()))
+
+
+def _parse_decimal(text):
+    if len(text) <= SPLIT_THRESHOLD:
+        return int(text)
+    half = len(text) // 2
+    low_length = len(text) - half
+    return _parse_decimal(text[:half]) * _power_of_ten(low_length) + _parse_decimal(text[half:])
+
+
+def to_string(value, base=10):
+    base = BASES.get(base, base)
+    sign = "-" if value < 0 else ""
+    value = abs(value)
+    if base == 10:
+        return sign + _decimal_digits(value)
+    try:
+        return sign + format(value, _FORMAT_CODES[base])
+    except KeyError:
+        raise ProgrammerError(f"unsupported base {base}") from None
+
+
+def from_string(text, base=10):
+    base = BASES.get(base, base)
+    text = text.strip().replace("_", "")
+    sign = 1
+    if text[:1] in "+-":
+        sign = -1 if text[0] == "-" else 1
+        text = text[1:]
+    if not text:
+        raise ProgrammerError("empty number")
+    if base == 10:
+        if not text.isdigit():
+            raise ProgrammerError(f"invalid decimal number {text!r}")
+        return sign * _parse_decimal(text)
+    try:
+        return sign * int(text, base)
+    except ValueError:
+        raise ProgrammerError(f"invalid base-{base} number {text!r}") from None
+
+
+def popcount(value):
+    if value < 0:
+        raise ProgrammerError("popcount needs a non-negative value")
+    return bin(value).count("1")
+
+
+def set_bits(value):
+    # Positions of the 1 bits in a non-negative value, lowest first
+    if value < 0:
+        raise ProgrammerError("set_bits needs a non-negative value")
+    while value:
+        low = value & -value
+        yield low.bit_length() - 1
+        value ^= low
+
+
+TOKEN_RE = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<number>0[xX][0-9a-fA-F_]+|0[oO][0-7_]+|0[bB][01_]+|\d[\d_]*)
+  | (?P<word>[A-Za-z]+)
+  | (?P<op><<|>>|\*\*|[-+*/%&|^~()])
+""", re.VERBOSE)
+
+# Symbolic spellings of the button labels
+OPERATOR_ALIASES = {"&": "AND", "|": "OR", "^": "XOR", "~": "NOT", "%": "MOD"}
+WORD_OPERATORS = {"AND", "OR", "XOR", "NOT", "MOD"}
+
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN_RE.match(text, pos)
+        if match is None:
+            raise ProgrammerError(f"unexpected character {text[pos]!r} at position {pos}")
+        kind, value = match.lastgroup, match.group()
+        pos = match.end()
+        if kind == "space":
+            continue
+        if kind == "word":
+            value = value.upper()
+            if value not in WORD_OPERATORS:
+                raise ProgrammerError(f"unknown operator {value!r}")
+            kind = "op"
+        tokens.append((kind, OPERATOR_ALIASES.get(value, value)))
+    return tokens
+
+
+class IntegerEngine:
+    def __init__(self, word_size=64, signed=True):
+        if word_size not in WORD_SIZES:
+            raise ProgrammerError(f"word size must be one of {WORD_SIZES}")
+        self.word_size = word_size
+        self.signed = signed
+        self.mask = (1 << word_size) - 1 if word_size else None
+        self._sign_bit = 1 << (word_size - 1) if word_size else None
+
+    def __repr__(self):
+        return f"IntegerEngine(word_size={self.word_size}, signed={self.signed})"
+
+    def wrap(self, value):
+        if self.mask is None:
+            if value.bit_length() > MAX_UNBOUNDED_BITS:
+                raise ProgrammerError(f"result exceeds {MAX_UNBOUNDED_BITS} bits")
+            return value
+        value &= self.mask
+        if self.signed and value & self._sign_bit:
+            value -= 1 << self.word_size
+        return value
+
+    # Operations; every result is wrapped to the word size
+
+    def and_(self, a, b):
+        return self.wrap(a & b)
+
+    def or_(self, a, b):
+        return self.wrap(a | b)
+
+    def xor(self, a, b):
+        return self.wrap(a ^ b)
+
+    def not_(self, a):
+        return self.wrap(~a)
+
+    def shift_left(self, a, count):
+        if count < 0:
+            raise ProgrammerError("negative shift count")
+        if self.mask is None:
+            if a.bit_length() + count > MAX_UNBOUNDED_BITS:
+                raise ProgrammerError(f"result exceeds {MAX_UNBOUNDED_BITS} bits")
+        elif count >= self.word_size:
+            return 0
+        return self.wrap(a << count)
+
+    def shift_right(self, a, count):
+        # Arithmetic for signed words, logical for unsigned
+        if count < 0:
+            raise ProgrammerError("negative shift count")
+        if self.mask is not None and not self.signed:
+            a &= self.mask
+        return self.wrap(a >> count)
+
+    def add(self, a, b):
+        return self.wrap(a + b)
+
+    def subtract(self, a, b):
+        return self.wrap(a - b)
+
+    def multiply(self, a, b):
+        return self.wrap(a * b)
+
+    def divide(self, a, b):
+        # Truncates toward zero, like a hardware divide
+        if b == 0:
+            raise ZeroDivisionError("integer division by zero")
+        quotient = abs(a) // abs(b)
+        return self.wrap(quotient if (a < 0) == (b < 0) else -quotient)
+
+    def mod(self, a, b):
+        if b == 0:
+            raise ZeroDivisionError("integer modulo by zero")
+        return self.wrap(a - self.divide(a, b) * b)
+
+    def power(self, a, b):
+        if b < 0:
+            raise ProgrammerError("negative exponent")
+        if self.mask is not None:
+            return self.wrap(pow(a, b, 1 << self.word_size))
+        if a.bit_length() * b > MAX_UNBOUNDED_BITS:
+            raise ProgrammerError(f"result exceeds {MAX_UNBOUNDED_BITS} bits")
+        return a ** b
+
+    def negate(self, a):
+        return self.wrap(-a)
+
+    BINARY = {
+        "AND": and_, "OR": or_, "XOR": xor, "<<": shift_left, ">>": shift_right,
+        "+": add, "-": subtract, "*": multiply, "/": divide, "MOD": mod, "**": power,
+    }
+
+    def apply(self, op, a, b=None):
+        op = OPERATOR_ALIASES.get(op, op)
+        if op == "NOT":
+            return self.not_(a)
+        try:
+            fn = self.BINARY[op]
+        except KeyError:
+            raise ProgrammerError(f"unknown operation '{op}'") from None
+        return fn(self, a, b)
+
+    def apply_many(self, op, values, operand=None):
+        # One operation over many integers. NumPy integer arrays that fit the word
+        # size are processed in a single vectorized call; anything else per item.
+        op = OPERATOR_ALIASES.get(op, op)
+        # NumPy is never imported here: a caller holding an array has loaded it
+        np = sys.modules.get("numpy")
+        if (np is not None and isinstance(values, np.ndarray) and values.dtype.kind in "iu"
+                and self.word_size is not None and op in _numpy_operations(np)):
+            dtype = np.dtype(f"{'int' if self.signed else 'uint'}{self.word_size}")
+            values = values.astype(dtype, copy=False)
+            if op == "NOT":
+                return np.invert(values)
+            if op in ("<<", ">>"):
+                if operand < 0:
+                    raise ProgrammerError("negative shift count")
+                if operand >= self.word_size:
+                    if op == "<<" or not self.signed:
+                        return np.zeros_like(values)
+                    return np.where(values < 0, -1, 0).astype(dtype)
+            return _numpy_operations(np)[op](values, dtype.type(self.wrap(operand)))
+        if op == "NOT":
+            return [self.not_(value) for value in values]
+        try:
+            fn = self.BINARY[op]
+        except KeyError:
+            raise ProgrammerError(f"unknown operation '{op}'") from None
+        return [fn(self, value, operand) for value in values]
+
+    # Parsing and display
+
+    def format(self, value, base=10):
+        base = BASES.get(base, base)
+        value = self.wrap(value)
+        if base != 10 and value < 0 and self.mask is not None:
+            # Show the two's-complement bit pattern, as a hardware register would
+            value &= self.mask
+        text = to_string(value, base)
+        if text.startswith("-"):
+            return "-" + PREFIXES[base] + text[1:]
+        return PREFIXES[base] + text
+
+    def parse_number(self, text):
+        lower = text.lower().replace("_", "")
+        for base, prefix in PREFIXES.items():
+            if prefix and lower.startswith(prefix):
+                return self.wrap(from_string(lower[2:], base))
+        return self.wrap(from_string(lower, 10))
+
+    def evaluate(self, text):
+        return _Parser(self, tokenize(text)).parse()
+
+
+# C-like precedence, loosest first: OR, XOR, AND, shifts, + -, * / MOD, unary, **
+_LEVELS = [("OR",), ("XOR",), ("AND",), ("<<", ">>"), ("+", "-"), ("*", "/", "MOD")]
+_OPERATOR_LEVELS = {op: level for level, ops in enumerate(_LEVELS) for op in ops}
+
+
+class _Parser:
+    def __init__(self, engine, tokens):
+        self.engine = engine
+        self.tokens = tokens
+        self.pos = 0
+        self.depth = 0
+
+    def peek(self):
+        return self.tokens[self.pos][1] if self.pos < len(self.tokens) else None
+
+    def parse(self):
+        if not self.tokens:
+            raise ProgrammerError("empty expression")
+        value = self.binary(0)
+        if self.pos != len(self.tokens):
+            raise ProgrammerError(f"unexpected {self.peek()!r}")
+        return value
+
+    def binary(self, level):
+        # Precedence climbing, so a parenthesis costs a few stack frames rather
+        # than one per precedence level
+        value = self.unary()
+        while True:
+            op = self.peek()
+            op_level = _OPERATOR_LEVELS.get(op)
+            if op_level is None or op_level < level:
+                return value
+            self.pos += 1
+            value = self.engine.apply(op, value, self.binary(op_level + 1))
+
+    def unary(self):
+        # Every level of nesting passes through here
+        self.depth += 1
+        if self.depth > MAX_DEPTH:
+            raise ProgrammerError(f"expression is nested more than {MAX_DEPTH} levels deep")
+        try:
+            op = self.peek()
+            if op == "-":
+                self.pos += 1
+                return self.engine.negate(self.unary())
+            if op == "+":
+                self.pos += 1
+                return self.unary()
+            if op == "NOT":
+                self.pos += 1
+                return self.engine.not_(self.unary())
+            return self.power()
+        finally:
+            self.depth -= 1
+
+    def power(self):
+        value = self.atom()
+        if self.peek() == "**":
+            self.pos += 1
+            value = self.engine.power(value, self.unary())
+        return value
+
+    def atom(self):
+        if self.pos >= len(self.tokens):
+            raise ProgrammerError("unexpected end of expression")
+        kind, value = self.tokens[self.pos]
+        self.pos += 1
+        if kind == "number":
+            return self.engine.parse_number(value)
+        if value == "(":
+            result = self.binary(0)
+            if self.peek() != ")":
+                raise ProgrammerError("expected ')'")
+            self.pos += 1
+            return result
+        raise ProgrammerError(f"unexpected {value!r}")
+
+
+@lru_cache(maxsize=None)
+def _numpy_operations(np):
+    return {
+        "AND": np.bitwise_and, "OR": np.bitwise_or, "XOR": np.bitwise_xor, "NOT": np.invert,
+        "<<": np.left_shift, ">>": np.right_shift,
+    }
+
+UNBOUNDED = IntegerEngine(None)
@@ -0,0 +1,398 @@
+from functools import lru_cache
+
+import units
+from expression import (
+    CONSTANTS, CompiledExpression, ExpressionError, _fold, _left_spine, _Parser, tokenize,
+)
+
+# Unit-aware expressions: "3 ft + 2 m", "60 mi/h in m/s", "2 kg * 9.81 m/s**2".
+#
+# A unit written after a number, a variable or a parenthesis multiplies it, and a
+# trailing "in <units>" picks the unit of the result. The unit names come from
+# the converter's tables in units.py, so both always agree.
+#
+# All unit work is done once, when the expression is compiled. Every node's
+# dimension (a tuple of powers of length, mass, time and temperature) is worked
+# out and checked: adding feet to seconds, or taking sin of a length, is a
+# compile error. Each unit is then replaced by its size in SI units, and the
+# result's unit by its reciprocal. What remains is an ordinary numeric tree,
+# compiled like any other expression, so evaluating it costs the same as the
+# same arithmetic without units, for one value or a column of them.
+#
+# Variables are plain numbers. Celsius and Fahrenheit have an offset, so they
+# only appear in a plain conversion such as "20 degC in degF".
+
+DIMENSIONLESS = (0, 0, 0, 0)
+BASE_SYMBOLS = ("m", "kg", "s", "K")
+
+# Functions that take a quantity and keep its dimension; every other function
+# needs dimensionless arguments
+_SAME_DIMENSION = frozenset(["fabs", "copysign", "fmod", "hypot", "remainder"])
+
+
+class UnitInfo:
+    __slots__ = ("name", "category", "unit", "scale", "dimension", "offset")
+
+    def __init__(self, name, category, unit, scale, dimension, offset):
+        self.name = name
+        self.category = category
+        self.unit = unit
+        self.scale = scale          # size in SI units
+        self.dimension = dimension
+        self.offset = offset        # True for units whose zero is not SI zero
+
+    def __repr__(self):
+        return f"UnitInfo({self.name!r}, {self.scale!r}, {self.dimension!r})"
+
+
+def _build_units(registry=units.registry):
+    by_unit = {}
+    for category_name, (dimension, base_scale) in units.DIMENSIONS.items():
+        category = registry.categories[category_name]
+        for i, unit in enumerate(category.units):
+            by_unit[unit] = (category_name, category.factors[i] * base_scale, dimension, category.offsets[i] != 0)
+    # Full names where they are identifiers ("square feet" only has a symbol)
+    names = {unit: unit for unit in by_unit if unit.isidentifier()}
+    names.update(units.UNIT_SYMBOLS)
+    return {name: UnitInfo(name, by_unit[unit][0], unit, *by_unit[unit][1:]) for name, unit in names.items()}
+
+
+UNITS = _build_units()
+
+
+class Quantity:
+    __slots__ = ("value", "unit")
+
+    def __init__(self, value, unit):
+        self.value = value
+        self.unit = unit
+
+    def __float__(self):
+        return float(self.value)
+
+    def __eq__(self, other):
+        return isinstance(other, Quantity) and (self.value, self.unit) == (other.value, other.unit)
+
+    def __hash__(self):
+        return hash((self.value, self.unit))
+
+    def __repr__(self):
+        return f"Quantity({self.value!r}, {self.unit!r})"
+
+    def __str__(self):
+        return f"{self.value} {self.unit}"
+
+
+def si_unit(dimension):
+    # "m/s", "kg*m/s**2"
+    def term(symbol, power):
+        return symbol if power == 1 else f"{symbol}**{power}"
+    top = [term(symbol, power) for symbol, power in zip(BASE_SYMBOLS, dimension) if power > 0]
+    bottom = [term(symbol, -power) for symbol, power in zip(BASE_SYMBOLS, dimension) if power < 0]
+    text = "*".join(top) or "1"
+    if bottom:
+        text += "/" + ("*".join(bottom) if len(bottom) == 1 else f"({'*'.join(bottom)})")
+    return text
+
+
+def _add(a, b):
+    return tuple(x + y for x, y in zip(a, b))
+
+
+def _scale(a, factor):
+    powers = tuple(x * factor for x in a)
+    if any(power != int(power) for power in powers):
+        raise ExpressionError("unit powers must come out whole")
+    return tuple(int(power) for power in powers)
+
+
+_DIMENSION_NAMES = {dimension: name.lower() for name, (dimension, _) in units.DIMENSIONS.items()}
+
+
+def _describe(dimension):
+    # "length (m)", "m/s"
+    if dimension == DIMENSIONLESS:
+        return "a plain number"
+    name = _DIMENSION_NAMES.get(dimension)
+    return f"{name} ({si_unit(dimension)})" if name else si_unit(dimension)
+
+
+# Parsing
+
+class _QuantityParser(_Parser):
+    def __init__(self, tokens, units_table):
+        super().__init__(tokens)
+        self.units = units_table
+
+    def _unit_follows(self):
+        if self.pos >= len(self.tokens):
+            return False
+        kind, value = self.tokens[self.pos]
+        if kind != "name" or value not in self.units:
+            return False
+        following = self.tokens[self.pos + 1][1] if self.pos + 1 < len(self.tokens) else None
+        return following != "("
+
+    def power(self):
+        node = super().power()
+        # Juxtaposition: "3 ft", "x km", "(a + b) m**2", "5 kg m/s**2"
+        while self._unit_follows():
+            unit = ("name", self.advance()[1])
+            if self.peek() == "**":
+                self.pos += 1
+                unit = ("bin", "**", unit, self.unary())
+            node = ("bin", "*", node, unit)
+        return node
+
+
+def _split_target(tokens):
+    # "... in <units>" at the top level, outside any parentheses
+    depth = 0
+    for i, (kind, value) in enumerate(tokens):
+        if value == "(":
+            depth += 1
+        elif value == ")":
+            depth -= 1
+        elif kind == "name" and value == "in" and depth == 0:
+            return tokens[:i], tokens[i + 1:]
+    return tokens, None
+
+
+# Dimensional analysis
+
+class _Analyzer:
+    def __init__(self, units_table):
+        self.units = units_table
+
+    def unit(self, name):
+        info = self.units[name]
+        if info.offset:
+            raise ExpressionError(f"'{name}' has an offset and can only be converted, as in '20 {name} in K'")
+        return info
+
+    def analyze(self, node):
+        # (numeric node with units replaced by their SI size, dimension)
+        kind = node[0]
+        if kind == "num":
+            return node, DIMENSIONLESS
+        if kind == "name":
+            if node[1] in self.units:
+                info = self.unit(node[1])
+                return ("num", info.scale), info.dimension
+            return node, DIMENSIONLESS
+        if kind == "neg" or kind == "pos":
+            operand, dimension = self.analyze(node[1])
+            return (kind, operand), dimension
+        if kind == "bin":
+            if node[1] == "**":
+                return self.power(node[2], node[3])
+            # Long sums and products are walked in a loop, as in expression._fold
+            base, chain = _left_spine(node)
+            result, dimension = self.analyze(base)
+            for op, right in chain:
+                result, dimension = self.binary(op, result, dimension, right)
+            return result, dimension
+        if kind == "call":
+            return self.call(node[1], node[2])
+        raise ExpressionError(f"unknown node {kind!r}")
+
+    def power(self, base, exponent):
+        base, a = self.analyze(base)
+        exponent, b = self.analyze(exponent)
+        if b != DIMENSIONLESS:
+            raise ExpressionError(f"an exponent must be a plain number, not {_describe(b)}")
+        if a == DIMENSIONLESS:
+            return ("bin", "**", base, exponent), a
+        exponent = _fold(exponent)
+        if exponent[0] != "num":
+            raise ExpressionError("a quantity can only be raised to a constant power")
+        return ("bin", "**", base, exponent), _scale(a, exponent[1])
+
+    def binary(self, op, left, a, right):
+        # left is already analyzed, with dimension a
+        right, b = self.analyze(right)
+        node = ("bin", op, left, right)
+        if op == "*":
+            return node, _add(a, b)
+        if op == "/":
+            return node, _add(a, _scale(b, -1))
+        if a != b:
+            raise ExpressionError(f"cannot combine {_describe(a)} and {_describe(b)} with '{op}'")
+        if op == "//":
+            return node, DIMENSIONLESS
+        return node, a
+
+    def call(self, name, args):
+        analyzed = [self.analyze(arg) for arg in args]
+        nodes = tuple(node for node, _ in analyzed)
+        dimensions = [dimension for _, dimension in analyzed]
+        if name == "sqrt" and len(args) == 1:
+            return ("call", name, nodes), _scale(dimensions[0], 0.5)
+        if name in _SAME_DIMENSION and dimensions:
+            if name != "copysign" and any(d != dimensions[0] for d in dimensions):
+                raise ExpressionError(f"arguments of {name}() must have the same units")
+            return ("call", name, nodes), dimensions[0]
+        for dimension in dimensions:
+            if dimension != DIMENSIONLESS:
+                raise ExpressionError(f"{name}() needs plain numbers, not {_describe(dimension)}")
+        return ("call", name, nodes), DIMENSIONLESS
+
+
+def _unit_names(nodes, units_table):
+    # Unit names in the order they are written
+    for node in nodes:
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current[0] == "name" and current[1] in units_table:
+                yield current[1]
+            elif current[0] in ("neg", "pos"):
+                stack.append(current[1])
+            elif current[0] == "bin":
+                stack.append(current[3])
+                stack.append(current[2])
+            elif current[0] == "call":
+                stack.extend(reversed(current[2]))
+
+
+def _target_text(tokens):
+    return " ".join(value for _, value in tokens).replace(" ** ", "**").replace(" / ", "/").replace(" * ", "*")
+
+
+class QuantityExpression:
+    __slots__ = ("source", "compiled", "dimension", "unit", "names")
+
+    def __init__(self, source, compiled, dimension, unit):
+        self.source = source
+        self.compiled = compiled    # numeric: already in the result unit
+        self.dimension = dimension
+        self.unit = unit            # "" for a plain number
+        self.names = compiled.names
+
+    @property
+    def tree(self):
+        return self.compiled.tree
+
+    def evaluate(self, variables=None):
+        value = self.compiled.evaluate(variables)
+        return Quantity(value, self.unit) if self.unit else value
+
+    __call__ = evaluate
+
+    def __repr__(self):
+        return f"QuantityExpression({self.source!r}, unit={self.unit!r})"
+
+
+def _single_unit(tree, units_table):
+    if tree is not None and tree[0] == "name" and tree[1] in units_table:
+        return units_table[tree[1]]
+    return None
+
+
+def _offset_conversion(source, tokens, target, units_table):
+    # "X degC in degF": the converter's affine map, with X a plain expression.
+    # Returns None for anything else, which then fails in the usual analysis.
+    source_tree = _QuantityParser(tokens, units_table).parse()
+    # "-40 degF" parses as -(40 degF); the sign belongs to the number
+    signs = []
+    while source_tree[0] == "neg" or source_tree[0] == "pos":
+        signs.append(source_tree[0])
+        source_tree = source_tree[1]
+    if not (source_tree[0] == "bin" and source_tree[1] == "*"):
+        return None
+    from_info = _single_unit(source_tree[3], units_table)
+    if target is None:
+        to_info = from_info
+    else:
+        to_info = _single_unit(_QuantityParser(target, units_table).parse(), units_table)
+    if from_info is None or to_info is None or from_info.category != to_info.category:
+        return None
+    value, dimension = _Analyzer(units_table).analyze(source_tree[2])
+    if dimension != DIMENSIONLESS:
+        raise ExpressionError(f"cannot convert {_describe(dimension)} {from_info.name}")
+    for sign in reversed(signs):
+        value = (sign, value)
+    scale, shift = units.coefficients(from_info.unit, to_info.unit, from_info.category)
+    tree = ("bin", "+", ("bin", "*", value, ("num", scale)), ("num", shift))
+    return QuantityExpression(source, CompiledExpression(source, _fold(tree)), from_info.dimension, to_info.name)
+
+
+def _compile(source, shadowed):
+    units_table = UNITS if not shadowed else {name: info for name, info in UNITS.items() if name not in shadowed}
+    tokens, target = _split_target(tokenize(source))
+    if target is not None and not target:
+        raise ExpressionError("expected units after 'in'")
+
+    names = {value for kind, value in tokens + (target or []) if kind == "name"}
+    if any(name in units_table and units_table[name].offset for name in names):
+        converted = _offset_conversion(source, tokens, target, units_table)
+        if converted is not None:
+            return converted
+
+    tree = _QuantityParser(tokens, units_table).parse()
+    analyzer = _Analyzer(units_table)
+    numeric, dimension = analyzer.analyze(tree)
+
+    if target is not None:
+        target_tree = _QuantityParser(target, units_table).parse()
+        target_numeric, target_dimension = _Analyzer(units_table).analyze(target_tree)
+        target_numeric = _fold(target_numeric)
+        if target_numeric[0] != "num":
+            raise ExpressionError("only units may follow 'in'")
+        if target_dimension != dimension:
+            raise ExpressionError(f"cannot express {_describe(dimension)} in {_describe(target_dimension)}")
+        scale, unit = target_numeric[1], _target_text(target)
+    elif dimension == DIMENSIONLESS:
+        scale, unit = 1, ""
+    else:
+        # The first unit written with the result's dimension, else SI
+        for name in _unit_names([tree], units_table):
+            if units_table[name].dimension == dimension:
+                scale, unit = units_table[name].scale, name
+                break
+        else:
+            scale, unit = 1, si_unit(dimension)
+    if scale != 1:
+        numeric = ("bin", "/", numeric, ("num", scale))
+    return QuantityExpression(source, CompiledExpression(source, _fold(numeric)), dimension, unit)
+
+
+@lru_cache(maxsize=1024)
+def compile_quantity(text, shadowed=frozenset()):
+    # shadowed: unit names that are bound as variables and so mean the variable
+    return _compile(text, shadowed)
+
+
+def uses_units(text, variables=None):
+    # Whether text needs the unit-aware compiler: it names a unit that is not a
+    # bound variable, or converts with "in"
+    try:
+        tokens = tokenize(text)
+    except ExpressionError:
+        return False
+    variables = variables or {}
+    for i, (kind, value) in enumerate(tokens):
+        if kind != "name" or value in variables or value in CONSTANTS:
+            continue
+        if value == "in" or value in UNITS and (i + 1 == len(tokens) or tokens[i + 1][1] != "("):
+            return True
+    return False
+
+
+def _shadowed(variables):
+    if not variables:
+        return frozenset()
+    return frozenset(name for name in variables if name in UNITS)
+
+
+def evaluate(text, variables=None):
+    return compile_quantity(text, _shadowed(variables)).evaluate(variables)
+
+
+def evaluate_many(text, columns, use_numpy=None):
+    # (values, unit) for columns of plain numbers, through vectorized.py
+    from calculus import to_text
+    from vectorized import evaluate_many as evaluate_columns
+
+    compiled = compile_quantity(text, _shadowed(columns))
+    return evaluate_columns(to_text(compiled.tree), columns, use_numpy=use_numpy), compiled.unit
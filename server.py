@@ -0,0 +1,315 @@
+import argparse
+import asyncio
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+from fractions import Fraction
+
+import backends
+from calc_core import ASSIGNMENT_RE, apply_function, convert, evaluate_programmer
+from expression import time_limit
+from programmer import to_string
+
+# Calculator service over newline-delimited JSON, on localhost TCP or a Unix
+# socket. Each line is one request object and gets one response line:
+#
+#   {"id": 1, "op": "evaluate", "expression": "x ** 2"}
+#   {"id": 1, "ok": true, "result": 9.0}
+#   {"id": 2, "ok": false, "error": "name 'y' is not defined"}
+#
+# Operations:
+#   evaluate    expression [, backend, precision]; "name = expr" also binds name
+#   function    name, value [, backend]           scientific button, e.g. "sin"
+#   convert     value, from, to, type             unit conversion
+#   programmer  expression [, word_size]          integer expression
+#   set         name, value / get name / unset name / variables / ping
+#
+# Clients may pipeline: requests are read as fast as they arrive and answered in
+# order. Every connection has its own variable namespace. Evaluations run on a
+# bounded process pool (at most workers * 2 in flight per server) and see the
+# namespace as it was when the request was read; assignments and variable
+# operations are applied in request order, so a pipelined "x = 3" is visible
+# to every later request on the connection. With --workers 0 everything runs on
+# the event loop, which is fastest for short expressions.
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_LINE = 1 << 20
+# Requests read ahead of the response being written, per connection
+MAX_PIPELINE = 256
+# Decimal and Fraction precision a client may ask for, in digits
+MAX_PRECISION = 1000
+# Larger ints go out as strings: json.dumps would hit Python's 4300-digit limit
+MAX_JSON_INT_BITS = 14000
+
+
+def _plain(value):
+    # JSON has no Decimal or Fraction; NaN, infinities and huge ints go out as strings
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, int):
+        return value if value.bit_length() <= MAX_JSON_INT_BITS else to_string(value)
+    if isinstance(value, float):
+        return value if math.isfinite(value) else str(value)
+    if isinstance(value, Fraction):
+        if value.denominator == 1:
+            return to_string(value.numerator)
+        return f"{to_string(value.numerator)}/{to_string(value.denominator)}"
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _evaluate(expression, variables, backend, precision):
+    with time_limit():
+        return backends.get_backend(backend, precision).evaluate(expression, variables)
+
+
+def _function(name, value, backend, precision):
+    if backend == "float":
+        return apply_function(name, float(value))
+    backend = backends.get_backend(backend, precision)
+    return backend.apply_function(name, backend.number(value))
+
+
+def _programmer(expression, word_size):
+    return evaluate_programmer(expression, word_size)
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def _precision(request):
+    precision = request.get("precision")
+    if precision is None:
+        return None
+    if isinstance(precision, bool) or not isinstance(precision, int) or not 1 <= precision <= MAX_PRECISION:
+        raise ProtocolError(f"precision must be a whole number from 1 to {MAX_PRECISION}")
+    return precision
+
+
+def _field(request, name, kind=None):
+    try:
+        value = request[name]
+    except KeyError:
+        raise ProtocolError(f"missing field '{name}'") from None
+    if kind is not None and not isinstance(value, kind):
+        raise ProtocolError(f"field '{name}' has the wrong type")
+    return value
+
+
+def _number(request, name):
+    value = _field(request, name)
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ProtocolError(f"field '{name}' must be a number")
+    try:
+        return float(value) if isinstance(value, str) else value
+    except ValueError:
+        raise ProtocolError(f"field '{name}' must be a number") from None
+
+
+class CalculatorServer:
+    def __init__(self, workers=None):
+        self.workers = (os.cpu_count() or 1) if workers is None else workers
+        self.executor = None
+        self.slots = None
+        self.server = None
+        self.connections = {}  # handler task -> writer
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, path=None):
+        if self.workers:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+            self.slots = asyncio.Semaphore(self.workers * 2)
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.handle, path, limit=MAX_LINE)
+        else:
+            self.server = await asyncio.start_server(self.handle, host, port, limit=MAX_LINE)
+        return self.server
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            # Closing the transports ends each handler at its next read
+            for writer in self.connections.values():
+                writer.close()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+
+    async def run_in_pool(self, fn, *args):
+        if self.executor is None:
+            return fn(*args)
+        async with self.slots:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def handle(self, reader, writer):
+        variables = {}
+        responses = asyncio.Queue(MAX_PIPELINE)
+        sender = asyncio.create_task(self._send(responses, writer))
+        connection = asyncio.current_task()
+        self.connections[connection] = writer
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except ValueError:
+                    await responses.put(_completed({"id": None, "ok": False, "error": "request too long"}))
+                    break
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                response, assigns = self.dispatch(line, variables)
+                if assigns:
+                    # Later requests must see the new binding
+                    await asyncio.wait([response])
+                await responses.put(response)
+            await responses.put(None)
+            await sender
+        except ConnectionError:
+            pass
+        finally:
+            sender.cancel()
+            writer.close()
+            self.connections.pop(connection, None)
+
+    async def _send(self, responses, writer):
+        while True:
+            response = await responses.get()
+            if response is None:
+                break
+            response = await response
+            try:
+                line = json.dumps(response)
+            except (ValueError, TypeError) as e:
+                # One unencodable result must not cost the responses queued behind it
+                line = json.dumps({"id": response.get("id"), "ok": False, "error": str(e)})
+            try:
+                writer.write(line.encode("utf-8") + b"\n")
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                break
+
+    def dispatch(self, line, variables):
+        # (future resolving to the response object, whether it binds a variable)
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ProtocolError("request must be a JSON object")
+            request_id = request.get("id")
+            result = self.execute(request, variables)
+        except (ProtocolError, ValueError, ArithmeticError, TypeError) as e:
+            return _completed({"id": request_id, "ok": False, "error": str(e)}), False
+        if isinstance(result, _Assignment):
+            return asyncio.ensure_future(_respond(request_id, result.coroutine)), True
+        if asyncio.iscoroutine(result):
+            return asyncio.ensure_future(_respond(request_id, result)), False
+        return _completed({"id": request_id, "ok": True, "result": _plain(result)}), False
+
+    def execute(self, request, variables):
+        op = _field(request, "op", str)
+        if op == "evaluate":
+            expression = _field(request, "expression", str)
+            backend = request.get("backend", "float")
+            precision = _precision(request)
+            match = ASSIGNMENT_RE.match(expression)
+            if match:
+                name, expression = match.groups()
+                return _Assignment(self._assign(variables, name, expression, backend, precision))
+            return self.run_in_pool(_evaluate, expression, dict(variables), backend, precision)
+        if op == "function":
+            name, value = _field(request, "name", str), _number(request, "value")
+            backend, precision = request.get("backend", "float"), _precision(request)
+            if backend == "float":
+                return _function(name, value, backend, precision)
+            # Decimal and Fraction functions are series that take a while at high precision
+            return self.run_in_pool(_function, name, value, backend, precision)
+        if op == "convert":
+            return convert(_number(request, "value"), _field(request, "from", str),
+                           _field(request, "to", str), request.get("type"))
+        if op == "programmer":
+            word_size = request.get("word_size")
+            return self.run_in_pool(_programmer, _field(request, "expression", str), word_size)
+        if op == "set":
+            name = _field(request, "name", str)
+            if not name.isidentifier():
+                raise ProtocolError(f"invalid variable name '{name}'")
+            variables[name] = _number(request, "value")
+            return variables[name]
+        if op == "get":
+            name = _field(request, "name", str)
+            if name not in variables:
+                raise ProtocolError(f"name '{name}' is not defined")
+            return variables[name]
+        if op == "unset":
+            return variables.pop(_field(request, "name", str), None)
+        if op == "variables":
+            return {name: _plain(value) for name, value in variables.items()}
+        if op == "ping":
+            return "pong"
+        raise ProtocolError(f"unknown op '{op}'")
+
+    async def _assign(self, variables, name, expression, backend, precision):
+        value = await self.run_in_pool(_evaluate, expression, dict(variables), backend, precision)
+        variables[name] = value
+        return value
+
+
+class _Assignment:
+    # Marks a coroutine whose result binds a variable
+    def __init__(self, coroutine):
+        self.coroutine = coroutine
+
+
+async def _respond(request_id, awaitable):
+    try:
+        result = await awaitable
+    except Exception as e:
+        return {"id": request_id, "ok": False, "error": str(e)}
+    return {"id": request_id, "ok": True, "result": _plain(result)}
+
+
+def _completed(response):
+    future = asyncio.get_running_loop().create_future()
+    future.set_result(response)
+    return future
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, path=None, workers=None):
+    server = CalculatorServer(workers)
+    await server.start(host, port, path)
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m server",
+        description="Serve calculator requests as newline-delimited JSON.",
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"TCP address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default {DEFAULT_PORT})")
+    parser.add_argument("--unix", metavar="PATH", help="listen on a Unix socket instead of TCP")
+    parser.add_argument(
+        "-w", "--workers", type=int, metavar="N",
+        help="evaluation processes (default: one per CPU; 0 evaluates on the event loop)",
+    )
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix, args.workers))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
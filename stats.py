@@ -0,0 +1,522 @@
+import argparse
+import csv
+import json
+import math
+import os
+import sys
+from bisect import bisect_left, bisect_right
+from itertools import islice
+
+# One-pass statistics over any number of values, in bounded memory:
+#
+#   RunningStats  count, mean and variance (Welford), min and max
+#   TDigest       approximate quantiles and CDF from at most a few hundred centroids
+#   Histogram     exact counts in fixed-width bins, stored sparsely
+#   Summary       all three together
+#
+# Everything can be merged: summarizing two halves of the data and merging the
+# results gives the same answer (to rounding, and within the digest's accuracy
+# for quantiles) as summarizing all of it. That is how chunks are folded in and
+# how summarize_file spreads a large file over processes, each summarizing a
+# byte range of it. Values that are nan (empty cells, text) or infinite are
+# counted as missing and otherwise ignored; one inf would otherwise turn the
+# mean, the variance and every histogram edge into nan.
+
+DEFAULT_COMPRESSION = 100
+DEFAULT_CHUNK_SIZE = 65536
+DEFAULT_QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+DEFAULT_BINS = 10
+
+
+class RunningStats:
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0  # sum of squared deviations from the mean
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        # Welford's update
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def extend(self, values):
+        # A whole chunk at once: its own mean and deviations, then one merge
+        chunk = RunningStats()
+        chunk.count = len(values)
+        if not chunk.count:
+            return
+        chunk.mean = math.fsum(values) / chunk.count
+        mean = chunk.mean
+        chunk.m2 = math.fsum((value - mean) ** 2 for value in values)
+        chunk.min = min(values)
+        chunk.max = max(values)
+        self.merge(chunk)
+
+    def merge(self, other):
+        # Chan et al.'s pairwise combination of two Welford states
+        if not other.count:
+            return self
+        if not self.count:
+            self.count, self.mean, self.m2 = other.count, other.mean, other.m2
+            self.min, self.max = other.min, other.max
+            return self
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    @property
+    def variance(self):
+        # Sample variance; nan below two values
+        return self.m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def population_variance(self):
+        return self.m2 / self.count if self.count else math.nan
+
+    @property
+    def stdev(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+    def to_dict(self):
+        return {"count": self.count, "mean": self.mean, "m2": self.m2, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        stats.count, stats.mean, stats.m2 = data["count"], data["mean"], data["m2"]
+        stats.min, stats.max = data["min"], data["max"]
+        return stats
+
+
+class TDigest:
+    # Merging t-digest (Dunning & Ertl). Incoming values are buffered and folded
+    # into sorted centroids; the k1 scale function keeps centroids small near
+    # the tails, so extreme quantiles stay accurate. Memory is O(compression).
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.means = []
+        self.weights = []
+        self.total = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer = []
+        self._buffer_size = compression * 5
+
+    def add(self, value, weight=1):
+        self._buffer.append((value, weight))
+        if len(self._buffer) >= self._buffer_size:
+            self._compress()
+
+    def extend(self, values):
+        buffer = self._buffer
+        for start in range(0, len(values), self._buffer_size):
+            buffer.extend((value, 1) for value in values[start:start + self._buffer_size])
+            if len(buffer) >= self._buffer_size:
+                self._compress()
+                buffer = self._buffer
+
+    def merge(self, other):
+        other._compress()
+        self._buffer.extend(zip(other.means, other.weights))
+        self._compress()
+        return self
+
+    def _k(self, q):
+        return self.compression / (2 * math.pi) * math.asin(2 * q - 1)
+
+    def _q(self, k):
+        return (math.sin(min(k * 2 * math.pi / self.compression, math.pi / 2)) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(list(zip(self.means, self.weights)) + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+        means, weights = [], []
+        mean, weight = points[0]
+        before = 0
+        limit = total * self._q(self._k(0) + 1)
+        for value, w in islice(points, 1, None):
+            if before + weight + w <= limit:
+                weight += w
+                mean += (value - mean) * w / weight
+            else:
+                means.append(mean)
+                weights.append(weight)
+                before += weight
+                limit = total * self._q(self._k(before / total) + 1)
+                mean, weight = value, w
+        means.append(mean)
+        weights.append(weight)
+        self.means, self.weights, self.total = means, weights, total
+        self.min = min(self.min, points[0][0])
+        self.max = max(self.max, points[-1][0])
+
+    def _curve(self):
+        # (cumulative weight, value) knots: the extremes and each centroid's middle
+        self._compress()
+        positions, values = [0.0], [self.min]
+        cumulative = 0.0
+        for mean, weight in zip(self.means, self.weights):
+            positions.append(cumulative + weight / 2)
+            values.append(mean)
+            cumulative += weight
+        positions.append(cumulative)
+        values.append(self.max)
+        return positions, values
+
+    def quantile(self, q):
+        if not 0 <= q <= 1:
+            raise ValueError("quantile must be between 0 and 1")
+        positions, values = self._curve()
+        if not self.total:
+            return math.nan
+        target = q * self.total
+        i = min(max(bisect_left(positions, target), 1), len(positions) - 1)
+        span = positions[i] - positions[i - 1]
+        if span <= 0:
+            return values[i]
+        return values[i - 1] + (values[i] - values[i - 1]) * (target - positions[i - 1]) / span
+
+    def cdf(self, x):
+        positions, values = self._curve()
+        if not self.total:
+            return math.nan
+        if x < self.min:
+            return 0.0
+        if x >= self.max:
+            return 1.0
+        i = min(max(bisect_right(values, x), 1), len(values) - 1)
+        span = values[i] - values[i - 1]
+        position = positions[i - 1] if span <= 0 else \
+            positions[i - 1] + (positions[i] - positions[i - 1]) * (x - values[i - 1]) / span
+        return position / self.total
+
+    def to_dict(self):
+        self._compress()
+        return {"compression": self.compression, "centroids": [list(pair) for pair in zip(self.means, self.weights)],
+                "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        digest = cls(data["compression"])
+        digest._buffer = [tuple(pair) for pair in data["centroids"]]
+        digest._compress()
+        digest.min, digest.max = data["min"], data["max"]
+        return digest
+
+
+class Histogram:
+    # Exact counts in bins [origin + i * width, origin + (i + 1) * width); only
+    # bins that received a value are stored
+    def __init__(self, width, origin=0.0):
+        if not width > 0:
+            raise ValueError("bin width must be positive")
+        self.width = width
+        self.origin = origin
+        self.counts = {}
+
+    def add(self, value):
+        if math.isfinite(value):
+            index = math.floor((value - self.origin) / self.width)
+            self.counts[index] = self.counts.get(index, 0) + 1
+
+    def extend(self, values):
+        counts = self.counts
+        origin, width = self.origin, self.width
+        for value in values:
+            if math.isfinite(value):
+                index = math.floor((value - origin) / width)
+                counts[index] = counts.get(index, 0) + 1
+
+    def merge(self, other):
+        if (other.width, other.origin) != (self.width, self.origin):
+            raise ValueError("histograms with different bins cannot be merged")
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        return self
+
+    def bins(self):
+        # [(low, high, count)] in order
+        return [(self.origin + i * self.width, self.origin + (i + 1) * self.width, self.counts[i])
+                for i in sorted(self.counts)]
+
+    def to_dict(self):
+        return {"width": self.width, "origin": self.origin, "counts": {str(i): c for i, c in self.counts.items()}}
+
+    @classmethod
+    def from_dict(cls, data):
+        histogram = cls(data["width"], data["origin"])
+        histogram.counts = {int(i): c for i, c in data["counts"].items()}
+        return histogram
+
+
+class Summary:
+    def __init__(self, compression=DEFAULT_COMPRESSION, bin_width=None, bin_origin=0.0):
+        self.stats = RunningStats()
+        self.digest = TDigest(compression)
+        self.histogram = Histogram(bin_width, bin_origin) if bin_width else None
+        self.missing = 0
+
+    def add(self, value):
+        if not math.isfinite(value):
+            self.missing += 1
+            return
+        self.stats.add(value)
+        self.digest.add(value)
+        if self.histogram is not None:
+            self.histogram.add(value)
+
+    def extend(self, values):
+        # A chunk of floats (a list, or an ndarray when the caller has NumPy)
+        if hasattr(values, "tolist"):
+            values = values.tolist()
+        present = [value for value in values if -math.inf < value < math.inf]
+        self.missing += len(values) - len(present)
+        self.stats.extend(present)
+        self.digest.extend(present)
+        if self.histogram is not None:
+            self.histogram.extend(present)
+
+    def merge(self, other):
+        self.missing += other.missing
+        self.stats.merge(other.stats)
+        self.digest.merge(other.digest)
+        if self.histogram is not None and other.histogram is not None:
+            self.histogram.merge(other.histogram)
+        return self
+
+    @property
+    def count(self):
+        return self.stats.count
+
+    def quantile(self, q):
+        return self.digest.quantile(q)
+
+    def bins(self, count=DEFAULT_BINS):
+        # Exact fixed-width bins if the summary keeps a histogram, otherwise
+        # `count` equal bins over [min, max] estimated from the digest
+        if self.histogram is not None:
+            return self.histogram.bins()
+        stats = self.stats
+        if not stats.count:
+            return []
+        if stats.min == stats.max:
+            return [(stats.min, stats.max, stats.count)]
+        width = (stats.max - stats.min) / count
+        edges = [stats.min + i * width for i in range(count)] + [stats.max]
+        # Rounding the cumulative counts, not each bin's, keeps the total exact
+        below = [round(self.digest.cdf(edge) * stats.count) for edge in edges[:-1]] + [stats.count]
+        below[0] = 0
+        return [(edges[i], edges[i + 1], below[i + 1] - below[i]) for i in range(count)]
+
+    def report(self, quantiles=DEFAULT_QUANTILES, bins=DEFAULT_BINS):
+        stats = self.stats
+        return {
+            "count": stats.count,
+            "missing": self.missing,
+            "mean": stats.mean if stats.count else math.nan,
+            "variance": stats.variance,
+            "stdev": stats.stdev,
+            "min": stats.min if stats.count else math.nan,
+            "max": stats.max if stats.count else math.nan,
+            "quantiles": {str(q): self.quantile(q) for q in quantiles},
+            "histogram": self.bins(bins),
+        }
+
+    def to_dict(self):
+        data = {"missing": self.missing, "stats": self.stats.to_dict(), "digest": self.digest.to_dict()}
+        if self.histogram is not None:
+            data["histogram"] = self.histogram.to_dict()
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        summary = cls()
+        summary.missing = data["missing"]
+        summary.stats = RunningStats.from_dict(data["stats"])
+        summary.digest = TDigest.from_dict(data["digest"])
+        if "histogram" in data:
+            summary.histogram = Histogram.from_dict(data["histogram"])
+        return summary
+
+
+def _float(text):
+    try:
+        return float(text)
+    except ValueError:
+        return math.nan
+
+
+def parse_values(text):
+    # "1, 2.5 3;4" -> [1.0, 2.5, 3.0, 4.0], for typed-in data
+    return [float(part) for part in text.replace(",", " ").replace(";", " ").split()]
+
+
+def iter_values(lines, column=None, delimiter=","):
+    # Numbers separated by whitespace or commas, or the given field (an index)
+    # of delimited lines
+    if column is None:
+        for line in lines:
+            for part in line.replace(",", " ").split():
+                yield _float(part)
+        return
+    for row in csv.reader(lines, delimiter=delimiter):
+        if row:
+            yield _float(row[column]) if column < len(row) else math.nan
+
+
+def summarize(values, summary=None, chunk_size=DEFAULT_CHUNK_SIZE, **options):
+    # Folds any iterable of floats into a Summary a chunk at a time
+    summary = summary if summary is not None else Summary(**options)
+    values = iter(values)
+    while True:
+        chunk = list(islice(values, chunk_size))
+        if not chunk:
+            return summary
+        summary.extend(chunk)
+
+
+def _resolve_column(path, column, delimiter):
+    # (field index or None, whether the first line is a header)
+    if column is None:
+        return None, False
+    if isinstance(column, int) or column.isdigit():
+        return int(column), False
+    with open(path, "r", newline="", encoding="utf-8") as f:
+        header = next(csv.reader(f, delimiter=delimiter), [])
+    try:
+        return header.index(column), True
+    except ValueError:
+        raise ValueError(f"no column '{column}' in {path}") from None
+
+
+def _byte_ranges(path, parts):
+    size = os.path.getsize(path)
+    parts = max(1, min(parts, size))
+    bounds = [size * i // parts for i in range(parts + 1)]
+    return list(zip(bounds, bounds[1:]))
+
+
+def _lines_in_range(f, start, end):
+    # Lines that start in [start, end): a line straddling `start` belongs to the
+    # range before, so every line is read exactly once across ranges
+    if start:
+        f.seek(start - 1)
+        if f.read(1) != b"\n":
+            f.readline()
+    while f.tell() < end:
+        line = f.readline()
+        if not line:
+            break
+        yield line.decode("utf-8")
+
+
+def _summarize_range(path, start, end, column, delimiter, skip_header, options):
+    with open(path, "rb") as f:
+        lines = _lines_in_range(f, start, end)
+        if skip_header and start == 0:
+            next(lines, None)
+        return summarize(iter_values(lines, column, delimiter), **options).to_dict()
+
+
+def summarize_file(path, column=None, delimiter=",", workers=1, **options):
+    # Bounded memory at any file size. With workers > 1 the file is split into
+    # byte ranges summarized in separate processes and merged.
+    index, header = _resolve_column(path, column, delimiter)
+    if workers == 1:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            if header:
+                next(f, None)
+            return summarize(iter_values(f, index, delimiter), **options)
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = workers or os.cpu_count() or 1
+    summary = Summary(**options)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(_summarize_range, path, start, end, index, delimiter, header, options)
+            for start, end in _byte_ranges(path, workers)
+        ]
+        for future in futures:
+            summary.merge(Summary.from_dict(future.result()))
+    return summary
+
+
+def format_report(report):
+    lines = [
+        f"count     {report['count']}" + (f" ({report['missing']} missing)" if report["missing"] else ""),
+        f"mean      {report['mean']:.12g}",
+        f"stdev     {report['stdev']:.12g}",
+        f"variance  {report['variance']:.12g}",
+        f"min       {report['min']:.12g}",
+        f"max       {report['max']:.12g}",
+    ]
+    for q, value in report["quantiles"].items():
+        lines.append(f"p{float(q) * 100:<8g} {value:.12g}")
+    bins = report["histogram"]
+    if bins:
+        peak = max(count for _, _, count in bins) or 1
+        lines.append("histogram")
+        for low, high, count in bins:
+            lines.append(f"  [{low:.6g}, {high:.6g})  {count:>10}  {'#' * round(30 * count / peak)}")
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m stats",
+        description="Summarize numbers in one pass: mean, variance, min/max, quantiles and a histogram.",
+    )
+    parser.add_argument("files", nargs="*", help="files of numbers, or CSV with --column (default: stdin)")
+    parser.add_argument("-c", "--column", help="CSV column name (first line is the header) or 0-based index")
+    parser.add_argument("--delimiter", default=",", help="CSV field delimiter (default ',')")
+    parser.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                        help="summarize each file on N processes (0 means one per CPU)")
+    parser.add_argument("-b", "--bins", type=int, default=DEFAULT_BINS, help=f"histogram bins (default {DEFAULT_BINS})")
+    parser.add_argument("-w", "--bin-width", type=float, help="exact histogram with bins of this width instead")
+    parser.add_argument("--compression", type=int, default=DEFAULT_COMPRESSION,
+                        help=f"t-digest size; larger is more accurate (default {DEFAULT_COMPRESSION})")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+    options = {"compression": args.compression, "bin_width": args.bin_width}
+
+    summary = Summary(**options)
+    try:
+        if not args.files or args.files == ["-"]:
+            column = int(args.column) if args.column is not None else None
+            summarize(iter_values(sys.stdin, column, args.delimiter), summary)
+        for path in args.files:
+            if path != "-":
+                summary.merge(summarize_file(path, args.column, args.delimiter, args.jobs, **options))
+        report = summary.report(bins=args.bins)
+    except (OSError, ValueError) as e:
+        print(f"{parser.prog}: error: {e}", file=sys.stderr)
+        return 1
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+import math
+from decimal import Decimal
+from fractions import Fraction
+
+import pytest
+
+from backends import FLOAT, decimal_backend, evaluate, fraction_backend, get_backend, select_backend
+from expression import ExpressionError
+
+
+def test_decimal_precision():
+    assert str(decimal_backend(50).evaluate("1 / 3")) == "0." + "3" * 50
+    assert str(decimal_backend(40).evaluate("pi"))[:40] == "3.14159265358979323846264338327950288419"
+
+
+def test_fractions_are_exact():
+    assert fraction_backend().evaluate("1 / 3 + 1 / 6") == Fraction(1, 2)
+    assert fraction_backend().evaluate("sqrt(9 / 4)") == Fraction(3, 2)
+
+
+def test_literals_keep_their_digits():
+    # Regression: literals used to pass through a float before the backend saw them
+    assert decimal_backend(50).evaluate("1.00000000000000000001 - 1") == Decimal("1E-20")
+    assert fraction_backend().evaluate("1e400 / 1e399") == 10
+    assert fraction_backend().evaluate("0.1 + 0.2") == Fraction(3, 10)
+
+
+def test_integer_functions_take_whole_numbers():
+    assert decimal_backend().evaluate("factorial(5)") == 120
+    assert fraction_backend().evaluate("gcd(12, 18)") == 6
+
+
+@pytest.mark.parametrize("text", [
+    "atan2(1, 2)", "atan2(-1, -2)", "atan2(0, -1)", "atan2(-3, 0)", "hypot(3, 4)", "hypot(1, 2, 2)",
+    "hypot(1, 1)", "copysign(3, -0.5)", "fmod(-7, 3)", "remainder(7, 2)", "remainder(5, 2)",
+    "ldexp(3, 4)", "comb(10, 3)", "perm(5, 2)", "isqrt(17)",
+])
+@pytest.mark.parametrize("backend", [decimal_backend(40), fraction_backend()], ids=repr)
+def test_functions_match_the_float_table(backend, text):
+    assert float(backend.evaluate(text)) == pytest.approx(FLOAT.evaluate(text), rel=1e-15)
+
+
+def test_exact_results_stay_exact():
+    assert fraction_backend().evaluate("hypot(3 / 5, 4 / 5)") == 1
+    assert fraction_backend().evaluate("fmod(7 / 2, 1 / 3)") == Fraction(1, 6)
+    with pytest.raises(ValueError):
+        decimal_backend().evaluate("fmod(1, 0)")
+
+
+def test_select_backend():
+    assert select_backend("2 ** 100", precision=50) is FLOAT
+    assert select_backend("1 / 3") is FLOAT
+    assert select_backend(precision=40).name == "decimal"
+    assert select_backend("1 / 3", exact=True).name == "fraction"
+    assert select_backend("atan2(1, 3)", precision=40).name == "decimal"
+
+
+def test_select_backend_refuses_missing_functions():
+    with pytest.raises(ExpressionError, match="sinh"):
+        select_backend("sinh(1)", precision=40)
+    assert evaluate("sinh(1)") == pytest.approx(math.sinh(1))
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        get_backend("quad")
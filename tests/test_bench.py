@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+import bench
+
+
+def test_run_reports_every_benchmark_of_the_chosen_groups():
+    report = bench.run(["expression", "conversion"], number=5, repeat=1)
+    assert set(report["results"]) == {"expression", "conversion"}
+    assert set(report["results"]["expression"]) == {
+        f"{step}.{name}" for name in bench.EXPRESSIONS for step in ("parse", "evaluate")
+    }
+    assert all(value > 0 for value in report["results"]["conversion"].values())
+    assert report["meta"]["number"] == 5
+
+
+def test_history_sizes_are_reported_separately():
+    results = bench.run(["history"], repeat=1, quick=True)["results"]["history"]
+    assert any("10000" in name for name in results)
+
+
+def test_unknown_group():
+    with pytest.raises(ValueError):
+        bench.run(["nope"])
+
+
+def test_compare_flags_only_slowdowns_past_the_threshold():
+    baseline = {"results": {"expression": {"a": 100.0, "b": 100.0, "c": 100.0}}}
+    current = {"results": {"expression": {"a": 120.0, "b": 200.0, "c": 50.0, "new": 1.0}}}
+    assert [name for _, name, *_ in bench.compare(baseline, current)] == ["b"]
+
+
+def test_command_line_compare(tmp_path, capsys):
+    baseline = tmp_path / "baseline.json"
+    assert bench.main(["scientific", "-n", "5", "-r", "1", "-o", str(baseline)]) == 0
+    report = json.loads(baseline.read_text())
+    for name in report["results"]["scientific"]:
+        report["results"]["scientific"][name] = 1e-9  # Everything now looks slower
+    baseline.write_text(json.dumps(report))
+    assert bench.main(["scientific", "-n", "5", "-r", "1", "--compare", str(baseline)]) == 1
+    assert "regression: scientific." in capsys.readouterr().err
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+pytest.importorskip("tkinter")
+
+import cal
+
+ROOT = os.path.dirname(os.path.abspath(cal.__file__))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    # A calculator window whose files all live in tmp_path; needs a display
+    import tkinter
+
+    for name, file in (("HISTORY_FILE", "history.json"), ("HISTORY_JOURNAL", "history.jsonl"),
+                       ("CACHE_FILE", "cache.json"), ("STATE_FILE", "state.jsonl")):
+        monkeypatch.setattr(cal, name, str(tmp_path / file))
+    monkeypatch.setattr(cal, "DATA_DIR", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+    try:
+        root = tkinter.Tk()
+    except tkinter.TclError:
+        pytest.skip("no display")
+    calculator = cal.AdvancedCalculator(root)
+    yield calculator
+    calculator.state.close()
+    root.destroy()
+
+
+def test_engine_modules_load_on_first_use():
+    modules = ["backends", "calc_core", "formulas", "history", "live", "memo", "programmer", "quantity", "units"]
+    code = f"import sys, cal; print([m for m in {modules!r} if m in sys.modules])"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=ROOT)
+    assert result.stdout.strip() == "[]"
+
+
+def test_key_lists_match_the_engines():
+    import programmer
+    from calc_core import SCIENTIFIC_FUNCTIONS
+
+    assert sorted(cal.SCIENTIFIC_KEYS) == sorted(SCIENTIFIC_FUNCTIONS)
+    assert sorted(cal.PROGRAMMER_BASES) == sorted(programmer.BASES)
+
+
+def test_converter_reuses_its_widgets(app):
+    app.notebook.select(app.converter_frame)
+    app.root.update()
+    from_menu, to_menu = app.from_menu, app.to_menu
+    children = app.converter_frame.winfo_children()
+
+    app.conversion_type.set("Temperature")
+    app.root.update()
+    assert app.from_menu is from_menu and app.to_menu is to_menu
+    assert app.converter_frame.winfo_children() == children
+    assert from_menu["menu"].index("end") + 1 == 3
+    assert (app.from_unit.get(), app.to_unit.get()) == ("celsius", "fahrenheit")
+
+    app.convert_value.insert(0, "100")
+    app.perform_conversion()
+    assert app.convert_result.cget("text") == "100.0 celsius = 212.0000 fahrenheit"
@@ -0,0 +1,44 @@
+import os
+import subprocess
+import sys
+
+import calc_cli
+
+
+def test_evaluates_files_with_variables(tmp_path, capsys):
+    path = tmp_path / "input.txt"
+    path.write_text("x * 2\n# comment\n\n2 ** 3\n")
+    assert calc_cli.main([str(path), "-v", "x=1.5"]) == 0
+    assert capsys.readouterr().out == "3.0\n8\n"
+
+
+def test_errors_are_reported_and_counted(tmp_path, capsys):
+    path = tmp_path / "input.txt"
+    path.write_text("1 / 0\n1 + 1\n")
+    assert calc_cli.main([str(path)]) == 1
+    captured = capsys.readouterr()
+    assert captured.out.splitlines() == ["error: division by zero", "2"]
+    assert "line 1" in captured.err
+
+
+def test_stop_on_error(tmp_path, capsys):
+    path = tmp_path / "input.txt"
+    path.write_text("nope(\n1 + 1\n")
+    assert calc_cli.main([str(path), "--stop-on-error"]) == 1
+    assert len(capsys.readouterr().out.splitlines()) == 1
+
+
+def test_huge_results_are_printed_in_full(tmp_path, capsys):
+    # Regression: str() on a result past 4300 digits stopped the whole run
+    path = tmp_path / "input.txt"
+    path.write_text("2 ** 20000\n1\n")
+    assert calc_cli.main([str(path)]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines[0]) == 6021 and lines[1] == "1"
+
+
+def test_does_not_import_tkinter():
+    code = "import sys, calc_cli; print('tkinter' in sys.modules)"
+    root = os.path.dirname(os.path.abspath(calc_cli.__file__))
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True, cwd=root)
+    assert result.stdout.strip() == "False"
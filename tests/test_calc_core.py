@@ -0,0 +1,36 @@
+import calc_core
+from calc_core import Calculator, evaluate_lines, format_result
+from expression import time_limit
+
+
+def test_evaluate_lines_skips_blanks_and_comments():
+    results = list(evaluate_lines(["1 + 1", "", "# note", "x * 2"], {"x": 4}))
+    assert [(number, result, error) for number, _, result, error in results] == [(1, 2, None), (4, 8, None)]
+
+
+def test_assignments_carry_over_to_later_lines():
+    results = [result for _, _, result, _ in evaluate_lines(["y = 3", "y ** 2"])]
+    assert results == [3, 9]
+
+
+def test_errors_are_reported_per_line():
+    results = list(evaluate_lines(["1 / 0", "2 + 2"]))
+    assert isinstance(results[0][3], ZeroDivisionError)
+    assert results[1][2] == 4
+
+
+def test_each_line_runs_under_the_time_limit(monkeypatch):
+    monkeypatch.setattr(calc_core, "time_limit", lambda: time_limit(-1))
+    results = list(evaluate_lines(["gcd(3 ** 100000, 5 ** 100000)"]))
+    assert "too long" in str(results[0][3])
+
+
+def test_format_result_handles_huge_integers():
+    text = format_result(2 ** 20000)
+    assert len(text) == 6021 and text.startswith("39802768")
+    assert format_result(1.5) == "1.5"
+
+
+def test_calculator_routes_units():
+    result = Calculator().execute("1 km in m")
+    assert (result.value, result.unit) == (1000.0, "m")
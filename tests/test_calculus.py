@@ -0,0 +1,60 @@
+import math
+import time
+
+import pytest
+
+import calculus
+from calculus import derivative, find_root, find_roots, integrate, maximize, minimize
+from expression import ExpressionError, evaluate
+
+
+@pytest.mark.parametrize("text", ["x ** 2 * sin(x)", "exp(2 * x) / (1 + x ** 2)", "log(x) * sqrt(x)", "a * x ** 3 - x"])
+def test_derivative_matches_a_finite_difference(text):
+    variables = {"a": 1.5}
+    slope = derivative(text)
+    for x in (0.5, 1.3, 2.7):
+        h = 1e-6
+        numeric = (evaluate(text, dict(variables, x=x + h)) - evaluate(text, dict(variables, x=x - h))) / (2 * h)
+        assert evaluate(slope, dict(variables, x=x)) == pytest.approx(numeric, rel=1e-5)
+
+
+def test_derivative_is_simplified():
+    assert derivative("x ** 2") == "2 * x"
+    assert derivative("3 * y + 2", "y") == "3"
+    assert derivative("x ** 3", order=2) == "6 * x"
+
+
+def test_long_sums_are_differentiated_without_recursion():
+    # Regression: a few thousand terms used to raise RecursionError
+    text = " + ".join(f"{i} * x" for i in range(3000))
+    start = time.perf_counter()
+    result = derivative(text)
+    assert time.perf_counter() - start < 2
+    assert evaluate(result) == sum(range(3000))
+
+
+def test_roots():
+    assert find_roots("x ** 2 - 2") == pytest.approx([-math.sqrt(2), math.sqrt(2)])
+    assert find_roots("x ** 2 + 1") == []
+    assert find_root("cos(x) - x", x0=1.0) == pytest.approx(0.7390851332151607)
+    assert find_roots("x - k", variables={"k": 3}) == pytest.approx([3])
+
+
+def test_integrate():
+    assert integrate("sin(x)", "x", 0, math.pi) == pytest.approx(2, abs=1e-10)
+    assert integrate("x ** 2", "x", 1, 1) == 0
+    assert integrate("x", "x", 2, 0) == pytest.approx(-2)
+
+
+def test_minimize_and_maximize():
+    x, value = minimize("(x - 3) ** 2 + 1")
+    assert (x, value) == (pytest.approx(3, abs=1e-6), pytest.approx(1))
+    x, value = maximize("-(x + 1) ** 2", lo=-5, hi=5)
+    assert x == pytest.approx(-1, abs=1e-6) and value == pytest.approx(0, abs=1e-9)
+
+
+def test_missing_names_and_bad_intervals():
+    with pytest.raises(ExpressionError):
+        find_roots("x - k")
+    with pytest.raises(ValueError):
+        calculus.find_roots("x", lo=1, hi=-1)
@@ -0,0 +1,58 @@
+import math
+
+import pytest
+
+from expression import ExpressionError, compile_expression, evaluate, normalize, parse
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("1 + 2 * 3", 7),
+    ("(1 + 2) * 3", 9),
+    ("2 ** 3 ** 2", 512),
+    ("-2 ** 2", -4),
+    ("7 // 2 + 7 % 2", 4),
+    ("10 / 4", 2.5),
+    ("2 ^ 10", 1024),
+    ("π", math.pi),
+    ("sqrt(16) + log(e)", 5.0),
+    ("hypot(3, 4)", 5.0),
+    ("1e3 + .5", 1000.5),
+])
+def test_matches_python(text, expected):
+    assert evaluate(text) == pytest.approx(expected)
+
+
+def test_variables_and_constants():
+    compiled = compile_expression("a * x + pi")
+    assert compiled.names == {"a", "x"}
+    assert compiled.evaluate({"a": 2, "x": 3}) == pytest.approx(6 + math.pi)
+    # A variable shadows the constant of the same name
+    assert evaluate("pi * 2", {"pi": 3}) == 6
+
+
+def test_compiled_forms_are_shared():
+    assert normalize("2*x") == normalize(" 2 * x ")
+    assert compile_expression("2*x") is compile_expression("2*x")
+    assert compile_expression("2*x").tree == compile_expression("2 * x").tree
+
+
+def test_constants_are_folded():
+    assert compile_expression("2 * 3 + x").tree == ("bin", "+", ("num", 6), ("name", "x"))
+
+
+@pytest.mark.parametrize("text", ["", "1 +", "(1", "1 2", "1 $ 2", "nope(1)", "__import__('os')"])
+def test_bad_input_is_an_expression_error(text):
+    with pytest.raises(ExpressionError):
+        evaluate(text)
+
+
+def test_undefined_name():
+    with pytest.raises(ExpressionError, match="'y'"):
+        evaluate("x + y", {"x": 1})
+
+
+def test_long_chains_do_not_recurse():
+    text = " + ".join(["1"] * 20000)
+    assert evaluate(text) == 20000
+    assert evaluate(" - ".join(["x"] * 5000), {"x": 1}) == -4998
+    assert parse("a - b - c") == ("bin", "-", ("bin", "-", ("name", "a"), ("name", "b")), ("name", "c"))
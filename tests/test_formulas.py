@@ -0,0 +1,55 @@
+import math
+
+import pytest
+
+from formulas import CycleError, FormulaSheet
+
+
+def test_formulas_recompute_when_their_inputs_change():
+    sheet = FormulaSheet({"w": 2, "h": 3, "rate": 10})
+    sheet.define("area", "w * h")
+    sheet.define("cost", "area * rate")
+    assert sheet.values["cost"] == 60
+    assert sheet.set("w", 4) == {"area", "cost"}
+    assert sheet.values["cost"] == 120
+
+
+def test_only_downstream_formulas_are_recomputed():
+    sheet = FormulaSheet({"a": 1, "b": 2})
+    sheet.define_many({"x": "a + 1", "y": "b + 1"})
+    assert sheet.set("a", 5) == {"x"}
+
+
+def test_cycles_are_refused_and_leave_the_sheet_unchanged():
+    sheet = FormulaSheet({"a": 1})
+    sheet.define("x", "a + 1")
+    sheet.define("y", "x + 1")
+    with pytest.raises(CycleError):
+        sheet.define("x", "y + 1")
+    assert sheet.formulas["x"] == "a + 1"
+    assert sheet.set("a", 2) == {"x", "y"}
+    assert sheet.values["y"] == 4
+
+
+def test_failures_are_recorded_per_formula():
+    sheet = FormulaSheet({"d": 0})
+    sheet.define("q", "1 / d")
+    assert "q" in sheet.errors and "q" not in sheet.values
+    sheet.set("d", 4)
+    assert sheet.values["q"] == 0.25 and not sheet.errors
+
+
+def test_removing_a_formula_recomputes_its_readers():
+    sheet = FormulaSheet({})
+    sheet.define("a", "2")
+    sheet.define("b", "a * 3")
+    sheet.remove("a")
+    assert "b" in sheet.errors
+
+
+def test_shadowing_a_constant_recomputes_formulas_that_read_it():
+    sheet = FormulaSheet({})
+    sheet.define("circle", "2 * pi")
+    assert sheet.values["circle"] == 2 * math.pi
+    assert sheet.set("pi", 3) == {"circle"}
+    assert sheet.values["circle"] == 6
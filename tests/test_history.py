@@ -0,0 +1,68 @@
+import json
+
+from history import HistoryStore, format_entry, make_entry
+
+
+def test_huge_integer_results_are_journaled_as_text(tmp_path):
+    value = 7 ** 20000
+    entry = make_entry("7 ** 20000", value)
+    assert isinstance(entry["result"], str) and len(entry["result"]) == 16902
+    store = HistoryStore(str(tmp_path / "history.jsonl"))
+    store.append(entry)
+    store.flush()
+    loaded = HistoryStore(str(tmp_path / "history.jsonl"))
+    loaded.load()
+    assert format_entry(list(loaded)[0]).startswith("7 ** 20000 = 91369")
+
+
+def _store(tmp_path, **options):
+    return HistoryStore(str(tmp_path / "history.jsonl"), **options)
+
+
+def test_memory_keeps_the_newest_entries_and_the_journal_keeps_all(tmp_path):
+    store = _store(tmp_path, capacity=3, batch_size=2)
+    store.extend(make_entry(f"{i} + 0", i) for i in range(10))
+    assert [entry["result"] for entry in store] == [7, 8, 9]
+    assert [entry["result"] for entry in store.tail(2)] == [8, 9]
+    store.close()
+    loaded = _store(tmp_path, capacity=100)
+    assert loaded.load() == 10
+
+
+def test_appends_are_batched(tmp_path):
+    store = _store(tmp_path, batch_size=3)
+    store.extend([make_entry("1", 1), make_entry("2", 2)])
+    assert not (tmp_path / "history.jsonl").exists()
+    store.append(make_entry("3", 3))
+    assert len((tmp_path / "history.jsonl").read_text().splitlines()) == 3
+
+
+def test_compaction_keeps_every_journaled_entry(tmp_path):
+    # Regression: compaction rewrote the journal from memory, losing entries of
+    # earlier sessions that were never loaded
+    first = _store(tmp_path)
+    first.extend(make_entry(str(i), i) for i in range(5))
+    first.close()
+    second = _store(tmp_path, capacity=2)
+    second.append(make_entry("5", 5))
+    second.compact()
+    second.close()
+    assert _store(tmp_path).load() == 6
+
+
+def test_torn_lines_are_skipped_and_compacted_away(tmp_path):
+    path = tmp_path / "history.jsonl"
+    path.write_text('{"expression": "1", "result": 1}\n{"expression": "2", "res')
+    store = _store(tmp_path)
+    assert store.load() == 1 and store.torn_lines == 1
+    store.append(make_entry("3", 3))
+    store.close()
+    assert [json.loads(line)["expression"] for line in path.read_text().splitlines()] == ["1", "3"]
+
+
+def test_clear_empties_the_journal(tmp_path):
+    store = _store(tmp_path)
+    store.append(make_entry("1", 1))
+    store.flush()
+    store.clear()
+    assert len(store) == 0 and _store(tmp_path).load() == 0
@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+import history_index
+from history import make_entry
+from history_index import HistoryIndex, replay_entry
+
+
+def _journal(tmp_path, entries):
+    path = tmp_path / "history.jsonl"
+    path.write_text("".join(json.dumps(entry) + "\n" for entry in entries))
+    return str(path)
+
+
+def _entries(count):
+    # Results out of entry order, so the sorted index has work to do
+    return [{"time": float(i), "expression": f"{i} * 7 % 11", "result": i * 7 % 11} for i in range(count)]
+
+
+def test_search_by_text_result_and_time(tmp_path):
+    with HistoryIndex(_journal(tmp_path, _entries(50))) as index:
+        assert len(index) == 50
+        assert index.search(text="12 * 7") == [12]
+        assert index.search(min_result=10, max_result=10) == [i for i in range(50) if i * 7 % 11 == 10]
+        assert index.search(since=5, until=7) == [5, 6, 7]
+
+
+def test_result_index_is_sorted_in_runs(tmp_path, monkeypatch):
+    # Regression: the sort used to hold every record in memory at once
+    monkeypatch.setattr(history_index, "SORT_RUN", 7)
+    monkeypatch.setattr(history_index, "RESORT_MINIMUM", 1)
+    with HistoryIndex(_journal(tmp_path, _entries(100))) as index:
+        assert index.sorted_count == 100
+        expected = [i for i in range(100) if 3 <= i * 7 % 11 <= 4]
+        assert index.search(min_result=3, max_result=4) == expected
+
+
+@pytest.mark.parametrize("filters", [{"text": "* 7"}, {"min_result": 0}, {}])
+def test_searches_stop_at_the_limit(tmp_path, monkeypatch, filters):
+    monkeypatch.setattr(history_index, "RESORT_MINIMUM", 1)
+    with HistoryIndex(_journal(tmp_path, _entries(100))) as index:
+        assert index.search(limit=3, **filters) == [0, 1, 2]
+
+
+def test_appended_entries_are_picked_up(tmp_path):
+    path = _journal(tmp_path, _entries(3))
+    with HistoryIndex(path) as index:
+        with open(path, "a") as f:
+            f.write(json.dumps({"time": 9.0, "expression": "1 + 1", "result": 2}) + "\n")
+        assert index.refresh() == 4
+        assert index.entry(3)["expression"] == "1 + 1"
+
+
+def test_replay_plain_and_function_entries():
+    assert replay_entry(make_entry("2 * x", 6), {"x": 4}) == 8
+    assert replay_entry("1 + 2 = 3") == 3
+    assert replay_entry(make_entry("sin(30)", 0.5, function="sin", argument=30)) == pytest.approx(0.5)
+
+
+def test_replay_dispatches_on_kind():
+    result = replay_entry(make_entry("1 km in m", "1000 m", kind="units"))
+    assert (result.value, result.unit) == (1000.0, "m")
+    entry = make_entry("0xF0 XOR 0x0F", "0xFF", kind="programmer", word_size=8, base="HEX")
+    entry = json.loads(json.dumps(entry))
+    assert replay_entry(entry) == "0xFF"
+    with pytest.raises(ValueError):
+        replay_entry(make_entry("d/dx x ** 2", "2 * x", kind="calculus", operation="d/dx"))
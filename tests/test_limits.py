@@ -0,0 +1,63 @@
+import time
+
+import pytest
+
+from expression import (
+    MAX_DEPTH, MAX_INTEGER_BITS, ExpressionError, compile_expression, evaluate, time_limit,
+)
+
+
+def test_huge_power_is_refused():
+    with pytest.raises(ExpressionError):
+        evaluate("9 ** 9 ** 9")
+
+
+def test_huge_factorial_is_refused():
+    with pytest.raises(ExpressionError):
+        evaluate("factorial(10 ** 7)")
+
+
+def test_results_up_to_the_limit_are_allowed():
+    assert evaluate("2 ** 20000").bit_length() == 20001
+    assert evaluate(f"3 ** {MAX_INTEGER_BITS // 2 - 1}") > 0
+
+
+def test_nesting_is_limited():
+    with pytest.raises(ExpressionError):
+        compile_expression("(" * (MAX_DEPTH + 1) + "1" + ")" * (MAX_DEPTH + 1))
+    assert evaluate("(" * 50 + "1" + ")" * 50) == 1
+
+
+def test_gcd_and_lcm_refuse_huge_operands():
+    variables = {"a": 3 ** 400000, "b": 5 ** 300000}
+    with pytest.raises(ExpressionError):
+        evaluate("gcd(a, b)", variables)
+    with pytest.raises(ExpressionError):
+        evaluate("lcm(a, b)", variables)
+    assert evaluate("gcd(a, 6)", variables) == 3
+
+
+def test_division_refuses_huge_operands_but_not_small_divisors():
+    variables = {"a": 3 ** 600000, "b": 5 ** 200000}
+    with pytest.raises(ExpressionError):
+        evaluate("a % b", variables)
+    with pytest.raises(ExpressionError):
+        evaluate("a // b", variables)
+    assert evaluate("a % 7", variables) == pow(3, 600000, 7)
+
+
+def test_integer_functions_respect_the_deadline():
+    # Twelve gcd calls on the largest operands allowed used to run for seconds
+    variables = {"a": 3 ** 160000, "b": 5 ** 110000}
+    text = " + ".join(["gcd(a * a, b * b)"] * 12)
+    start = time.monotonic()
+    with pytest.raises(ExpressionError):
+        with time_limit(0.05):
+            evaluate(text, variables)
+    assert time.monotonic() - start < 1.5
+
+
+def test_time_limit_is_restored():
+    with time_limit(0.0):
+        pass
+    assert evaluate("10 ** 5000 % 7") == pow(10, 5000, 7)
@@ -0,0 +1,54 @@
+import time
+
+import pytest
+
+from expression import evaluate
+from live import LiveExpression
+
+
+@pytest.mark.parametrize("text", ["1+2*3", "2**3**2", "(1+2)*3", "7//2+7%2", "-3**2", "sqrt(16)+hypot(3,4)", "x*2-y"])
+def test_preview_matches_the_engine_while_typing(text):
+    variables = {"x": 4, "y": 1.5}
+    live = LiveExpression(variables=variables)
+    for end in range(1, len(text) + 1):
+        live.set_text(text[:end])
+        value = live.value()
+        if value is not None:
+            # Open parentheses count as closed in the preview
+            closed = text[:end] + ")" * (text[:end].count("(") - text[:end].count(")"))
+            assert value == pytest.approx(evaluate(closed, variables))
+    assert live.value() == pytest.approx(evaluate(text, variables))
+
+
+def test_incomplete_input_has_no_value():
+    live = LiveExpression()
+    for text in ("1+", "2**", "(1+", "sqrt("):
+        live.set_text(text)
+        assert live.value() is None
+
+
+def test_editing_in_the_middle_and_backspace():
+    live = LiveExpression("12+34")
+    live.set_text("12*34")
+    assert live.value() == 408
+    live.backspace(3)
+    assert live.text == "12" and live.value() == 12
+
+
+def test_unknown_names_are_reported():
+    live = LiveExpression("x*2")
+    assert live.value() is None and "'x'" in live.error
+    live.variables["x"] = 3
+    live.clear()
+    live.set_text("x*2")
+    assert live.value() == 6
+
+
+def test_appends_do_not_copy_the_text():
+    # Regression: each keystroke used to rebuild the whole text
+    live = LiveExpression()
+    start = time.perf_counter()
+    for _ in range(20000):
+        live.append("1+")
+    assert time.perf_counter() - start < 2
+    assert len(live) == 40000
@@ -0,0 +1,70 @@
+import pytest
+
+from backends import decimal_backend
+from memo import ResultCache
+
+
+def test_repeat_evaluations_hit():
+    cache = ResultCache()
+    assert cache.evaluate("2 * x", {"x": 3}) == 6
+    assert cache.evaluate("2*x", {"x": 3}) == 6
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_keys_hold_only_the_variables_read():
+    cache = ResultCache()
+    cache.evaluate("x + 1", {"x": 1, "y": 2})
+    cache.evaluate("x + 1", {"x": 1, "y": 5})
+    assert cache.hits == 1
+    assert cache.evaluate("x + 1", {"x": 2}) == 3
+    assert cache.misses == 2
+
+
+def test_a_variable_shadowing_a_constant_is_part_of_the_key():
+    cache = ResultCache()
+    assert cache.evaluate("pi * 2") == pytest.approx(6.283185307179586)
+    assert cache.evaluate("pi * 2", {"pi": 3}) == 6
+
+
+def test_backends_do_not_share_entries():
+    cache = ResultCache()
+    assert isinstance(cache.evaluate("1 / 3"), float)
+    assert str(cache.evaluate("1 / 3", backend=decimal_backend(10))) == "0.3333333333"
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(max_entries=2)
+    cache.evaluate("1 + 1")
+    cache.evaluate("2 + 2")
+    cache.evaluate("1 + 1")
+    cache.evaluate("3 + 3")
+    assert cache.evictions == 1
+    cache.evaluate("1 + 1")
+    assert cache.hits == 2
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache()
+    for _ in range(2):
+        with pytest.raises(ZeroDivisionError):
+            cache.evaluate("1 / 0")
+    assert len(cache) == 0
+
+
+def test_function_results_are_cached():
+    cache = ResultCache()
+    assert cache.apply_function("sin", 30) == pytest.approx(0.5)
+    cache.apply_function("sin", 30)
+    assert cache.hits == 1
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResultCache()
+    cache.evaluate("x * 2", {"x": 4})
+    cache.apply_function("sin", 30)
+    cache.evaluate("1 / 3", backend=decimal_backend(10))  # Not saved
+    assert cache.save(path) == 2
+    loaded = ResultCache()
+    assert loaded.load(path) == 2
+    assert loaded.evaluate("x*2", {"x": 4}) == 8 and loaded.hits == 1
@@ -0,0 +1,84 @@
+import json
+import time
+
+import pytest
+
+import metrics
+from metrics import MetricsRegistry, instrument, recorder
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry(enabled=True)
+
+
+def test_calls_are_timed_into_buckets(registry):
+    @instrument("op", registry)
+    def op(x):
+        return x * 2
+
+    assert op(2) == 4 and op(3) == 6
+    data = registry.snapshot()["op"]
+    assert data["calls"] == 2 and data["errors"] == 0
+    assert sum(data["buckets"].values()) == 2
+
+
+def test_disabled_registry_records_nothing():
+    registry = MetricsRegistry(enabled=False)
+    instrument("op", registry)(lambda: None)()
+    assert registry.snapshot() == {}
+
+
+def test_exceptions_and_marked_errors_count_as_errors(registry):
+    @instrument("fails", registry)
+    def fails():
+        raise ValueError("no")
+
+    @instrument("reports", registry)
+    def reports():
+        registry.mark_error()
+        time.sleep(0.02)  # A dialog the user reads; not part of the latency
+
+    with pytest.raises(ValueError):
+        fails()
+    reports()
+    snapshot = registry.snapshot()
+    assert snapshot["fails"]["errors"] == 1
+    assert snapshot["reports"]["errors"] == 1 and snapshot["reports"]["seconds_total"] < 0.02
+
+
+def test_nested_calls_keep_their_own_error_state(registry):
+    @instrument("inner", registry)
+    def inner():
+        registry.mark_error()
+
+    @instrument("outer", registry)
+    def outer():
+        inner()
+
+    outer()
+    snapshot = registry.snapshot()
+    assert snapshot["inner"]["errors"] == 1 and snapshot["outer"]["errors"] == 0
+
+
+def test_recorder_reports_outside_work(registry):
+    record = recorder("background_write", registry)
+    record(0.003)
+    record(0.2, error=True)
+    data = registry.snapshot()["background_write"]
+    assert (data["calls"], data["errors"]) == (2, 1)
+
+
+def test_exports(registry, tmp_path):
+    registry.record("op", 0.001)
+    prometheus = registry.to_prometheus()
+    assert 'calculator_call_duration_seconds_bucket{operation="op",le="+Inf"} 1' in prometheus
+    assert 'calculator_calls_total{operation="op"} 1' in prometheus
+    registry.export(str(tmp_path / "metrics.json"))
+    assert json.loads((tmp_path / "metrics.json").read_text())["operations"]["op"]["calls"] == 1
+
+
+def test_profile_is_off_without_the_environment_variable(monkeypatch):
+    monkeypatch.delenv(metrics.PROFILE_ENV, raising=False)
+    assert metrics.start_profile() is None
+    metrics.stop_profile(None)
@@ -0,0 +1,42 @@
+from itertools import count, islice
+
+import pytest
+
+import parallel
+from expression import time_limit
+from parallel import _evaluate_chunk, evaluate_parallel
+
+
+def test_parallel_results_match_the_input_order():
+    lines = [f"{i} * 2" for i in range(50)] + ["1 / 0"]
+    results = list(evaluate_parallel(lines, workers=2, chunk_size=7))
+    assert [number for number, *_ in results] == list(range(1, 52))
+    assert [result for _, _, result, _ in results[:50]] == [i * 2 for i in range(50)]
+    assert isinstance(results[-1][3], ZeroDivisionError)
+
+
+def test_unordered_results_cover_every_line():
+    results = evaluate_parallel(["x + 1"] * 20, {"x": 1}, workers=2, chunk_size=3, ordered=False)
+    assert sorted(number for number, *_ in results) == list(range(1, 21))
+
+
+def test_each_item_runs_under_the_time_limit(monkeypatch):
+    monkeypatch.setattr(parallel, "time_limit", lambda: time_limit(-1))
+    (_, _, result, error), = _evaluate_chunk([(1, "gcd(3 ** 100000, 5 ** 100000)")], {})
+    assert result is None and "too long" in str(error)
+
+
+def test_blank_lines_and_comments_keep_their_numbers():
+    results = list(evaluate_parallel(["1", "", "# skip", "2"], workers=1))
+    assert [(number, result) for number, _, result, _ in results] == [(1, 1), (4, 2)]
+
+
+def test_input_is_read_lazily():
+    lines = (f"{i} + 1" for i in count())
+    first = list(islice(evaluate_parallel(lines, workers=2, chunk_size=4), 5))
+    assert [result for _, _, result, _ in first] == [1, 2, 3, 4, 5]
+
+
+def test_chunk_size_must_be_positive():
+    with pytest.raises(ValueError):
+        list(evaluate_parallel(["1"], chunk_size=0))
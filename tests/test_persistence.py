@@ -0,0 +1,72 @@
+import time
+from decimal import Decimal
+from fractions import Fraction
+
+import persistence
+from persistence import StateStore, atomic_write
+
+
+def _store(tmp_path, **options):
+    return StateStore(str(tmp_path / "state.jsonl"), **options)
+
+
+def test_atomic_write_replaces_the_file(tmp_path):
+    path = str(tmp_path / "file.json")
+    atomic_write(path, "one")
+    atomic_write(path, "two")
+    assert open(path).read() == "two"
+    assert [p.name for p in tmp_path.iterdir()] == ["file.json"]
+
+
+def test_changes_survive_a_reload(tmp_path):
+    store = _store(tmp_path)
+    store.update({"theme": "dark", "memory": 2.5, "var.x": 3})
+    store.delete("var.x")
+    store.set("var.y", 4)
+    store.close()
+    assert _store(tmp_path).load() == {"theme": "dark", "memory": 2.5, "var.y": 4}
+
+
+def test_changes_are_coalesced_and_written_in_the_background(tmp_path):
+    writes = []
+    store = _store(tmp_path, delay=0.2, on_write=lambda seconds, error: writes.append(error))
+    for i in range(100):
+        store.set("memory", i)
+    deadline = time.time() + 5
+    while not writes and time.time() < deadline:
+        time.sleep(0.01)
+    assert writes == [False]
+    assert (tmp_path / "state.jsonl").read_text().count("\n") == 1
+    assert _store(tmp_path).load() == {"memory": 99}
+
+
+def test_journal_is_compacted(tmp_path):
+    store = _store(tmp_path)
+    for i in range(persistence.COMPACT_SLACK * 2):
+        store.set("memory", i)
+        store.flush()
+    lines = (tmp_path / "state.jsonl").read_text().count("\n")
+    assert lines <= persistence.COMPACT_SLACK + 1
+
+
+def test_torn_last_line_is_skipped(tmp_path):
+    (tmp_path / "state.jsonl").write_text('["theme", "dark"]\n["memory", 1')
+    assert _store(tmp_path).load() == {"theme": "dark"}
+
+
+def test_numbers_keep_their_types(tmp_path):
+    # Regression: Fraction memory came back as the string "1/3" and broke M+
+    store = _store(tmp_path)
+    values = {"fraction": Fraction(1, 3), "decimal": Decimal("0.1000"), "big": 7 ** 20000, "float": 0.5}
+    store.update(values)
+    store.close()
+    loaded = _store(tmp_path).load()
+    assert loaded == values
+    assert {key: type(value) for key, value in loaded.items()} == {key: type(value) for key, value in values.items()}
+    assert str(loaded["decimal"]) == "0.1000"
+
+
+def test_data_dir_follows_the_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("CALC_DATA_DIR", str(tmp_path / "data"))
+    assert persistence.data_dir() == str(tmp_path / "data")
+    assert (tmp_path / "data").is_dir()
@@ -0,0 +1,68 @@
+import io
+
+import pytest
+
+import pipeline
+from pipeline import Convert, Evaluate, run
+
+
+def _run(text, operations, **options):
+    out = io.StringIO()
+    report = run(io.StringIO(text), out, operations, use_numpy=False, **options)
+    return out.getvalue().splitlines(), report
+
+
+def test_evaluate_appends_a_column():
+    lines, report = _run("a,b\n1,2\n3,4\n", [Evaluate("c", "a * b")])
+    assert lines == ["a,b,c", "1,2,2.0", "3,4,12.0"]
+    assert report["rows"] == 2
+
+
+def test_operations_run_in_order_and_replace_columns():
+    lines, _ = _run("t\n0\n100\n", [Convert("t", "t", "celsius", "fahrenheit"), Evaluate("t", "t + 1")])
+    assert lines == ["t", "33.0", "213.0"]
+
+
+def test_bad_cells_and_failures_are_empty():
+    lines, _ = _run("a\nx\n0\n2\n", [Evaluate("r", "1 / a")], chunk_size=1)
+    assert lines == ["a,r", "x,", "0,", "2,0.5"]
+
+
+def test_digits_round_computed_cells():
+    lines, _ = _run("a\n3\n", [Evaluate("r", "1 / a")], digits=3)
+    assert lines[1] == "3,0.333"
+
+
+def test_failing_constant_expression_is_empty():
+    # Regression: a column-free expression that fails used to abort the run
+    lines, _ = _run("a\n1\n", [Evaluate("k", "1 / 0")])
+    assert lines == ["a,k", "1,"]
+
+
+def test_complex_constant_is_empty():
+    lines, _ = _run("a\n1\n", [Evaluate("k", "(-1) ** 0.5")])
+    assert lines == ["a,k", "1,"]
+
+
+@pytest.mark.parametrize("digits", [None, 4])
+def test_huge_integers_are_written_in_full(digits):
+    lines, _ = _run("a\n1\n2\n", [Evaluate("k", "7 ** 20000")], chunk_size=1, digits=digits)
+    cells = [line.split(",")[1] for line in lines[1:]]
+    assert len(cells) == 2 and cells[0] == cells[1]
+    if digits is None:
+        assert len(cells[0]) == 16902 and cells[0].startswith("91369")
+    else:
+        assert cells[0] == "9.137e+16901"
+
+
+def test_missing_column_is_an_error():
+    with pytest.raises(pipeline.ExpressionError):
+        _run("a\n1\n", [Evaluate("r", "b + 1")])
+
+
+def test_command_line(tmp_path):
+    source = tmp_path / "in.csv"
+    source.write_text("a\n2\n")
+    target = tmp_path / "out.csv"
+    assert pipeline.main([str(source), "-o", str(target), "--eval", "b = a ** 2", "--quiet"]) == 0
+    assert target.read_text().splitlines() == ["a,b", "2,4.0"]
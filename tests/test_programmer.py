@@ -0,0 +1,55 @@
+import time
+
+import pytest
+
+import programmer
+from expression import MAX_DEPTH
+from programmer import IntegerEngine, ProgrammerError, from_string, to_string
+
+
+def test_power_and_xor_are_different_operators():
+    engine = IntegerEngine(64)
+    assert engine.evaluate("2 ** 10") == 1024
+    assert engine.evaluate("6 ^ 3") == engine.evaluate("6 XOR 3") == 5
+
+
+def test_precedence_follows_c():
+    engine = IntegerEngine(64)
+    assert engine.evaluate("1 | 2 ^ 3 & 4 << 1") == 1 | 2 ^ 3 & 4 << 1
+    assert engine.evaluate("-2 ** 2") == -4
+
+
+def test_word_size_wraps():
+    assert IntegerEngine(8).evaluate("127 + 1") == -128
+    assert IntegerEngine(8).format(-1, "HEX") == "0xFF"
+    assert IntegerEngine(None).evaluate("1 << 100") == 1 << 100
+
+
+@pytest.mark.parametrize("base", [2, 8, 10, 16])
+def test_round_trip(base):
+    for value in (0, 1, -255, 3 ** 200):
+        assert from_string(to_string(value, base), base) == value
+
+
+def test_huge_decimal_output_is_fast():
+    # Regression: the split by powers of ten was quadratic
+    value = 7 ** 300000
+    start = time.perf_counter()
+    text = to_string(value)
+    assert time.perf_counter() - start < 2
+    assert from_string(text) == value
+    assert to_string(-3 ** 5000) == str(-3 ** 5000)
+
+
+def test_deep_nesting_is_an_error():
+    # Regression: deep parentheses used to raise RecursionError
+    engine = IntegerEngine(64)
+    with pytest.raises(ProgrammerError):
+        engine.evaluate("(" * (MAX_DEPTH + 1) + "1" + ")" * (MAX_DEPTH + 1))
+    assert engine.evaluate("(" * 50 + "1" + ")" * 50) == 1
+
+
+def test_unknown_base():
+    with pytest.raises(ProgrammerError):
+        to_string(5, 7)
+    assert programmer.BASES["HEX"] == 16
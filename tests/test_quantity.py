@@ -0,0 +1,53 @@
+import pytest
+
+import quantity
+from expression import ExpressionError
+
+
+def _evaluate(text, variables=None):
+    result = quantity.evaluate(text, variables)
+    return pytest.approx(result.value), result.unit
+
+
+@pytest.mark.parametrize("text, value, unit", [
+    ("1 km in m", 1000, "m"),
+    ("3 ft + 2 m", 9.561679790026247, "ft"),
+    ("60 mi/h in m/s", 26.822333333333333, "m/s"),
+    ("2 m * 3 m", 6, "m**2"),
+    ("20 degC in K", 293.15, "K"),
+])
+def test_units_are_scaled_and_combined(text, value, unit):
+    assert _evaluate(text) == (value, unit)
+
+
+@pytest.mark.parametrize("text, value, unit", [
+    ("-40 degF in degC", -40, "degC"),
+    ("-40 degC in degF", -40, "degF"),
+    ("-273.15 degC in K", 0, "K"),
+    ("-x degC in degF", 14, "degF"),
+])
+def test_signed_temperatures_convert(text, value, unit):
+    # Regression: a leading minus used to hide the offset conversion
+    assert _evaluate(text, {"x": 10}) == (value, unit)
+
+
+@pytest.mark.parametrize("text, message", [
+    ("1 m + 1 s", "cannot combine length"),
+    ("sin(1 m)", "needs plain numbers"),
+    ("1 degC + 1 degC", "can only be converted"),
+    ("1 m in s", "cannot express length"),
+])
+def test_mismatched_dimensions_are_errors(text, message):
+    with pytest.raises(ExpressionError, match=message):
+        quantity.evaluate(text)
+
+
+def test_variables_hide_units():
+    assert quantity.uses_units("3 m", {})
+    assert not quantity.uses_units("3 m", {"m": 2})
+    assert not quantity.uses_units("x + 1", {})
+
+
+def test_evaluate_many():
+    values, unit = quantity.evaluate_many("x m in ft", {"x": [1.0, 2.0]}, use_numpy=False)
+    assert values == pytest.approx([3.280839895013123, 6.561679790026246]) and unit == "ft"
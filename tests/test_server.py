@@ -0,0 +1,79 @@
+import asyncio
+import json
+
+import pytest
+
+from server import MAX_PRECISION, CalculatorServer
+
+
+def _exchange(tmp_path, requests, workers=0):
+    # Sends every request at once on one connection and returns the responses
+    async def run():
+        server = CalculatorServer(workers)
+        path = str(tmp_path / "calc.sock")
+        await server.start(path=path)
+        try:
+            reader, writer = await asyncio.open_unix_connection(path)
+            writer.write(b"".join(
+                (request if isinstance(request, bytes) else json.dumps(request).encode()) + b"\n"
+                for request in requests
+            ))
+            await writer.drain()
+            responses = [json.loads(await reader.readline()) for _ in requests]
+            writer.close()
+            return responses
+        finally:
+            await server.close()
+    return asyncio.run(run())
+
+
+def test_pipelined_requests_are_answered_in_order(tmp_path):
+    responses = _exchange(tmp_path, [
+        {"id": 1, "op": "evaluate", "expression": "x = 3"},
+        {"id": 2, "op": "evaluate", "expression": "x ** 2"},
+        {"id": 3, "op": "evaluate", "expression": "y"},
+        {"id": 4, "op": "convert", "value": 100, "from": "celsius", "to": "fahrenheit"},
+        {"id": 5, "op": "programmer", "expression": "0xF0 XOR 0x0F", "word_size": 8},
+        {"id": 6, "op": "function", "name": "sin", "value": 30},
+        {"id": 7, "op": "variables"},
+        {"id": 8, "op": "ping"},
+    ])
+    assert [response["id"] for response in responses] == list(range(1, 9))
+    assert responses[1]["result"] == 9
+    assert not responses[2]["ok"] and "'y'" in responses[2]["error"]
+    assert responses[3]["result"] == pytest.approx(212)
+    assert responses[4]["result"] == -1
+    assert responses[5]["result"] == pytest.approx(0.5)
+    assert responses[6]["result"] == {"x": 3}
+    assert responses[7]["result"] == "pong"
+
+
+def test_worker_pool_and_backends(tmp_path):
+    responses = _exchange(tmp_path, [
+        {"id": 1, "op": "evaluate", "expression": "1 / 3", "backend": "decimal", "precision": 30},
+        {"id": 2, "op": "evaluate", "expression": "1 / 3 + 1 / 6", "backend": "fraction"},
+    ], workers=1)
+    assert responses[0]["result"] == "0." + "3" * 30
+    assert responses[1]["result"] == "1/2"
+
+
+def test_huge_results_are_sent_as_strings(tmp_path):
+    # Regression: one result past json's digit limit dropped every queued response
+    responses = _exchange(tmp_path, [
+        {"id": 1, "op": "evaluate", "expression": "7 ** 20000"},
+        {"id": 2, "op": "evaluate", "expression": "1 + 1"},
+    ])
+    assert responses[0]["result"].startswith("91369") and len(responses[0]["result"]) == 16902
+    assert responses[1]["result"] == 2
+
+
+def test_bad_requests_get_error_responses(tmp_path):
+    responses = _exchange(tmp_path, [
+        b"not json",
+        {"id": 2, "op": "nope"},
+        {"id": 3, "op": "evaluate"},
+        {"id": 4, "op": "evaluate", "expression": "1", "backend": "decimal", "precision": MAX_PRECISION + 1},
+        {"id": 5, "op": "set", "name": "2x", "value": 1},
+    ])
+    assert not any(response["ok"] for response in responses)
+    assert [response["id"] for response in responses] == [None, 2, 3, 4, 5]
@@ -0,0 +1,71 @@
+import math
+import random
+import statistics
+
+import pytest
+
+import stats
+from stats import Histogram, RunningStats, Summary, TDigest, summarize
+
+
+def test_running_stats_match_the_statistics_module():
+    values = [random.Random(1).gauss(5, 2) for _ in range(1000)]
+    running = RunningStats()
+    for value in values:
+        running.add(value)
+    assert running.mean == pytest.approx(statistics.fmean(values))
+    assert running.variance == pytest.approx(statistics.variance(values))
+
+
+def test_merging_halves_matches_the_whole():
+    values = [float(i % 37) for i in range(5000)]
+    whole = summarize(values)
+    merged = summarize(values[:1234]).merge(summarize(values[1234:]))
+    assert merged.count == whole.count
+    assert merged.stats.mean == pytest.approx(whole.stats.mean)
+    assert merged.stats.variance == pytest.approx(whole.stats.variance)
+    assert merged.quantile(0.5) == pytest.approx(whole.quantile(0.5), abs=1)
+
+
+def test_digest_quantiles_are_close():
+    rng = random.Random(2)
+    values = [rng.random() for _ in range(20000)]
+    digest = TDigest()
+    digest.extend(values)
+    for q in (0.01, 0.5, 0.99):
+        assert digest.quantile(q) == pytest.approx(q, abs=0.01)
+
+
+@pytest.mark.parametrize("values", [[1, 2, 3, 4, 5], [1, 1, 1, 2, 2, 3], list(range(1000))])
+def test_estimated_bins_add_up_to_the_count(values):
+    summary = summarize([float(v) for v in values])
+    assert sum(count for _, _, count in summary.bins()) == len(values)
+
+
+def test_exact_histogram_skips_non_finite_values():
+    histogram = Histogram(1.0)
+    histogram.add(math.inf)
+    histogram.add(math.nan)
+    histogram.add(2.5)
+    assert histogram.bins() == [(2.0, 3.0, 1)]
+
+
+def test_non_finite_values_count_as_missing():
+    summary = summarize([1.0, math.inf, 2.0, -math.inf, math.nan])
+    summary.add(math.inf)
+    report = summary.report()
+    assert (report["count"], report["missing"]) == (2, 4)
+    assert report["mean"] == 1.5 and report["max"] == 2.0
+    assert sum(count for _, _, count in report["histogram"]) == 2
+
+
+def test_command_line_reports_data_with_infinities(monkeypatch, capsys):
+    monkeypatch.setattr("sys.stdin", iter(["1 inf 2\n"]))
+    assert stats.main([]) == 0
+    assert "count     2 (1 missing)" in capsys.readouterr().out
+
+
+def test_summary_round_trips_through_a_dict():
+    summary = summarize([1.0, 2.0, 3.0], bin_width=1.0)
+    copy = Summary.from_dict(summary.to_dict())
+    assert copy.report() == summary.report()
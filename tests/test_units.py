@@ -0,0 +1,46 @@
+import pytest
+
+import units
+from units import UnitRegistry
+
+
+@pytest.mark.parametrize("value, from_unit, to_unit, expected", [
+    (1, "kilometers", "meters", 1000),
+    (12, "inches", "feet", 1),
+    (100, "celsius", "fahrenheit", 212),
+    (-40, "fahrenheit", "celsius", -40),
+    (0, "kelvin", "celsius", -273.15),
+    (1, "hectares", "square meters", 10000),
+])
+def test_convert(value, from_unit, to_unit, expected):
+    assert units.convert(value, from_unit, to_unit) == pytest.approx(expected)
+
+
+def test_pairs_are_exact():
+    assert units.coefficients("celsius", "fahrenheit") == (1.8, 32)
+
+
+def test_convert_many_matches_convert():
+    values = [0.0, 37.0, -10.5]
+    assert units.convert_many(values, "celsius", "kelvin") == [units.convert(v, "celsius", "kelvin") for v in values]
+    assert units.convert_many(values, "meters", "feet", "Length") == [
+        units.convert(v, "meters", "feet") for v in values
+    ]
+
+
+def test_errors():
+    with pytest.raises(ValueError, match="unknown unit"):
+        units.convert(1, "parsecs", "meters")
+    with pytest.raises(ValueError, match="unknown length unit"):
+        units.convert(1, "meters", "pounds", "Length")
+    with pytest.raises(ValueError, match="unsupported conversion type"):
+        units.convert(1, "meters", "feet", "Time travel")
+
+
+def test_register_a_category():
+    registry = UnitRegistry()
+    registry.register("Time", "seconds", [("seconds", 1.0, 0.0), ("minutes", 60.0, 0.0), ("hours", 3600.0, 0.0)])
+    assert registry.convert(90, "minutes", "hours") == 1.5
+    assert registry.units("Time") == ["seconds", "minutes", "hours"]
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register("Other", "meters", [("meters", 1.0, 0.0)])
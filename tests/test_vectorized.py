@@ -0,0 +1,47 @@
+import math
+
+import pytest
+
+import vectorized
+from vectorized import evaluate_many, iter_evaluate_chunks
+
+
+def test_columns_and_scalars():
+    assert evaluate_many("a * b + c", {"a": [1, 2, 3], "b": [4, 5, 6], "c": 1}, use_numpy=False) == [5, 11, 19]
+
+
+def test_chunks_cover_every_row():
+    chunks = list(iter_evaluate_chunks("x + 1", {"x": list(range(10))}, chunk_size=4))
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert sum(chunks, []) == [float(x + 1) for x in range(10)]
+
+
+def test_failures_are_nan():
+    result = evaluate_many("1 / x", {"x": [0.0, 2.0]}, use_numpy=False)
+    assert math.isnan(result[0]) and result[1] == 0.5
+
+
+def test_complex_results_are_nan():
+    result = evaluate_many("x ** 0.5", {"x": [-4.0, 4.0]}, use_numpy=False)
+    assert math.isnan(result[0]) and result[1] == 2.0
+    assert all(isinstance(value, float) for value in result)
+    assert math.isnan(evaluate_many("(-8) ** (1/3)", {}, use_numpy=False)[0])
+
+
+def test_column_lengths_must_match():
+    with pytest.raises(ValueError):
+        evaluate_many("a + b", {"a": [1, 2], "b": [1]}, use_numpy=False)
+
+
+def test_unknown_names_are_reported():
+    with pytest.raises(vectorized.ExpressionError):
+        evaluate_many("a + z", {"a": [1]}, use_numpy=False)
+
+
+@pytest.mark.skipif(vectorized.np is None, reason="NumPy is not installed")
+def test_numpy_path_matches_the_loop():
+    columns = {"x": [-1.0, 0.0, 0.5, 2.0]}
+    expected = evaluate_many("sqrt(x) + 1 / x", columns, use_numpy=False)
+    actual = evaluate_many("sqrt(x) + 1 / x", columns, use_numpy=True).tolist()
+    for a, b in zip(actual, expected):
+        assert (math.isnan(a) and math.isnan(b)) or math.isinf(a) or a == pytest.approx(b)
@@ -0,0 +1,180 @@
+import sys
+from fractions import Fraction
+
+# Unit tables for the converter. Each unit is stored as a linear map onto its
+# category's base unit: base = value * factor + offset. Only temperatures need a
+# non-zero offset. Every category precomputes the full N x N table of
+# (scale, shift) pairs so a conversion is one dict lookup and a multiply-add.
+# The pairs are derived in exact arithmetic, so e.g. celsius -> fahrenheit is
+# exactly 1.8 and 32 rather than picking up rounding from the base unit.
+
+UNIT_TABLES = {
+    "Length": ("meters", [
+        ("meters", 1.0, 0.0),
+        ("feet", 0.3048, 0.0),
+        ("inches", 0.0254, 0.0),
+        ("centimeters", 0.01, 0.0),
+        ("miles", 1609.34, 0.0),
+        ("kilometers", 1000.0, 0.0),
+    ]),
+    "Weight": ("kilograms", [
+        ("kilograms", 1.0, 0.0),
+        ("pounds", 0.453592, 0.0),
+        ("ounces", 0.0283495, 0.0),
+        ("grams", 0.001, 0.0),
+        ("tons", 907.185, 0.0),
+    ]),
+    "Temperature": ("kelvin", [
+        ("celsius", 1.0, 273.15),
+        ("fahrenheit", Fraction(5, 9), Fraction("273.15") - Fraction(160, 9)),
+        ("kelvin", 1.0, 0.0),
+    ]),
+    "Area": ("square meters", [
+        ("square meters", 1.0, 0.0),
+        ("square feet", 0.09290304, 0.0),
+        ("acres", 4046.8564224, 0.0),
+        ("hectares", 10000.0, 0.0),
+    ]),
+    "Volume": ("liters", [
+        ("liters", 1.0, 0.0),
+        ("gallons", 3.785411784, 0.0),
+        ("cubic meters", 1000.0, 0.0),
+        ("cubic feet", 28.316846592, 0.0),
+    ]),
+    "Time": ("seconds", [
+        ("seconds", 1.0, 0.0),
+        ("minutes", 60.0, 0.0),
+        ("hours", 3600.0, 0.0),
+        ("days", 86400.0, 0.0),
+    ]),
+}
+
+# For unit-aware expressions (quantity.py): each category's dimension as powers
+# of (length, mass, time, temperature), and the size of its base unit in SI
+DIMENSIONS = {
+    "Length": ((1, 0, 0, 0), 1.0),
+    "Weight": ((0, 1, 0, 0), 1.0),
+    "Temperature": ((0, 0, 0, 1), 1.0),
+    "Area": ((2, 0, 0, 0), 1.0),
+    "Volume": ((3, 0, 0, 0), 0.001),
+    "Time": ((0, 0, 1, 0), 1.0),
+}
+
+# Short names for expressions; the full unit names work too where they are
+# identifiers. "in" is the conversion keyword, so inches are "inch".
+UNIT_SYMBOLS = {
+    "m": "meters", "ft": "feet", "inch": "inches", "cm": "centimeters", "mi": "miles", "km": "kilometers",
+    "kg": "kilograms", "lb": "pounds", "oz": "ounces", "g": "grams", "ton": "tons",
+    "degC": "celsius", "degF": "fahrenheit", "K": "kelvin",
+    "ft2": "square feet", "m2": "square meters", "acre": "acres", "ha": "hectares",
+    "L": "liters", "gal": "gallons", "m3": "cubic meters", "ft3": "cubic feet",
+    "s": "seconds", "min": "minutes", "h": "hours", "day": "days",
+}
+
+
+def _exact(number):
+    # Floats go through their shortest repr so 0.3048 means 3048/10000
+    return Fraction(repr(number)) if isinstance(number, float) else Fraction(number)
+
+
+class UnitCategory:
+    __slots__ = ("name", "base", "units", "index", "factors", "offsets", "scale", "shift", "pairs")
+
+    def __init__(self, name, base, definitions):
+        self.name = name
+        self.base = base
+        self.units = [unit for unit, _, _ in definitions]
+        self.index = {unit: i for i, unit in enumerate(self.units)}
+        exact_factors = [_exact(factor) for _, factor, _ in definitions]
+        exact_offsets = [_exact(offset) for _, _, offset in definitions]
+        self.factors = [float(factor) for factor in exact_factors]
+        self.offsets = [float(offset) for offset in exact_offsets]
+
+        # to = from * scale[i][j] + shift[i][j]
+        size = len(self.units)
+        self.scale = [
+            [float(exact_factors[i] / exact_factors[j]) for j in range(size)]
+            for i in range(size)
+        ]
+        self.shift = [
+            [float((exact_offsets[i] - exact_offsets[j]) / exact_factors[j]) for j in range(size)]
+            for i in range(size)
+        ]
+        self.pairs = {
+            (self.units[i], self.units[j]): (self.scale[i][j], self.shift[i][j])
+            for i in range(size) for j in range(size)
+        }
+
+    def __repr__(self):
+        return f"UnitCategory({self.name!r}, {len(self.units)} units)"
+
+
+class UnitRegistry:
+    def __init__(self, tables=UNIT_TABLES):
+        self.categories = {}
+        self.unit_category = {}
+        for name, (base, definitions) in tables.items():
+            self.register(name, base, definitions)
+
+    def register(self, name, base, definitions):
+        category = UnitCategory(name, base, definitions)
+        for unit in category.units:
+            owner = self.unit_category.get(unit)
+            if owner is not None and owner.name != name:
+                raise ValueError(f"unit '{unit}' is already registered under {owner.name}")
+        self.categories[name] = category
+        for unit in category.units:
+            self.unit_category[unit] = category
+        return category
+
+    def category_of(self, unit):
+        try:
+            return self.unit_category[unit]
+        except KeyError:
+            raise ValueError(f"unknown unit '{unit}'") from None
+
+    def units(self, category):
+        return list(self._category(category).units)
+
+    def _category(self, name):
+        try:
+            return self.categories[name]
+        except KeyError:
+            raise ValueError(f"unsupported conversion type '{name}'") from None
+
+    def coefficients(self, from_unit, to_unit, category=None):
+        table = self._category(category) if category is not None else self.category_of(from_unit)
+        try:
+            return table.pairs[from_unit, to_unit]
+        except KeyError:
+            for unit in (from_unit, to_unit):
+                if unit not in table.index:
+                    raise ValueError(f"unknown {table.name.lower()} unit '{unit}'") from None
+            raise
+
+    def convert(self, value, from_unit, to_unit, category=None):
+        scale, shift = self.coefficients(from_unit, to_unit, category)
+        return value * scale + shift
+
+    def convert_many(self, values, from_unit, to_unit, category=None):
+        # One coefficient lookup for the whole batch; arrays are converted in a
+        # single vectorized multiply-add
+        scale, shift = self.coefficients(from_unit, to_unit, category)
+        # NumPy is never imported here: a caller holding an array has loaded it
+        np = sys.modules.get("numpy")
+        if np is not None and isinstance(values, np.ndarray):
+            result = values * scale
+            if shift:
+                result += shift
+            return result
+        if shift:
+            return [value * scale + shift for value in values]
+        return [value * scale for value in values]
+
+
+registry = UnitRegistry()
+
+categories = registry.categories
+convert = registry.convert
+convert_many = registry.convert_many
+coefficients = registry.coefficients
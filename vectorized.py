@@ -0,0 +1,136 @@
+import math
+from functools import lru_cache
+from itertools import islice
+
+from expression import CONSTANTS, FUNCTIONS, ExpressionError, compile_expression, compile_node
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; evaluate_many falls back to a chunked loop
+    np = None
+
+DEFAULT_CHUNK_SIZE = 65536
+
+# math names whose NumPy ufunc is spelled differently
+_NUMPY_NAMES = {
+    "asin": "arcsin", "acos": "arccos", "atan": "arctan", "atan2": "arctan2",
+    "asinh": "arcsinh", "acosh": "arccosh", "atanh": "arctanh",
+    "pow": "power",
+}
+
+
+def _numpy_log(x, base=None):
+    if base is None:
+        return np.log(x)
+    return np.log(x) / np.log(base)
+
+
+@lru_cache(maxsize=1)
+def numpy_functions():
+    # Vectorized counterparts of expression.FUNCTIONS; anything NumPy lacks is
+    # wrapped with frompyfunc so it still accepts arrays, just without the speedup
+    if np is None:
+        raise RuntimeError("NumPy is not installed")
+
+    table = {}
+    for name, fn in FUNCTIONS.items():
+        ufunc = getattr(np, _NUMPY_NAMES.get(name, name), None)
+        if isinstance(ufunc, np.ufunc):
+            table[name] = ufunc
+        else:
+            table[name] = _wrap_scalar(fn)
+    table["log"] = _numpy_log
+    return table
+
+
+def _wrap_scalar(fn):
+    def call(*args):
+        return np.asarray(np.frompyfunc(fn, len(args), 1)(*args), dtype=float)
+    return call
+
+
+@lru_cache(maxsize=1024)
+def compile_vectorized(text):
+    compiled = compile_expression(text)
+    return compiled, compile_node(compiled.tree, numpy_functions(), CONSTANTS)
+
+
+def _column_length(columns):
+    length = None
+    for name, values in columns.items():
+        if isinstance(values, (int, float)):
+            continue
+        if length is None:
+            length = len(values)
+        elif len(values) != length:
+            raise ValueError(f"column '{name}' has {len(values)} values, expected {length}")
+    return length
+
+
+def _check_names(compiled, columns):
+    missing = sorted(name for name in compiled.names if name not in columns)
+    if missing:
+        raise ExpressionError(f"name '{missing[0]}' is not defined")
+
+
+def evaluate_numpy(text, columns):
+    compiled, fn = compile_vectorized(text)
+    _check_names(compiled, columns)
+    length = _column_length(columns)
+    env = {}
+    for name, values in columns.items():
+        env[name] = values if isinstance(values, (int, float)) else np.asarray(values, dtype=float)
+    with np.errstate(all="ignore"):
+        result = fn(env)
+    if length is not None and np.ndim(result) == 0:
+        result = np.full(length, result, dtype=float)
+    return result
+
+
+def iter_evaluate_chunks(text, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    # Pure-Python path: one compiled closure, one reused binding dict, results
+    # yielded a chunk at a time so the caller controls memory
+    compiled = compile_expression(text)
+    _check_names(compiled, columns)
+    length = _column_length(columns)
+    env = {name: values for name, values in columns.items() if isinstance(values, (int, float))}
+    arrays = [(name, values) for name, values in columns.items() if not isinstance(values, (int, float))]
+    fn = compiled.evaluate
+
+    if length is None:
+        value = fn(env)
+        yield [math.nan if value.__class__ is complex else value]
+        return
+
+    iterators = [(name, iter(values)) for name, values in arrays]
+    remaining = length
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        rows = [list(islice(it, size)) for _, it in iterators]
+        chunk = []
+        append = chunk.append
+        for i in range(size):
+            for (name, _), row in zip(iterators, rows):
+                env[name] = row[i]
+            try:
+                value = fn(env)
+            except (ArithmeticError, ValueError):
+                value = math.nan  # Match NumPy, which yields nan/inf instead of raising
+            if value.__class__ is complex:
+                value = math.nan  # and nan where Python's ** goes complex, e.g. (-8) ** (1/3)
+            append(value)
+        remaining -= size
+        yield chunk
+
+
+def evaluate_many(text, columns, chunk_size=DEFAULT_CHUNK_SIZE, use_numpy=None):
+    # columns maps variable names to equal-length sequences (or scalars that are
+    # shared by every row). Returns an ndarray with NumPy, otherwise a list.
+    if use_numpy is None:
+        use_numpy = np is not None
+    if use_numpy:
+        return evaluate_numpy(text, columns)
+    results = []
+    for chunk in iter_evaluate_chunks(text, columns, chunk_size):
+        results.extend(chunk)
+    return results